@@ -0,0 +1,58 @@
+"""Compares store size, save and load times of sharded corpus codecs
+
+Usage: python scripts/benchmark_corpus_codecs.py [corpus-shards-folder] [language]
+
+If a sharded corpus store is given, its documents are re-stored with each codec, otherwise a random corpus is
+parsed with a blank spaCy model. Load times include decompression and document creation.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import spacy
+
+from text_analytic_tools.common.textacy_utility import sharded_corpus
+
+CODECS = [ 'none', 'lz4', 'zstd-1', 'zstd-3', 'zstd-9', 'bz2' ]
+
+def random_docs(nlp, n_docs=2000, n_tokens=500, vocab_size=20000, seed=42):
+    random = np.random.RandomState(seed)
+    docs = []
+    for i in range(0, n_docs):
+        doc = nlp(' '.join('w{}'.format(x) for x in np.minimum(random.zipf(1.3, n_tokens), vocab_size)))
+        doc._.meta = dict(document_id=i, year=1900 + i % 100)
+        docs.append(doc)
+    return docs
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(folder, x)) for x in os.listdir(folder))
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main(docs, nlp, shard_size=500, n_workers=None):
+
+    print('corpus: {} documents, {} tokens'.format(len(docs), sum(map(len, docs))))
+    print('{:8s} {:>10s} {:>8s} {:>8s}'.format('codec', 'size (MB)', 'save (s)', 'load (s)'))
+
+    for codec in CODECS:
+        with tempfile.TemporaryDirectory() as folder:
+            _, save_elapsed = timed(sharded_corpus.store_sharded_corpus, docs, folder, shard_size=shard_size, codec=codec, n_workers=n_workers)
+            corpus, load_elapsed = timed(sharded_corpus.ShardedCorpus(folder, nlp, n_workers=n_workers).load)
+            assert len(corpus) == len(docs)
+            print('{:8s} {:10.2f} {:8.2f} {:8.2f}'.format(codec, folder_size(folder) / 1024 / 1024, save_elapsed, load_elapsed))
+
+if __name__ == "__main__":
+
+    nlp = spacy.blank(sys.argv[2] if len(sys.argv) > 2 else 'en')
+
+    if len(sys.argv) > 1:
+        docs = list(sharded_corpus.ShardedCorpus(sys.argv[1], nlp).iter_docs())
+    else:
+        docs = random_docs(nlp)
+
+    main(docs, nlp)
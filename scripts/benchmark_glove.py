@@ -0,0 +1,66 @@
+"""Compares native GloVe co-occurrence builder and trainer with the (optional) glove-python package
+
+Usage: python scripts/benchmark_glove.py [tokenized-corpus.zip] [window-size]
+
+If no corpus is given a random Zipf distributed corpus is generated.
+"""
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+import text_analytic_tools.common.text_corpus as text_corpus
+from text_analytic_tools.text_analysis.co_occurrence import vectorizer_glove
+
+try:
+    import glove
+except ImportError:
+    glove = None
+
+def random_corpus(n_docs=2000, n_tokens=500, vocab_size=20000, seed=42):
+    random = np.random.RandomState(seed)
+    return [ [ 'w{}'.format(x) for x in np.minimum(random.zipf(1.3, n_tokens), vocab_size) ] for _ in range(0, n_docs) ]
+
+def zip_corpus(filename):
+    with zipfile.ZipFile(filename) as zf:
+        return [ zf.read(x).decode('utf-8').split() for x in zf.namelist() ]
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main(corpus, window_size=5, n_components=50, epochs=5, n_threads=4):
+
+    token2id = text_corpus.build_vocab(corpus)
+
+    print('corpus: {} documents, {} tokens, {} types'.format(len(corpus), sum(map(len, corpus)), len(token2id)))
+
+    vectorizer, elapsed = timed(vectorizer_glove.GloveVectorizer(token2id=token2id).fit, corpus, size=window_size)
+    print('native  fit:   {:8.2f}s {} pairs'.format(elapsed, vectorizer.nw_xy.nnz))
+
+    _, elapsed = timed(vectorizer.train, n_components=n_components, epochs=epochs, n_threads=n_threads, random_state=0)
+    print('native  train: {:8.2f}s loss {:.6f}'.format(elapsed, vectorizer.losses[-1]))
+
+    if glove is None:
+        print('glove-python not installed, skipping comparison')
+        return
+
+    glove_corpus =glove.Corpus(dictionary=token2id)
+    _, elapsed = timed(glove_corpus.fit, corpus, window=window_size)
+    print('glove   fit:   {:8.2f}s {} pairs'.format(elapsed, glove_corpus.matrix.nnz))
+
+    difference = abs(glove_corpus.matrix.tocsr() - vectorizer.nw_xy).max()
+    print('max abs matrix difference: {:.6g}'.format(difference))
+
+    model = glove.Glove(no_components=n_components, learning_rate=0.05)
+    _, elapsed = timed(model.fit, glove_corpus.matrix, epochs=epochs, no_threads=n_threads)
+    print('glove   train: {:8.2f}s'.format(elapsed))
+
+if __name__ == "__main__":
+
+    corpus = zip_corpus(sys.argv[1]) if len(sys.argv) > 1 else random_corpus()
+    window_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    main(corpus, window_size=window_size)
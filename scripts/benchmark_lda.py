@@ -0,0 +1,68 @@
+"""Compares wall time, coherence and perplexity of gensim LDA engines on a tokenized corpus
+
+Usage: python scripts/benchmark_lda.py tokenized-corpus.zip [n_topics] [passes]
+
+Prints a table with one row per engine setup:
+
+    gensim_lda              current settings (single threaded, chunksize 10, perplexity every 2nd chunk)
+    gensim_lda-multicore    LdaMulticore, large chunks, perplexity once on held-out documents
+"""
+import sys
+import time
+
+import pandas as pd
+
+import text_analytic_tools.common.text_corpus as text_corpus
+import text_analytic_tools.text_analysis.topic_model as topic_model
+import text_analytic_tools.text_analysis.topic_model_corpus as topic_model_corpus
+
+SETUPS = [
+    ('gensim_lda', {}),
+    ('gensim_lda-multicore', { 'workers': 3 }),
+    ('gensim_lda-multicore', { 'workers': 7 }),
+]
+
+def main(source_file, n_topics=50, passes=40):
+
+    corpus = text_corpus.SimplePreparedTextCorpus(source_file, lowercase=True)
+    terms = [ list(x) for x in corpus.get_texts() ]
+
+    documents = pd.DataFrame({ 'document_id': range(0, len(terms)), 'year': 0 })
+
+    train_corpus = topic_model_corpus.TrainCorpus.build(terms)
+
+    rows = []
+    for method, tm_args in SETUPS:
+
+        start = time.perf_counter()
+
+        data = topic_model.compute(
+            terms,
+            documents,
+            method=method,
+            tm_args=dict(tm_args, n_topics=n_topics, passes=passes),
+            train_corpus=train_corpus
+        )
+
+        rows.append({
+            'method': method,
+            'workers': tm_args.get('workers', 1),
+            'seconds': round(time.perf_counter() - start, 1),
+            'coherence (c_v)': data.coherence_score,
+            'log perplexity': data.perplexity_score
+        })
+
+        print(rows[-1])
+
+    print('')
+    print('corpus: {}, documents: {}, topics: {}, passes: {}'.format(source_file, len(terms), n_topics, passes))
+    print('')
+    print(pd.DataFrame(rows).to_string(index=False))
+
+if __name__ == "__main__":
+
+    main(
+        sys.argv[1],
+        n_topics=int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+        passes=int(sys.argv[3]) if len(sys.argv) > 3 else 40
+    )
@@ -1,3 +1,4 @@
+import os
 import time
 import text_analytic_tools.text_analysis.co_occurrence as co_occurrence
 import text_analytic_tools.common.text_corpus as text_corpus
@@ -27,14 +28,12 @@ region_names = [
     'WTI:Western Europe'
 ]
 
-def store_result(data, target_filename):
-    try:
-        data.to_excel(target_filename)
-    except ValueError as ex:
-        logger.error(ex)
-        logger.info('Storng data as CSV (tab) instead')
-        target_filename = target_filename[:-4] + 'tsv'
-        data.to_csv(target_filename, sep='\t')
+RESULT_FOLDER = 'CO_tCoIR_en_45-72'
+
+def store_result(data, **run_params):
+    store = co_occurrence.CoOccurrenceStore(RESULT_FOLDER)
+    folder = store.store(data, **run_params)
+    print('Result folder: {}'.format(folder))
 
 def compute_source_files(source_files):
     for source_file, tag in source_files:
@@ -42,10 +41,18 @@ def compute_source_files(source_files):
         corpus = text_corpus.SimplePreparedTextCorpus(source_file, lowercase=True)
         document_index = current_domain.compile_documents(corpus)
         for window_size in [5, 10, 20]:
-            result_filename = 'CO_tCoIR_en_45-72.{}_{}_{}_{}.xlsx'.format(time.strftime("%Y%m%d_%H%M"), method, window_size, tag)
-            print('Result filename: {}'.format(result_filename))
             df = co_occurrence.compute(corpus, document_index, window_size=window_size, distance_metric=0, normalize='size', method=method)
-            store_result(df, result_filename)
+            store_result(df, method=method, window_size=window_size, distance_metric=0, normalize='size', tag=tag, date=time.strftime("%Y%m%d_%H%M"))
+
+def update_source_files(source_files, window_size=5):
+    '''Folds new documents in source files into persisted HAL state, and stores result (only changed years are recomputed)'''
+    for source_file, tag in source_files:
+        corpus = text_corpus.SimplePreparedTextCorpus(source_file, lowercase=True)
+        document_index = current_domain.compile_documents(corpus)
+        folder = os.path.join(RESULT_FOLDER, 'state', '{}_{}'.format(tag, window_size))
+        state, changed_years = co_occurrence.update_state(folder, corpus, document_index, window_size=window_size, distance_metric=0, normalize='size')
+        logger.info('Updated years: %s', changed_years)
+        store_result(state.compute(), method='HAL', window_size=window_size, distance_metric=0, normalize='size', tag=tag, date=time.strftime("%Y%m%d_%H%M"))
 
 def compute_source_files_by_region_filter(source_files):
 
@@ -57,10 +64,8 @@ def compute_source_files_by_region_filter(source_files):
         document_index = current_domain.compile_documents(corpus)
         for window_size in [5]:
             tag = '{}_{}_{}'.format(tag, region_name.lower().replace(':','_').replace(' ', '_'), 'closed' if closed_region else 'open')
-            result_filename = 'CO_tCoIR_en_45-72.{}_{}_{}_{}.xlsx'.format(time.strftime("%Y%m%d"), method, window_size, tag)
-            print('Result filename: {}'.format(result_filename))
             df = co_occurrence.compute(corpus, document_index, window_size=window_size, distance_metric=0, normalize='size', method=method)
-            store_result(df, result_filename)
+            store_result(df, method=method, window_size=window_size, distance_metric=0, normalize='size', tag=tag, date=time.strftime("%Y%m%d"))
 
 # RUN FOR ENTTIRE CORPUS
 
@@ -1,4 +1,5 @@
 
 from . import text_corpus
 from . import textacy_utility
+from . import phrase_detector
 from . corpus_utils import *
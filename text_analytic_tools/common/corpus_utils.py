@@ -4,7 +4,7 @@ import text_analytic_tools.utility as utility
 
 logger = utility.getLogger("text_analytic_tools")
 
-def store_tokenized_corpus_as_archive(tokenized_docs, target_filename):
+def store_tokenized_corpus_as_archive(tokenized_docs, target_filename, phrase_detector=None):
     """Stores a tokenized (string) corpus to a zip archive
 
     Parameters
@@ -13,6 +13,8 @@ def store_tokenized_corpus_as_archive(tokenized_docs, target_filename):
         [description]
     corpus_source_filepath : [type]
         [description]
+    phrase_detector : PhraseDetector, optional
+        Phrases are joined in the stored tokens (see `phrase_detector.PhraseDetector`)
 
     Returns
     -------
@@ -28,6 +30,9 @@ def store_tokenized_corpus_as_archive(tokenized_docs, target_filename):
 
         for document_id, document_name, chunk_index, tokens in tokenized_docs:
 
+            if phrase_detector is not None:
+                tokens = phrase_detector[tokens]
+
             text = ' '.join([ t.replace(' ', '_') for t in tokens ])
             store_name  = utility.path_add_sequence(document_name, chunk_index, 4)
 
@@ -0,0 +1,159 @@
+import os
+import glob
+import collections
+import multiprocessing
+import concurrent.futures
+
+import gensim
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+PHRASER_FILENAME_PATTERN = 'phraser_{}.gensim'
+
+PHRASE_DELIMITER = '_'
+
+# Joins phrases of lower orders while higher orders are learned and applied. Phrase models split phrases on the
+# delimiter when scoring, so "new_york" + "city" would be scored as "new" + "city" (the trigram is never found).
+PHRASE_JOINER = '\x1f'
+
+# Phrasers of lower orders, set in worker processes by the pool initializer
+_phrasers = None
+
+def _phrase_view(phrasers, tokens):
+    '''Returns `tokens` as seen by the next order's phrase model, phrases of lower orders are single terms'''
+    tokens = [ t.replace(PHRASE_DELIMITER, PHRASE_JOINER) for t in tokens ]
+    for phraser in phrasers:
+        tokens = [ t.replace(PHRASE_DELIMITER, PHRASE_JOINER) for t in phraser[tokens] ]
+    return tokens
+
+def apply_phrasers(phrasers, tokens):
+    '''Returns `tokens` with phrases of all `phrasers` (lowest order first) joined by "_"'''
+    return [ t.replace(PHRASE_JOINER, PHRASE_DELIMITER) for t in _phrase_view(phrasers, tokens) ]
+
+def count_vocab(docs, **phrases_args):
+    '''Returns (vocabulary counts, corpus word count) of unigrams and bigrams in `docs`'''
+    phrases = gensim.models.phrases.Phrases(docs, **phrases_args)
+    return dict(phrases.vocab), phrases.corpus_word_count
+
+def _init_worker(phrasers):
+    global _phrasers
+    _phrasers = phrasers
+
+def _count_shard_task(shard, phrases_args):
+    return count_vocab([ _phrase_view(_phrasers, tokens) for tokens in shard ], **phrases_args)
+
+class PhraseDetector():
+    '''Detects n-gram phrases (e.g. "new_york_city") in tokenized documents using gensim's Phrases
+
+    One phrase model is learned per order (bigrams, then trigrams of bigrams etc.), each in a single streaming pass
+    over the documents with the lower order phrases already joined. Counting is done in parallel over shards of
+    documents whose counts are merged into one model, that is then frozen to a (smaller and faster) `Phraser`.
+    The phrasers are persisted, and should be applied once when the tokenized corpus is written (see
+    `store_tokenized_corpus_as_archive`), so that downstream models read documents with phrases already joined.
+
+    Parameters
+    ----------
+    phrasers : list of gensim.models.phrases.Phraser
+        Frozen phrase models, lowest order first
+    '''
+    def __init__(self, phrasers=None):
+        self.phrasers = list(phrasers or [])
+
+    @property
+    def n_gram_size(self):
+        return len(self.phrasers) + 1
+
+    @staticmethod
+    def learn(doc_iter, n_gram_size=3, min_count=5, threshold=100, n_workers=None, shard_size=10000):
+        '''Learns phrases of up to `n_gram_size` terms
+
+        Parameters
+        ----------
+        doc_iter : callable
+            Returns a new iterator of documents (lists of tokens), called once per order
+        n_workers : int, optional
+            Number of counting processes, default number of CPUs
+        shard_size : int
+            Number of documents counted per task
+        '''
+        detector = PhraseDetector()
+        n_workers = n_workers or os.cpu_count() or 1
+
+        for n_span in range(2, n_gram_size + 1):
+
+            logger.info('Learning {}-gram phrases...'.format(n_span))
+
+            phrases = gensim.models.phrases.Phrases(min_count=min_count, threshold=threshold)
+            vocab, corpus_word_count = detector._count(doc_iter(), n_workers, shard_size)
+            phrases.vocab = collections.defaultdict(int, vocab)
+            phrases.corpus_word_count = corpus_word_count
+
+            detector.phrasers.append(gensim.models.phrases.Phraser(phrases))
+
+        return detector
+
+    def _count(self, docs, n_workers, shard_size):
+
+        # Counting needs all co-occurrences, min_count and threshold apply when phrases are scored
+        phrases_args = dict(min_count=1)
+
+        if n_workers == 1:
+            return count_vocab(( _phrase_view(self.phrasers, tokens) for tokens in docs ), **phrases_args)
+
+        vocab, corpus_word_count = collections.Counter(), 0
+
+        def merge(futures):
+            nonlocal corpus_word_count
+            for future in futures:
+                shard_vocab, shard_word_count = future.result()
+                vocab.update(shard_vocab)
+                corpus_word_count += shard_word_count
+
+        # Spawned (not forked) workers, forking is not safe after numba's parallel threads have been started
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self.phrasers,)
+        ) as executor:
+            # At most two shards per worker are in flight, so that the stream is never read into memory
+            pending = set()
+            for shard in gensim.utils.grouper(docs, shard_size):
+                if len(pending) >= 2 * n_workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    merge(done)
+                pending.add(executor.submit(_count_shard_task, shard, phrases_args))
+            merge(concurrent.futures.as_completed(pending))
+
+        return dict(vocab), corpus_word_count
+
+    def __getitem__(self, tokens):
+        return apply_phrasers(self.phrasers, tokens)
+
+    def transform(self, docs):
+        '''Returns documents (lists of tokens) in `docs` with phrases joined'''
+        return ( self[tokens] for tokens in docs )
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        for n_span, phraser in enumerate(self.phrasers, 2):
+            phraser.save(os.path.join(folder, PHRASER_FILENAME_PATTERN.format(n_span)))
+
+    @staticmethod
+    def load(folder):
+        filenames = glob.glob(os.path.join(folder, PHRASER_FILENAME_PATTERN.format('*')))
+        filenames = sorted(filenames, key=lambda x: int(os.path.basename(x).split('_')[1].split('.')[0]))
+        return PhraseDetector([ gensim.models.phrases.Phraser.load(filename) for filename in filenames ])
+
+    @staticmethod
+    def load_or_learn(folder, doc_iter, n_gram_size=3, **args):
+        '''Loads phrasers stored in `folder`, or learns and stores them if not stored (or of lower order)'''
+        if folder is not None and os.path.isdir(folder):
+            detector = PhraseDetector.load(folder)
+            if detector.n_gram_size >= n_gram_size:
+                detector.phrasers = detector.phrasers[:n_gram_size - 1]
+                return detector
+        detector = PhraseDetector.learn(doc_iter, n_gram_size=n_gram_size, **args)
+        if folder is not None:
+            detector.save(folder)
+        return detector
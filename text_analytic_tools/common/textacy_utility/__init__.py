@@ -2,4 +2,7 @@ from . corpus_container import CorpusContainer
 from . utils import *
 from . file_io import *
 from . preprocess import *
+from . sharded_corpus import ShardedCorpus, store_sharded_corpus, is_sharded_corpus
+from . parse_cache import ParseCache
+from . merged_entities import merge_document_entities, store_merged_entities_variant
 from . load_or_create import *
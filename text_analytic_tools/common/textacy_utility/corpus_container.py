@@ -17,6 +17,7 @@ class CorpusContainer():
         self.nlp = None
         self.word_count_scores = None
         self.document_index = None
+        self.pos_statistics = None
 
     def get_word_count(self, normalize):
         key = 'word_count_' + normalize
@@ -32,6 +33,12 @@ class CorpusContainer():
             self.word_count_scores[key] = utils.generate_word_document_count_score(self.textacy_corpus, normalize, 75)
         return self.word_count_scores[key]
 
+    def get_pos_statistics(self):
+        """Returns POS counts per document (indexed by document_id), computed once per loaded corpus"""
+        if self.pos_statistics is None:
+            self.pos_statistics = utils.get_pos_statistics_frame(self.textacy_corpus)
+        return self.pos_statistics
+
     @staticmethod
     def container():
 
@@ -2,12 +2,16 @@
 import itertools
 import os
 import re
+import time
 
+import numpy as np
 import pandas as pd
 import spacy
 import textacy
 
+from spacy import attrs
 from spacy.language import Language
+from spacy.tokens import Doc
 
 import text_analytic_tools.utility as utility
 
@@ -15,7 +19,13 @@ logger = utility.getLogger('corpus_text_analysis')
 
 LANGUAGE_MODEL_MAP = { 'en': 'en_core_web_sm', 'fr': 'fr_core_news_sm', 'it': 'it_core_web_sm', 'de': 'de_core_web_sm' }
 
-def create_textacy_corpus(corpus_reader, nlp, tick=utility.noop, n_chunk_threshold = 100000):
+def create_textacy_corpus(corpus_reader, nlp, tick=utility.noop, n_chunk_threshold = 100000, batch_size=None, n_process=1, parse_cache=None):
+
+    if batch_size is not None or n_process > 1 or parse_cache is not None:
+        return create_textacy_corpus_batched(
+            corpus_reader, nlp, tick=tick, n_chunk_threshold=n_chunk_threshold, batch_size=batch_size or 100, n_process=n_process,
+            parse_cache=parse_cache
+        )
 
     corpus = textacy.Corpus(nlp)
     counter = 0
@@ -38,6 +48,73 @@ def create_textacy_corpus(corpus_reader, nlp, tick=utility.noop, n_chunk_thresho
 
     return corpus
 
+CHUNK_ATTRS = [ attrs.LEMMA, attrs.POS, attrs.TAG, attrs.DEP, attrs.HEAD, attrs.ENT_IOB, attrs.ENT_TYPE ]
+
+def split_text_chunks(text, chunk_size):
+    '''Splits `text` into chunks of at most `chunk_size` characters, at the last whitespace within a chunk if any'''
+    chunks, i = [], 0
+    while len(text) - i > chunk_size:
+        j = i + chunk_size
+        k = max(text.rfind(' ', i, j), text.rfind('\n', i, j))
+        j = k + 1 if k > i else j
+        chunks.append(text[i:j])
+        i = j
+    chunks.append(text[i:])
+    return chunks
+
+def merge_chunk_docs(vocab, docs):
+    '''Returns a single document of parsed text chunks (as `make_doc_from_text_chunks`)'''
+    if len(docs) == 1:
+        return docs[0]
+    words = [ t.text for doc in docs for t in doc ]
+    spaces = [ bool(t.whitespace_) for doc in docs for t in doc ]
+    doc = Doc(vocab, words=words, spaces=spaces)
+    return doc.from_array(CHUNK_ATTRS, np.concatenate([ d.to_array(CHUNK_ATTRS) for d in docs ], axis=0))
+
+def create_textacy_corpus_batched(corpus_reader, nlp, tick=utility.noop, n_chunk_threshold=100000, batch_size=100, n_process=1, parse_cache=None):
+    '''Creates textacy corpus by parsing documents in batches with `nlp.pipe`, in `n_process` processes
+
+    Documents longer than `n_chunk_threshold` characters are split into chunks that are parsed in the same stream,
+    and merged into one document when all chunks are parsed. `tick` is called with the number of added documents,
+    and throughput (documents and characters per second) is logged per batch. If a `parse_cache` is given, parses
+    of (chunk) texts are reused from the cache, and only new texts are parsed (see `parse_cache.ParseCache`).
+    '''
+    corpus = textacy.Corpus(nlp)
+
+    def chunk_stream():
+        for filename, document_id, text, metadata in corpus_reader:
+            metadata = utility.extend(metadata, dict(filename=filename, document_id=document_id))
+            chunks = split_text_chunks(text, n_chunk_threshold)
+            for chunk_index, chunk in enumerate(chunks):
+                yield chunk, (metadata, chunk_index, len(chunks))
+
+    counter, n_chars, chunk_docs = 0, 0, []
+    start_time = time.time()
+
+    pipe = nlp.pipe if parse_cache is None else parse_cache.pipe
+
+    for doc, (metadata, chunk_index, n_chunks) in pipe(chunk_stream(), as_tuples=True, batch_size=batch_size, n_process=n_process):
+
+        chunk_docs.append(doc)
+        n_chars += len(doc.text)
+
+        if chunk_index < n_chunks - 1:
+            continue
+
+        doc = merge_chunk_docs(nlp.vocab, chunk_docs)
+        chunk_docs = []
+
+        doc._.meta = metadata
+        corpus.add_doc(doc)
+
+        counter += 1
+        if counter % batch_size == 0:
+            elapsed = max(time.time() - start_time, 1e-6)
+            logger.info('%s documents added (%.1f documents/s, %.0f characters/s)...', counter, counter / elapsed, n_chars / elapsed)
+        tick(counter)
+
+    return corpus
+
 @utility.timecall
 def save_corpus(corpus, filename, lang=None, include_tensor=False):
     if not include_tensor:
@@ -1,9 +1,11 @@
 import os
-import textacy
 
 import text_analytic_tools.utility as utility
 import text_analytic_tools.common.textacy_utility as textacy_utility
 import text_analytic_tools.common.text_corpus as text_corpus
+import text_analytic_tools.common.textacy_utility.sharded_corpus as sharded_corpus
+import text_analytic_tools.common.textacy_utility.parse_cache as parse_cache
+import text_analytic_tools.common.textacy_utility.merged_entities as merged_entities
 from text_analytic_tools.domain_config import current_domain as domain_logic
 
 logger = utility.getLogger('corpus_text_analysis')
@@ -19,8 +21,29 @@ def load_or_create(
     use_compression=True,
     disabled_pipes=None,
     domain=None,
-    tick=utility.noop
+    tick=utility.noop,
+    sharded=False,
+    document_filter=None,
+    batch_size=None,
+    n_process=1,
+    codec=None,
+    parse_cache_folder=None
 ):
+    '''Loads textacy corpus of `source_path` (preprocessed, parsed and stored if needed) into `container`
+
+    If `sharded` is True, the corpus is stored in shards (see `sharded_corpus.ShardedCorpus`), and only documents
+    matching `document_filter` (column criteria on the document index, e.g. dict(year=(1958, 1963))) are loaded.
+    The shards are compressed with `codec` (see `sharded_corpus.parse_codec`), default "zstd" if `use_compression`
+    else "none". The codec is part of the corpus filename.
+
+    A new corpus is parsed in batches of `batch_size` documents in `n_process` processes, if given (see
+    `create_textacy_corpus_batched`). If `parse_cache_folder` is given, parses of unchanged documents are reused
+    from the cache, e.g. when the document index or some source files change (see `ParseCache`).
+
+    If `merge_entities` is True, named entities are merged once and the result is stored as a corpus variant
+    (filename suffix "_merged_entities") that is loaded directly next time. Shards are merged in `n_process`
+    processes.
+    '''
     tick = tick or utility.noop
     container = container or textacy_utility.CorpusContainer.container()
     domain = domain or domain_logic
@@ -29,8 +52,11 @@ def load_or_create(
 
     nlp_args = { 'disable': disabled_pipes or [] }
 
-    store_extension = 'bin' if binary_format else 'pkl'
-    store_compression = 'bz2' if use_compression else ''
+    store_extension = 'shards' if sharded else ('bin' if binary_format else 'pkl')
+    assert sharded or codec is None, 'codecs other than bz2 are supported by the sharded corpus store only'
+    codec = (codec or ('zstd' if use_compression else 'none')) if sharded else None
+
+    store_compression = codec if sharded else ('bz2' if use_compression else '')
 
     container.source_path = source_path
     container.language = language
@@ -40,17 +66,27 @@ def load_or_create(
     if not os.path.isfile(container.prepped_source_path):
         textacy_utility.preprocess_text(container.source_path, container.prepped_source_path, tick=tick)
 
-    container.textacy_corpus_path = textacy_utility.generate_corpus_filename(
+    corpus_filename = lambda merged: textacy_utility.generate_corpus_filename(
         container.prepped_source_path,
         container.language,
         nlp_args=nlp_args,
         extension=store_extension,
-        compression=store_compression
+        compression=store_compression,
+        merge_entities=merged
     )
 
+    is_stored = lambda path: sharded_corpus.is_sharded_corpus(path) if sharded else os.path.isfile(path)
+
+    container.textacy_corpus_path = corpus_filename(False)
+    merged_corpus_path = corpus_filename(True) if merge_entities else None
+
     container.nlp = textacy_utility.setup_nlp_language_model(container.language, **nlp_args)
 
-    if overwrite or not os.path.isfile(container.textacy_corpus_path):
+    if merge_entities and not overwrite and is_stored(merged_corpus_path):
+
+        container.textacy_corpus_path = merged_corpus_path
+
+    elif overwrite or not is_stored(container.textacy_corpus_path):
 
         logger.info('Computing new corpus ' + container.textacy_corpus_path + '...')
 
@@ -62,21 +98,49 @@ def load_or_create(
         tick(0, len(reader.filenames))
 
         logger.info('Creating corpus (this might take some time)...')
-        container.textacy_corpus = textacy_utility.create_textacy_corpus(stream, container.nlp, tick)
+        container.textacy_corpus = textacy_utility.create_textacy_corpus(
+            stream, container.nlp, tick, batch_size=batch_size, n_process=n_process,
+            parse_cache=parse_cache.ParseCache(parse_cache_folder, container.nlp, config=dict(tokenizer='keep_hyphen')) if parse_cache_folder else None
+        )
 
         logger.info('Storing corpus (this might take some time)...')
-        textacy_utility.save_corpus(container.textacy_corpus, container.textacy_corpus_path)
+        if sharded:
+            sharded_corpus.store_sharded_corpus(
+                container.textacy_corpus, container.textacy_corpus_path, codec=codec
+            )
+            if document_filter or merge_entities:
+                container.textacy_corpus = None
+        else:
+            textacy_utility.save_corpus(container.textacy_corpus, container.textacy_corpus_path)
 
         tick(0)
 
-    else:
+    if merge_entities and container.textacy_corpus_path != merged_corpus_path:
+
+        logger.info('Merging named entities (result is stored as {})...'.format(merged_corpus_path))
+
+        if sharded:
+            merged_entities.store_merged_entities_variant(container.textacy_corpus_path, merged_corpus_path, n_workers=n_process)
+        else:
+            if container.textacy_corpus is None:
+                container.textacy_corpus = textacy_utility.load_corpus(container.textacy_corpus_path, container.nlp)
+            merge_named_entities(container)
+            textacy_utility.save_corpus(container.textacy_corpus, merged_corpus_path)
+
+        container.textacy_corpus_path = merged_corpus_path
+
+    if container.textacy_corpus is None and sharded:
+        tick(1, 2)
+        logger.info('...reading corpus shards...')
+        store = sharded_corpus.ShardedCorpus(container.textacy_corpus_path, container.nlp)
+        container.textacy_corpus = store.load(**(document_filter or {}))
+        container.pos_statistics = store.pos_statistics()
+
+    elif container.textacy_corpus is None:
         tick(1, 2)
         logger.info('...reading corpus (this might take several minutes)...')
         container.textacy_corpus = textacy_utility.load_corpus(container.textacy_corpus_path, container.nlp)
 
-    if merge_entities:
-        merge_named_entities(container)
-
     tick(0)
     logger.info('Done!')
 
@@ -84,11 +148,4 @@ def load_or_create(
 
 def merge_named_entities(container):
     logger.info('Working: Merging named entities...')
-    try:
-        for doc in container.textacy_corpus:
-            named_entities = textacy.extract.entities(doc)
-            textacy.spacier.utils.merge_spans(named_entities, doc)
-    except Exception as ex:
-        logger.error(ex)
-        logger.info('NER merge failed')
-
+    merged_entities.merge_corpus_entities(container.textacy_corpus)
@@ -0,0 +1,93 @@
+import os
+import json
+import shutil
+import multiprocessing
+import concurrent.futures
+
+import pandas as pd
+import spacy
+import textacy
+
+from spacy.tokens import DocBin
+from spacy.vocab import Vocab
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.common.textacy_utility.sharded_corpus as sharded_corpus
+
+logger = utility.getLogger('corpus_text_analysis')
+
+def merge_document_entities(doc):
+    '''Merges named entities (as selected by textacy.extract.entities) of `doc` into single tokens, in one retokenize batch
+
+    Merged tokens get the tag and dependency of the entity's root token and the entity's label (as spaCy's
+    merge_entities pipeline component).
+    '''
+    entities = spacy.util.filter_spans(list(textacy.extract.entities(doc)))
+    with doc.retokenize() as retokenizer:
+        for entity in entities:
+            retokenizer.merge(entity, attrs={ 'TAG': entity.root.tag_, 'DEP': entity.root.dep_, 'ENT_TYPE': entity.label_ })
+    return doc
+
+def _try_merge_document_entities(doc):
+    # A failing document is logged and kept unmerged, so that one bad entity span doesn't fail the whole corpus
+    try:
+        return merge_document_entities(doc)
+    except Exception as ex:
+        meta = getattr(doc._, 'meta', None) or {}
+        logger.error('NER merge failed for document %s: %s', meta.get('filename', meta.get('document_id', '?')), ex)
+        return doc
+
+def merge_corpus_entities(corpus):
+    '''Merges named entities of all documents in `corpus` (in place), documents that fail are logged and left unmerged'''
+    for doc in corpus:
+        _try_merge_document_entities(doc)
+    return corpus
+
+def _merge_shard_task(source_folder, target_folder, shard, codec, attrs):
+    # Documents are created with a blank vocabulary, since all strings are stored in the DocBin
+    with open(os.path.join(source_folder, sharded_corpus.SHARD_FILENAME_PATTERN.format(shard)), 'rb') as f:
+        doc_bin = sharded_corpus.unpack_doc_bin(f.read(), codec)
+    merged_bin = DocBin(attrs=attrs, store_user_data=True)
+    n_tokens = []
+    for doc in doc_bin.get_docs(Vocab()):
+        merged_bin.add(_try_merge_document_entities(doc))
+        n_tokens.append(len(doc))
+    with open(os.path.join(target_folder, sharded_corpus.SHARD_FILENAME_PATTERN.format(shard)), 'wb') as f:
+        f.write(sharded_corpus.pack_doc_bin(merged_bin, codec))
+    return shard, n_tokens
+
+def store_merged_entities_variant(source_folder, target_folder, n_workers=None):
+    '''Stores a variant of sharded corpus in `source_folder` with named entities merged, in `target_folder`
+
+    Shards are merged in parallel in `n_workers` processes, the document index is copied with updated token counts.
+    '''
+    with open(os.path.join(source_folder, sharded_corpus.CORPUS_DATA_FILENAME)) as f:
+        corpus_data = json.load(f)
+
+    os.makedirs(target_folder, exist_ok=True)
+    n_workers = n_workers or os.cpu_count() or 1
+    shards = list(range(0, corpus_data['n_shards']))
+    args = (source_folder, target_folder, corpus_data['codec'], corpus_data['attrs'])
+
+    logger.info('Merging named entities of %s shards...', len(shards))
+
+    n_tokens = {}
+    if n_workers == 1 or len(shards) < 2:
+        n_tokens.update(_merge_shard_task(args[0], args[1], shard, args[2], args[3]) for shard in shards)
+    else:
+        # Spawned (not forked) workers, forking is not safe after numba's parallel threads have been started
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_workers, len(shards)), mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [ executor.submit(_merge_shard_task, args[0], args[1], shard, args[2], args[3]) for shard in shards ]
+            n_tokens.update(future.result() for future in concurrent.futures.as_completed(futures))
+
+    documents = pd.read_parquet(os.path.join(source_folder, sharded_corpus.DOCUMENT_INDEX_FILENAME))
+    documents['n_tokens'] = [ n_tokens[shard][position] for shard, position in zip(documents.shard, documents.position) ]
+    documents.to_parquet(os.path.join(target_folder, sharded_corpus.DOCUMENT_INDEX_FILENAME))
+
+    if os.path.isfile(os.path.join(target_folder, sharded_corpus.POS_STATISTICS_FILENAME)):
+        os.remove(os.path.join(target_folder, sharded_corpus.POS_STATISTICS_FILENAME))
+
+    # Corpus data is written last, the variant is not a valid store until all shards are written
+    shutil.copyfile(os.path.join(source_folder, sharded_corpus.CORPUS_DATA_FILENAME), os.path.join(target_folder, sharded_corpus.CORPUS_DATA_FILENAME))
+
+    logger.info('Stored corpus with merged entities in %s', target_folder)
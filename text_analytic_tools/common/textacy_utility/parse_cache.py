@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import itertools
+
+import spacy
+
+from spacy.tokens import DocBin
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.common.textacy_utility.sharded_corpus as sharded_corpus
+
+logger = utility.getLogger('corpus_text_analysis')
+
+def nlp_fingerprint(nlp, **config):
+    '''Returns sha1 hex digest of language model name, version and pipeline (and additional `config`, e.g. tokenizer options)'''
+    meta = nlp.meta or {}
+    key = dict(
+        spacy=spacy.__version__,
+        lang=meta.get('lang', nlp.lang),
+        name=meta.get('name', None),
+        version=meta.get('version', None),
+        pipeline=list(nlp.pipe_names),
+        config=config
+    )
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class ParseCache():
+    '''Content-addressed cache of parsed documents
+
+    A document's parse is stored under the hash of its text, in a folder per language model fingerprint (model name,
+    version, pipeline and `config`), so that a parse is reused by any corpus containing the same text, regardless of
+    file names, document index or post-processing such as merged entities. Each parse is stored as a DocBin
+    (without user data) compressed with `codec`, and written atomically.
+
+    Parameters
+    ----------
+    folder : str
+        Cache root folder
+    nlp : spacy.language.Language
+        Language model, documents not in the cache are parsed with this model
+    config : dict, optional
+        Additional options that affect the parse (part of the fingerprint)
+    '''
+    def __init__(self, folder, nlp, codec='lz4', config=None):
+        self.nlp = nlp
+        self.codec = codec
+        self.folder = os.path.join(folder, nlp_fingerprint(nlp, **(config or {})))
+        self.n_hits = 0
+        self.n_misses = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], key + '.spacy')
+
+    def get(self, text):
+        '''Returns cached parse of `text`, or None if not cached'''
+        path = self._path(text_hash(text))
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        return next(sharded_corpus.unpack_doc_bin(data, self.codec).get_docs(self.nlp.vocab))
+
+    def put(self, text, doc):
+        path = self._path(text_hash(text))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        doc_bin = DocBin(attrs=sharded_corpus.DEFAULT_ATTRS, store_user_data=False)
+        doc_bin.add(doc)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write(sharded_corpus.pack_doc_bin(doc_bin, self.codec))
+        os.replace(temp_path, path)
+
+    def pipe(self, texts, as_tuples=False, batch_size=100, n_process=1, block_size=None):
+        '''Yields parsed documents of `texts` in order (as `nlp.pipe`), only texts not in the cache are parsed
+
+        Texts are processed in blocks of `block_size` (default ten batches per process). Cache misses of a block
+        are parsed with `nlp.pipe` in `n_process` processes and stored in the cache.
+        '''
+        block_size = block_size or 10 * batch_size * n_process
+        stream = iter(texts if as_tuples else ( (text, None) for text in texts ))
+
+        while True:
+
+            block = list(itertools.islice(stream, block_size))
+            if len(block) == 0:
+                break
+
+            docs = [ self.get(text) for text, _ in block ]
+            misses = [ i for i, doc in enumerate(docs) if doc is None ]
+
+            self.n_hits += len(block) - len(misses)
+            self.n_misses += len(misses)
+
+            if len(misses) > 0:
+                parsed = self.nlp.pipe(( block[i][0] for i in misses ), batch_size=batch_size, n_process=n_process)
+                for i, doc in zip(misses, parsed):
+                    self.put(block[i][0], doc)
+                    docs[i] = doc
+
+            for doc, (_, context) in zip(docs, block):
+                yield (doc, context) if as_tuples else doc
+
+        logger.info('Parse cache: %s documents reused, %s parsed', self.n_hits, self.n_misses)
@@ -0,0 +1,241 @@
+import os
+import bz2
+import json
+import zlib
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+import textacy
+
+from spacy import attrs as spacy_attrs
+from spacy.tokens import DocBin
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.common.textacy_utility.utils as textacy_utils
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = utility.getLogger('corpus_text_analysis')
+
+CORPUS_DATA_FILENAME = 'corpus_data.json'
+DOCUMENT_INDEX_FILENAME = 'documents.parquet'
+POS_STATISTICS_FILENAME = 'pos_statistics.parquet'
+SHARD_FILENAME_PATTERN = 'shard_{:05d}.spacy'
+
+DEFAULT_ATTRS = [ 'ORTH', 'LEMMA', 'NORM', 'POS', 'TAG', 'HEAD', 'DEP', 'ENT_IOB', 'ENT_TYPE' ]
+
+CODECS = [ 'none', 'lz4', 'zstd', 'bz2' ]
+
+DEFAULT_CODEC_LEVELS = { 'lz4': 0, 'zstd': 3, 'bz2': 9 }
+
+def parse_codec(codec):
+    '''Returns (name, level) of codec given as "name" or "name-level", e.g. "zstd-9" (None or "" is "none")'''
+    name, _, level = (codec or 'none').partition('-')
+    assert name in CODECS, 'unknown codec {} (expected one of {})'.format(name, ', '.join(CODECS))
+    assert name not in ('zstd',) or zstandard is not None, 'zstd codec requires the zstandard package'
+    assert name not in ('lz4',) or lz4 is not None, 'lz4 codec requires the lz4 package'
+    return name, int(level) if level != '' else DEFAULT_CODEC_LEVELS.get(name, None)
+
+def compress(content, codec):
+    name, level = parse_codec(codec)
+    if name == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(content)
+    if name == 'lz4':
+        return lz4.frame.compress(content, compression_level=level)
+    if name == 'bz2':
+        return bz2.compress(content, level)
+    return content
+
+def decompress(data, codec):
+    name, _ = parse_codec(codec)
+    if name == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    if name == 'lz4':
+        return lz4.frame.decompress(data)
+    if name == 'bz2':
+        return bz2.decompress(data)
+    return data
+
+def pack_doc_bin(doc_bin, codec):
+    # DocBin content is zlib compressed by spaCy, it is stored decompressed and (optionally) recompressed
+    return compress(zlib.decompress(doc_bin.to_bytes()), codec)
+
+def unpack_doc_bin(data, codec):
+    # Level 0 (stored) zlib is required by DocBin.from_bytes and costs a copy only
+    return DocBin().from_bytes(zlib.compress(decompress(data, codec), 0))
+
+def document_filter(documents, **criteria):
+    '''Returns boolean mask of documents in `documents` that match all `criteria`
+
+    A criterion is a column name and either a value, a list or set of values, a (low, high) tuple of an inclusive
+    range, or a function (of the column series) returning a mask, e.g. year=(1958, 1963), pope=['pius-xii']
+    '''
+    mask = pd.Series(True, index=documents.index)
+    for column, value in criteria.items():
+        series = documents[column]
+        if callable(value):
+            mask &= value(series)
+        elif isinstance(value, tuple):
+            low, high = value
+            mask &= series.between(low, high)
+        elif isinstance(value, (list, set, frozenset)):
+            mask &= series.isin(value)
+        else:
+            mask &= series == value
+    return mask.values
+
+def store_sharded_corpus(corpus, folder, shard_size=1000, codec=None, attrs=None, document_index=None, n_workers=None):
+    '''Stores textacy corpus (or any iterable of documents) as spaCy DocBins, one per shard of `shard_size` documents
+
+        corpus_data.json        shard count, codec and serialized attributes
+        documents.parquet       document metadata (doc._.meta) and shard, position of document in shard
+        shard_NNNNN.spacy       DocBin of the shard's documents, compressed with codec
+        pos_statistics.parquet  POS counts per document, created on first use (see `ShardedCorpus.pos_statistics`)
+
+    Document tensors are never stored. Shards are serialized as the documents are read, and compressed and written
+    in `n_workers` threads (zstd, lz4 and bz2 release the GIL).
+
+    Parameters
+    ----------
+    codec : str, optional
+        "none" (default, fastest to load), "lz4", "zstd" or "bz2", with optional level e.g. "zstd-9" (see `parse_codec`)
+    document_index : pandas.DataFrame, optional
+        Additional metadata merged into the document index on document_id
+    '''
+    os.makedirs(folder, exist_ok=True)
+
+    parse_codec(codec)
+
+    if os.path.isfile(os.path.join(folder, POS_STATISTICS_FILENAME)):
+        os.remove(os.path.join(folder, POS_STATISTICS_FILENAME))
+
+    attrs = attrs or DEFAULT_ATTRS
+    metadata = []
+    doc_bin, shard = None, 0
+    n_workers = n_workers or os.cpu_count() or 1
+
+    def store_shard(doc_bin, shard):
+        with open(os.path.join(folder, SHARD_FILENAME_PATTERN.format(shard)), 'wb') as f:
+            f.write(pack_doc_bin(doc_bin, codec))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+
+        futures = []
+        for i, doc in enumerate(corpus):
+
+            if i % shard_size == 0:
+                if doc_bin is not None:
+                    futures.append(executor.submit(store_shard, doc_bin, shard))
+                    shard += 1
+                doc_bin = DocBin(attrs=attrs, store_user_data=True)
+
+            doc_bin.add(doc)
+            metadata.append(utility.extend(dict(doc._.meta), dict(shard=shard, position=i % shard_size, n_tokens=len(doc))))
+
+        if doc_bin is not None:
+            futures.append(executor.submit(store_shard, doc_bin, shard))
+
+        for future in futures:
+            future.result()
+
+    documents = pd.DataFrame(metadata)
+    if document_index is not None and 'document_id' in documents.columns:
+        columns = [ x for x in document_index.columns if x not in documents.columns ]
+        documents = pd.merge(documents, document_index[columns], left_on='document_id', right_index=True, how='left')
+
+    documents.to_parquet(os.path.join(folder, DOCUMENT_INDEX_FILENAME))
+
+    with open(os.path.join(folder, CORPUS_DATA_FILENAME), 'w') as f:
+        json.dump(dict(n_shards=shard + 1 if len(metadata) > 0 else 0, n_documents=len(metadata), codec=codec or 'none', attrs=attrs), f)
+
+    logger.info('Stored %s documents in %s shards in %s', len(metadata), shard + 1, folder)
+
+def is_sharded_corpus(folder):
+    return os.path.isfile(os.path.join(folder, CORPUS_DATA_FILENAME))
+
+class ShardedCorpus():
+    '''Textacy corpus stored in shards (see `store_sharded_corpus`) that can be partially loaded
+
+    Only the document index is read when the store is opened. Documents are loaded by filter on the document index
+    (e.g. year, pope, genre), and only shards containing selected documents are read, in parallel, so that the cost
+    of opening a subset is proportional to its size.
+
+    Parameters
+    ----------
+    folder : str
+        Store folder
+    nlp : spacy.language.Language
+        Language model whose vocabulary is used for the loaded documents
+    '''
+    def __init__(self, folder, nlp, n_workers=None):
+        self.folder = folder
+        self.nlp = nlp
+        self.n_workers = n_workers or os.cpu_count() or 1
+        with open(os.path.join(folder, CORPUS_DATA_FILENAME)) as f:
+            self.corpus_data = json.load(f)
+        self.document_index = pd.read_parquet(os.path.join(folder, DOCUMENT_INDEX_FILENAME))
+
+    def select(self, **criteria):
+        '''Returns the document index of documents matching `criteria` (see `document_filter`)'''
+        return self.document_index[document_filter(self.document_index, **criteria)]
+
+    def _read_shard(self, shard):
+        with open(os.path.join(self.folder, SHARD_FILENAME_PATTERN.format(shard)), 'rb') as f:
+            data = f.read()
+        # Read, decompression and unpacking of DocBin arrays do not need the vocabulary, and run in worker threads
+        return unpack_doc_bin(data, self.corpus_data['codec'])
+
+    def iter_docs(self, selected=None):
+        '''Yields documents (in document index order) of `selected` documents (a document index subset), default all'''
+
+        selected = self.document_index if selected is None else selected
+        shards = sorted(selected.shard.unique())
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.n_workers, len(shards)))) as executor:
+            # Shards are read in parallel, but documents are yielded in shard order
+            for shard, doc_bin in zip(shards, executor.map(self._read_shard, shards)):
+                positions = set(selected.position[selected.shard == shard])
+                # Documents are created in the consuming thread, since strings are added to the (shared) vocabulary
+                for position, doc in enumerate(doc_bin.get_docs(self.nlp.vocab)):
+                    if position in positions:
+                        yield doc
+
+    def load(self, **criteria):
+        '''Returns textacy corpus of documents matching `criteria` (see `document_filter`), e.g. load(year=(1958, 1963))'''
+        selected = self.select(**criteria)
+        logger.info('Loading %s of %s documents from %s shards...', len(selected), len(self.document_index), selected.shard.nunique())
+        return textacy.Corpus(self.nlp, data=list(self.iter_docs(selected)))
+
+    def _count_shard_pos(self, shard):
+        doc_bin = self._read_shard(shard)
+        column = list(doc_bin.attrs).index(spacy_attrs.POS)
+        return textacy_utils.count_pos([ tokens[:, column] for tokens in doc_bin.tokens ])
+
+    def pos_statistics(self):
+        '''Returns POS counts (documents x POS_NAMES, same counts as `get_pos_statistics`) indexed by document_id
+
+        Counts are computed from the POS column of the shards' DocBin arrays (no documents are created), with
+        shards read and counted in parallel threads. The result is cached in the store folder.
+        '''
+        path = os.path.join(self.folder, POS_STATISTICS_FILENAME)
+
+        if not os.path.isfile(path):
+            shards = list(range(0, self.corpus_data['n_shards']))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.n_workers, len(shards)))) as executor:
+                matrices = list(executor.map(self._count_shard_pos, shards))
+            matrix = np.concatenate(matrices, axis=0) if len(matrices) > 0 else np.zeros((0, len(textacy_utils.POS_NAMES)), dtype=np.int64)
+            df = pd.DataFrame(matrix, columns=textacy_utils.POS_NAMES)
+            # Shards are stored in document index order
+            df.index = pd.Index(self.document_index.document_id.values, name='document_id')
+            df.to_parquet(path)
+
+        return pd.read_parquet(path)
@@ -2,9 +2,11 @@ import itertools
 import text_analytic_tools.utility as utility
 import re
 import collections
+import numpy as np
 import pandas as pd
 
 from spacy import attrs
+from spacy.parts_of_speech import IDS as POS_SYMBOL_IDS
 
 def generate_word_count_score(corpus, normalize, count):
     wc = corpus.word_counts(normalize=normalize, weighting='count', as_strings=True)
@@ -45,15 +47,16 @@ def get_document_by_id(corpus, document_id, field_name='document_id'):
     assert False, 'Document {} not found in corpus'.format(document_id)
     return None
 
-def generate_corpus_filename(source_path, language, nlp_args=None, preprocess_args=None, compression='bz2', period_group='', extension='bin'):
+def generate_corpus_filename(source_path, language, nlp_args=None, preprocess_args=None, compression='bz2', period_group='', extension='bin', merge_entities=False):
     nlp_args = nlp_args or {}
     preprocess_args = preprocess_args or {}
     disabled_pipes = nlp_args.get('disable', ())
-    suffix = '_{}_{}{}_{}'.format(
+    suffix = '_{}_{}{}_{}{}'.format(
         language,
         '_'.join([ k for k in preprocess_args if preprocess_args[k] ]),
         '_disable({})'.format(','.join(disabled_pipes)) if len(disabled_pipes) > 0 else '',
-        (period_group or '')
+        (period_group or ''),
+        '_merged_entities' if merge_entities else ''
     )
     filename = utility.path_add_suffix(source_path, suffix, new_extension='.' + extension)
     if (compression or '') != '':
@@ -136,18 +139,50 @@ def get_pos_statistics(doc):
     stats = utility.extend(dict(POS_TO_COUNT), pos_counts)
     return stats
 
-def get_corpus_data(corpus, document_index, title, columns_of_interest=None):
-    metadata = [
-        utility.extend({},
-                       dict(document_id=doc._.meta['document_id']),
-                       get_pos_statistics(doc)
-                      )
-        for doc in corpus
-    ]
-    df = pd.DataFrame(metadata)[['document_id'] + POS_NAMES]
+# POS counted by get_pos_statistics (NUM is listed but never counted), as spaCy symbol ids in POS_NAMES order
+POS_COUNTED_IDS = np.array([ int(POS_SYMBOL_IDS[x]) if x != 'NUM' else -1 for x in POS_NAMES ])
+
+def count_pos(pos_arrays):
+    '''Returns documents x POS_NAMES count matrix of documents given as arrays of POS symbol ids (same counts as get_pos_statistics)'''
+    pos_arrays = [ np.asarray(x, dtype=np.int64).ravel() for x in pos_arrays ]
+    n_symbols = max(int(x) for x in POS_SYMBOL_IDS.values()) + 1
+    if len(pos_arrays) == 0:
+        return np.zeros((0, len(POS_NAMES)), dtype=np.int64)
+    lengths = [ len(x) for x in pos_arrays ]
+    document_ids = np.repeat(np.arange(0, len(pos_arrays)), lengths)
+    pos_ids = np.concatenate(pos_arrays) if sum(lengths) > 0 else np.zeros(0, dtype=np.int64)
+    counts = np.bincount(document_ids * n_symbols + pos_ids, minlength=len(pos_arrays) * n_symbols).reshape(len(pos_arrays), n_symbols)
+    matrix = counts[:, np.maximum(POS_COUNTED_IDS, 0)]
+    matrix[:, POS_COUNTED_IDS < 0] = 0
+    return matrix
+
+def get_pos_statistics_matrix(docs):
+    '''Returns documents x POS_NAMES count matrix of `docs`, POS ids are read with doc.to_array (no Python token loop)'''
+    return count_pos([ doc.to_array(attrs.POS) for doc in docs ])
+
+def get_pos_statistics_frame(docs, document_id='document_id'):
+    '''Returns POS counts (POS_NAMES columns) of `docs` indexed by document id in doc._.meta'''
+    docs = list(docs)
+    return pd.DataFrame(
+        get_pos_statistics_matrix(docs),
+        columns=POS_NAMES,
+        index=pd.Index([ doc._.meta[document_id] for doc in docs ], name=document_id)
+    )
+
+def get_corpus_data(corpus, document_index, title, columns_of_interest=None, pos_statistics=None):
+    '''Returns document index of documents in `corpus` with counts of POS_NAMES and total words
+
+    `pos_statistics` are precomputed counts for (a superset of) the documents indexed by document_id, e.g. from
+    `CorpusContainer.get_pos_statistics` or `ShardedCorpus.pos_statistics` (otherwise counts are computed)
+    '''
+    if pos_statistics is None:
+        df = get_pos_statistics_frame(corpus)
+    else:
+        df = pos_statistics.loc[[ doc._.meta['document_id'] for doc in corpus ]]
+    df = df[POS_NAMES].reset_index()
     if columns_of_interest is not None:
         document_index = document_index[columns_of_interest]
     df = pd.merge(df, document_index, left_on='document_id', right_index=True, how='inner')
     df['title'] = df[title]
-    df['words'] = df[POS_NAMES].apply(sum, axis=1)
-    return df
\ No newline at end of file
+    df['words'] = df[POS_NAMES].values.sum(axis=1)
+    return df
@@ -91,11 +91,11 @@ def get_extended_treaties(lang='en'):
     return treaties
 
 def get_corpus_documents(corpus):
-    metadata = [ utility.extend({}, doc._.meta, textacy_utility.get_pos_statistics(doc)) for doc in corpus ]
-    df = pd.DataFrame(metadata)[['treaty_id', 'filename', 'signed_year', 'party1', 'party2', 'topic1', 'is_cultural'] + textacy_utility.POS_NAMES]
+    df = pd.DataFrame([ doc._.meta for doc in corpus ])[['treaty_id', 'filename', 'signed_year', 'party1', 'party2', 'topic1', 'is_cultural']]
+    df[textacy_utility.POS_NAMES] = textacy_utility.get_pos_statistics_matrix(corpus)
     df['title'] = df.treaty_id
     df['lang'] = df.filename.str.extract(r'\w{4,6}\_(\w\w)')
-    df['words'] = df[textacy_utility.POS_NAMES].apply(sum, axis=1)
+    df['words'] = df[textacy_utility.POS_NAMES].values.sum(axis=1)
     return df
 
 def get_region_document_index(source_path, region_name, closed_region, pattern='*.txt'):
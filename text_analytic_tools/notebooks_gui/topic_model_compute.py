@@ -2,10 +2,11 @@ import ipywidgets
 import pandas as pd
 import text_analytic_tools.utility as utility
 import text_analytic_tools.text_analysis.topic_model as topic_model
+import text_analytic_tools.text_analysis.topic_model_sweep as topic_model_sweep
 
 logger = utility.getLogger('corpus_text_analysis')
 
-def compute_topic_model(data_folder, method, terms, document_index, vectorizer_args, topic_modeller_args, n_topic_window=0):
+def compute_topic_model(data_folder, method, terms, document_index, vectorizer_args, topic_modeller_args, n_topic_window=0, n_workers=None, extract_args=None):
 
     result = None
 
@@ -14,15 +15,11 @@ def compute_topic_model(data_folder, method, terms, document_index, vectorizer_a
         n_topics = topic_modeller_args['n_topics']
         apply_idf = vectorizer_args['apply_idf']
 
-        window_coherences = [ ]
+        if n_topic_window == 0:
 
-        for x_topics in range(max(n_topics - n_topic_window, 2), n_topics + n_topic_window + 1):
+            logger.info('Computing model with {} topics...'.format(n_topics))
 
-            topic_modeller_args['n_topics'] = x_topics
-
-            logger.info('Computing model with {} topics...'.format(x_topics))
-
-            data = topic_model.compute(
+            result = topic_model.compute(
                 ### corpus=corpus,
                 terms=terms,
                 documents=document_index,
@@ -31,25 +28,38 @@ def compute_topic_model(data_folder, method, terms, document_index, vectorizer_a
                 vec_args=vectorizer_args,
                 ### tokenizer_args=tokenizer_args,
                 tm_args=topic_modeller_args,
-                tfidf_weiging=apply_idf
+                tfidf_weiging=apply_idf,
+                extract_args=extract_args
             )
 
-            if x_topics == n_topics:
-                result = data
+            logger.info('#topics: {}, coherence_score {} perplexity {}'.format(n_topics, result.coherence_score, result.perplexity_score))
+
+        else:
+
+            n_topics_range = topic_model_sweep.n_topics_window(n_topics, n_topic_window)
+
+            logger.info('Computing models with {} topics...'.format(n_topics_range))
+
+            results = topic_model_sweep.sweep(
+                terms,
+                document_index,
+                method,
+                n_topics_range,
+                vec_args=vectorizer_args,
+                tm_args=topic_modeller_args,
+                n_workers=n_workers,
+                keep_models=[ n_topics ],
+                tfidf_weiging=apply_idf,
+                extract_args=extract_args
+            )
 
-            p_score = data.perplexity_score
-            c_score = data.coherence_score
-            logger.info('#topics: {}, coherence_score {} perplexity {}'.format(x_topics, c_score, p_score))
+            models, coherence_scores = topic_model_sweep.sweep_scores(results)
 
-            if n_topic_window > 0:
-                window_coherences.append({'n_topics': x_topics, 'perplexity_score': p_score, 'coherence_score': c_score})
+            if n_topics not in models:
+                raise ValueError('no model computed for {} topics (window {})'.format(n_topics, n_topics_range))
 
-        if n_topic_window > 0:
-            #df = pd.DataFrame(window_coherences)
-            #df['n_topics'] = df.n_topics.astype(int)
-            #df = df.set_index('n_topics')
-            #model_result.coherence_scores = df
-            result.coherence_scores = pd.DataFrame(window_coherences).set_index('n_topics')
+            result = models[n_topics]
+            result.coherence_scores = coherence_scores
 
             #df.to_excel(utility.path_add_timestamp('perplexity.xlsx'))
             #df['perplexity_score'].plot.line()
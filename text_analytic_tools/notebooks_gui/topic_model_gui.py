@@ -19,10 +19,13 @@ from IPython.display import display
 
 ENGINE_OPTIONS = [
     ('MALLET LDA', 'gensim_mallet-lda'),
+    ('Gibbs LDA (native)', 'gensim_gibbs-lda'),
     ('gensim LDA', 'gensim_lda'),
+    ('gensim LDA (multicore)', 'gensim_lda-multicore'),
     ('gensim LSI', 'gensim_lsi'),
     ('gensim HDP', 'gensim_hdp'),
     ('gensim DTM', 'gensim_dtm'),
+    ('gensim DTM (LDA hot start)', 'gensim_dtm-hot'),
     ('scikit LDA', 'sklearn_lda'),
     ('scikit NMF', 'sklearn_nmf'),
     ('scikit LSA', 'sklearn_lsa'),
@@ -48,6 +51,7 @@ class ComputeTopicModelUserInterface():
 
     def __init__(self, data_folder, state, document_index, **opts):
         self.terms = []
+        self.extract_args = None
         self.data_folder = data_folder
         self.state = state
         self.document_index = document_index
@@ -107,13 +111,15 @@ class ComputeTopicModelUserInterface():
 
                     vectorizer_args = dict(apply_idf=self.model_widgets.apply_idf.value)
 
-                    topic_modeller_args = dict(n_topics=self.model_widgets.n_topics.value, max_iter=self.model_widgets.max_iter.value, learning_method='online', n_jobs=1)
+                    topic_modeller_args = dict(n_topics=self.model_widgets.n_topics.value, max_iter=self.model_widgets.max_iter.value, learning_method='online')
 
                     method = self.model_widgets.method.value
 
                     terms = list(self.get_corpus_terms(corpus))
 
-                    self.state.data = compute_topic_model(self.data_folder, method, terms, self.document_index, vectorizer_args, topic_modeller_args)
+                    self.state.data = compute_topic_model(
+                        self.data_folder, method, terms, self.document_index, vectorizer_args, topic_modeller_args, extract_args=self.extract_args
+                    )
 
                     topics = topic_model_utility.get_topics_unstacked(self.state.topic_model, n_tokens=100, id2term=self.state.id2term, topic_ids=self.state.relevant_topics)
 
@@ -199,6 +205,8 @@ class TextacyCorpusUserInterface(ComputeTopicModelUserInterface):
     def get_corpus_terms(self, corpus):
 
         tokenizer_args = self.compile_tokenizer_args(vocab=corpus.spacy_lang.vocab)
+        # Stored with the model, used for tokenizing new documents (see topic_model_inference)
+        self.extract_args = tokenizer_args
         terms = [ list(doc) for doc in textacy_utility.extract_corpus_terms(corpus, tokenizer_args) ]
         return terms
 
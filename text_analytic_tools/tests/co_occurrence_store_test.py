@@ -0,0 +1,107 @@
+import os
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from text_analytic_tools.text_analysis.co_occurrence import result_store
+from text_analytic_tools.text_analysis.co_occurrence.result_store import CoOccurrenceStore
+
+def create_co_occurrence_frame():
+    return pd.DataFrame({
+        'year':   [ 2000, 2000, 2000, 2001, 2001 ],
+        'x_term': [ 'a', 'a', 'b', 'a', 'c' ],
+        'y_term': [ 'b', 'c', 'c', 'b', 'd' ],
+        'nw_xy':  [ 3, 1, 2, 5, 4 ],
+        'nw_x':   [ 4, 4, 2, 5, 4 ],
+        'nw_y':   [ 5, 3, 3, 5, 4 ],
+        'cwr':    [ 0.3, 0.1, 0.2, 0.5, 0.4 ]
+    })
+
+class test_CoOccurrenceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = CoOccurrenceStore(self.temp_dir.name)
+        self.run_params = dict(method='HAL', window_size=5, tag='test')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_run_key_orders_known_parameters_first_and_skips_none(self):
+        key = result_store.run_key(tag='x', zeta=1, method='HAL', alpha='a/b', window_size=None)
+        self.assertEqual(os.path.join('method=HAL', 'tag=x', 'alpha=ab', 'zeta=1'), key)
+
+    def test_run_key_when_no_parameters_fails(self):
+        with self.assertRaises(AssertionError):
+            result_store.run_key(method=None)
+
+    def test_compact_frame_encodes_terms_as_int32_ids(self):
+        df = create_co_occurrence_frame()
+        data, vocabulary = result_store.compact_frame(df)
+        self.assertEqual([ 'year', 'x_id', 'y_id' ] + result_store.VALUE_COLUMNS, list(data.columns))
+        self.assertEqual(np.int32, data.x_id.dtype)
+        self.assertEqual(np.int32, data.nw_xy.dtype)
+        self.assertEqual(np.float32, data.cwr.dtype)
+        self.assertEqual([ 'a', 'b', 'c', 'd' ], sorted(vocabulary.token))
+        tokens = vocabulary.set_index('token_id').token
+        pairs = set(zip(data.year, tokens[data.x_id].values, tokens[data.y_id].values))
+        self.assertEqual(set(zip(df.year, df.x_term, df.y_term)), pairs)
+
+    def test_store_and_load_returns_stored_pairs(self):
+        df = create_co_occurrence_frame()
+        self.store.store(df, **self.run_params)
+        self.assertTrue(self.store.exists(**self.run_params))
+        result = self.store.load(**self.run_params)
+        self.assertEqual(len(df), len(result))
+        self.assertEqual(
+            sorted(zip(df.year, df.x_term, df.y_term, df.nw_xy)),
+            sorted(zip(result.year, result.x_term.astype(str), result.y_term.astype(str), result.nw_xy))
+        )
+        self.assertTrue(isinstance(result.x_term.dtype, pd.CategoricalDtype))
+
+    def test_load_when_year_and_term_filters_returns_matching_pairs(self):
+        self.store.store(create_co_occurrence_frame(), **self.run_params)
+        result = self.store.load(year=2000, term='c', columns=[ 'nw_xy' ], **self.run_params)
+        self.assertEqual([ 2000, 2000 ], list(result.year))
+        self.assertTrue(all('c' in (x, y) for x, y in zip(result.x_term, result.y_term)))
+        self.assertEqual([ 'year', 'x_id', 'y_id', 'x_term', 'y_term', 'nw_xy' ], list(result.columns))
+        self.assertEqual(0, len(self.store.load(term='unknown', **self.run_params)))
+
+    def test_load_when_term_is_on_both_sides_returns_each_pair_once(self):
+        df = create_co_occurrence_frame()
+        self.store.store(df, **self.run_params)
+        for term in [ 'a', 'b', 'c', 'd', [ 'b', 'c' ] ]:
+            terms = term if isinstance(term, list) else [ term ]
+            expected = df[df.x_term.isin(terms) | df.y_term.isin(terms)]
+            result = self.store.load(term=term, **self.run_params)
+            self.assertEqual(
+                sorted(zip(expected.year, expected.x_term, expected.y_term)),
+                sorted(zip(result.year, result.x_term.astype(str), result.y_term.astype(str)))
+            )
+
+    def test_store_when_term_lookup_reads_only_matching_row_groups(self):
+        self.store.store(create_co_occurrence_frame(), row_group_size=1, **self.run_params)
+        token2id = { token: token_id for token_id, token in self.store.vocabulary(**self.run_params).items() }
+        for data_folder, column in [ ('data', 'x_id'), ('data_by_y', 'y_id') ]:
+            dataset = self.store.dataset(data_folder, **self.run_params)
+            self.assertEqual(5, sum(len(f.split_by_row_group()) for f in dataset.get_fragments()))
+            expression = ds.field(column) == token2id['d' if column == 'y_id' else 'c']
+            row_groups = [ g for f in dataset.get_fragments(expression) for g in f.split_by_row_group(expression) ]
+            self.assertEqual(1, len(row_groups))
+
+    def test_top_pairs_returns_n_top_pairs_per_year(self):
+        self.store.store(create_co_occurrence_frame(), **self.run_params)
+        result = self.store.top_pairs(n_top=1, **self.run_params)
+        self.assertEqual([ (2000, 'a', 'b'), (2001, 'a', 'b') ], list(zip(result.year, result.x_term.astype(str), result.y_term.astype(str))))
+
+    def test_runs_returns_parameters_of_stored_runs(self):
+        df = create_co_occurrence_frame()
+        self.store.store(df, **self.run_params)
+        self.store.store(df, **dict(self.run_params, window_size=10))
+        runs = self.store.runs().sort_values('window_size')
+        self.assertEqual([ 5, 10 ], list(runs.window_size))
+        self.assertEqual([ len(df) ] * 2, list(runs.n_rows))
+        self.assertEqual([ 4 ] * 2, list(runs.n_tokens))
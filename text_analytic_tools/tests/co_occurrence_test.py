@@ -0,0 +1,198 @@
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from text_analytic_tools.text_analysis.co_occurrence import windows
+from text_analytic_tools.text_analysis.co_occurrence.compute import compute
+from text_analytic_tools.text_analysis.co_occurrence.hal_state import HalState, update_state
+from text_analytic_tools.text_analysis.co_occurrence.vectorizer_hal import HyperspaceAnalogueToLanguageVectorizer
+from text_analytic_tools.text_analysis.co_occurrence.vectorizer_glove import GloveVectorizer
+
+class test_HalWindows(unittest.TestCase):
+
+    def test_fit_when_documents_are_separate_does_not_count_pairs_across_documents(self):
+        vectorizer = HyperspaceAnalogueToLanguageVectorizer().fit([['a', 'b'], ['c', 'd']], size=5)
+        df = vectorizer.to_df()
+        self.assertEqual(5, df.loc['b', 'a'])
+        self.assertEqual(5, df.loc['d', 'c'])
+        self.assertEqual(0, df.loc['c', 'b'])
+
+    def test_fit_when_boundaries_specified_does_not_count_pairs_across_segments(self):
+        vectorizer = HyperspaceAnalogueToLanguageVectorizer().fit([['a', 'b', 'c', 'd']], size=5, boundaries=[[2]])
+        df = vectorizer.to_df()
+        self.assertEqual(5, df.loc['b', 'a'])
+        self.assertEqual(5, df.loc['d', 'c'])
+        self.assertEqual(0, df.loc['c', 'b'])
+        self.assertEqual([1, 2, 1, 2], list(vectorizer.nw_x))
+
+    def test_fit_when_boundaries_concatenated_equals_separate_documents(self):
+        documents = [['a', 'b', 'a', 'c'], ['b', 'b', 'c'], ['c', 'a']]
+        merged = [sum(documents, [])]
+        boundaries = [windows.chunk_offsets([len(x) for x in documents])]
+        expected = HyperspaceAnalogueToLanguageVectorizer().fit(documents, size=2)
+        result = HyperspaceAnalogueToLanguageVectorizer(token2id=expected.token2id).fit(merged, size=2, boundaries=boundaries)
+        self.assertTrue((expected.nw_xy.toarray() == result.nw_xy.toarray()).all())
+        self.assertTrue((expected.nw_x == result.nw_x).all())
+
+    def test_filtered_offsets_maps_offsets_onto_filtered_sequence(self):
+        keep = [True, False, True, True, False, True]
+        result = windows.filtered_offsets(keep, [0, 2, 4])
+        self.assertEqual([0, 1, 3], list(result))
+
+class test_GloveVectorizer(unittest.TestCase):
+
+    def test_fit_computes_upper_triangular_inverse_distance_weights(self):
+        vectorizer = GloveVectorizer(token2id={ 'a': 0, 'b': 1, 'c': 2 }).fit([['a', 'b', 'c', 'a']], size=2)
+        matrix = vectorizer.nw_xy.toarray()
+        self.assertEqual(0.0, np.tril(matrix).sum())
+        self.assertAlmostEqual(1.0 + 0.5, matrix[0, 1])
+        self.assertAlmostEqual(0.5 + 1.0, matrix[0, 2])
+        self.assertAlmostEqual(1.0, matrix[1, 2])
+        self.assertEqual([4, 2, 3], list(vectorizer.nw_x))
+
+    def test_cooccurence_when_fitted_has_marginals_and_normalized_cwr(self):
+        vectorizer = GloveVectorizer().fit([['a', 'b', 'c', 'a'], ['b', 'c']], size=2)
+        df = vectorizer.cooccurence(normalize='size')
+        self.assertTrue((df.nw_x > 0).all())
+        self.assertTrue((df.nw_y > 0).all())
+        self.assertTrue((df.cwr > 0).all())
+
+    def test_cooccurence_when_zero_diagonal_is_false_includes_self_cooccurrences(self):
+        corpus = [['a', 'b', 'a', 'c']]
+        vectorizer = GloveVectorizer().fit(corpus, size=2, zero_out_diag=False)
+        self.assertAlmostEqual(0.5, vectorizer.nw_xy[0, 0])
+        df = vectorizer.cooccurence(normalize=None, zero_diagonal=False)
+        self.assertEqual(1, len(df[df.x_term == df.y_term]))
+        df = vectorizer.cooccurence(normalize=None, zero_diagonal=True)
+        self.assertEqual(0, len(df[df.x_term == df.y_term]))
+
+    def test_train_when_diagonal_is_kept_ignores_diagonal(self):
+        corpus = [['a', 'b', 'a', 'c', 'b', 'c']]
+        expected = GloveVectorizer().fit(corpus, size=2).train(n_components=4, epochs=2, n_threads=1, random_state=0)
+        result = GloveVectorizer().fit(corpus, size=2, zero_out_diag=False).train(n_components=4, epochs=2, n_threads=1, random_state=0)
+        self.assertTrue(np.allclose(expected.word_vectors, result.word_vectors))
+
+    def test_train_reduces_loss(self):
+        random = np.random.RandomState(0)
+        corpus = [ [ 'w{}'.format(x) for x in random.zipf(1.5, 50) % 30 ] for _ in range(0, 20) ]
+        vectorizer = GloveVectorizer().fit(corpus, size=3).train(n_components=10, epochs=10, n_threads=2, random_state=0)
+        self.assertEqual((len(vectorizer.token2id), 10), vectorizer.word_vectors.shape)
+        self.assertLess(vectorizer.losses[-1], vectorizer.losses[0])
+
+    def test_losses_before_train_is_none(self):
+        self.assertIsNone(GloveVectorizer().losses)
+
+class test_HalState(unittest.TestCase):
+
+    class SimpleCorpus():
+
+        def __init__(self, documents):
+            self.documents = documents
+
+        def get_texts(self):
+            return iter(self.documents)
+
+    def create_batch(self, documents, years, offset=0):
+        corpus = self.SimpleCorpus(documents)
+        document_index = pd.DataFrame({
+            'filename': [ 'doc_{}.txt'.format(offset + i) for i in range(0, len(documents)) ],
+            'year': years
+        })
+        return corpus, document_index
+
+    def test_update_when_folded_in_batches_equals_full_compute(self):
+        documents = [ ['alpha', 'beta', 'gamma'], ['beta', 'gamma', 'delta'], ['delta', 'alpha', 'epsilon'], ['gamma', 'zeta', 'alpha'] ]
+        years = [ 2000, 2001, 2000, 2001 ]
+
+        expected = compute(*self.create_batch(documents, years), window_size=2, distance_metric=0)
+
+        state = HalState(window_size=2, distance_metric=0)
+        self.assertEqual([2000, 2001], state.update(*self.create_batch(documents[:2], years[:2])))
+        self.assertEqual([2000, 2001], state.update(*self.create_batch(documents[2:], years[2:], offset=2)))
+
+        result = state.compute()
+
+        key = [ 'year', 'x_term', 'y_term' ]
+        self.assertEqual(
+            expected.set_index(key).sort_index().nw_xy.to_dict(),
+            result.set_index(key).sort_index().nw_xy.to_dict()
+        )
+        self.assertEqual(0, state.token2id['alpha'])
+        self.assertEqual(5, state.token2id['zeta'])
+
+    def test_update_skips_documents_already_folded_in_and_keeps_unchanged_frames(self):
+        state = HalState(window_size=2, distance_metric=0)
+        state.update(*self.create_batch([ ['alpha', 'beta'], ['gamma', 'delta'] ], [ 2000, 2001 ]))
+        frame = state.cooccurrence(2000)
+        corpus, document_index = self.create_batch([ ['alpha', 'beta'], ['beta', 'gamma'] ], [ 2000, 2001 ])
+        document_index['filename'] = [ 'doc_0.txt', 'doc_2.txt' ]
+        changed_years = state.update(corpus, document_index)
+        self.assertEqual([2001], changed_years)
+        self.assertIs(frame, state.cooccurrence(2000))
+
+    def test_update_when_document_index_has_no_document_key_raises(self):
+        state = HalState(window_size=2, distance_metric=0)
+        corpus, document_index = self.create_batch([ ['alpha', 'beta'] ], [ 2000 ])
+        with self.assertRaises(ValueError):
+            state.update(corpus, document_index.drop(columns=['filename']))
+        self.assertEqual({}, state.years)
+
+    def test_update_when_keyed_by_document_id_skips_documents_already_folded_in(self):
+        state = HalState(window_size=2, distance_metric=0)
+        corpus, document_index = self.create_batch([ ['alpha', 'beta'], ['gamma', 'delta'] ], [ 2000, 2000 ])
+        document_index = document_index.drop(columns=['filename']).assign(document_id=[ 0, 1 ])
+        state.update(corpus, document_index)
+        nw_xy = state.years[2000].nw_xy.copy()
+        self.assertEqual([], state.update(corpus, document_index))
+        self.assertEqual(0, (state.years[2000].nw_xy != nw_xy).nnz)
+        self.assertEqual('document_id', state.document_key)
+
+    def test_update_state_when_stored_state_has_different_run_parameters_raises(self):
+        corpus, document_index = self.create_batch([ ['alpha', 'beta', 'gamma'] ], [ 2000 ])
+        with tempfile.TemporaryDirectory() as folder:
+            update_state(folder, corpus, document_index, window_size=2, distance_metric=0, top_k=5)
+            with self.assertRaises(ValueError):
+                update_state(folder, corpus, document_index, window_size=2, distance_metric=0, top_k=10)
+            with self.assertRaises(ValueError):
+                update_state(folder, corpus, document_index, window_size=2, distance_metric=0, top_k=5, normalize='year')
+            _, changed_years = update_state(folder, corpus, document_index, window_size=2, distance_metric=0, top_k=5)
+        self.assertEqual([], changed_years)
+
+    def test_store_and_load_returns_equal_state(self):
+        state = HalState(window_size=2, distance_metric=0)
+        state.update(*self.create_batch([ ['alpha', 'beta', 'gamma'], ['gamma', 'delta', 'alpha'] ], [ 2000, 2001 ]))
+        state.cooccurrence(2000)
+        with tempfile.TemporaryDirectory() as folder:
+            state.store(folder)
+            loaded = HalState.load(folder)
+        self.assertEqual(state.token2id, loaded.token2id)
+        self.assertEqual(state.documents, loaded.documents)
+        self.assertEqual([2000], list(loaded.frames.keys()))
+        self.assertTrue(state.compute().equals(loaded.compute()))
+
+class test_CooccurrenceFramePruning(unittest.TestCase):
+
+    def create_vectorizer(self):
+        random = np.random.RandomState(1)
+        corpus = [ [ 'w{}'.format(x) for x in random.zipf(1.5, 200) % 40 ] for _ in range(0, 10) ]
+        return HyperspaceAnalogueToLanguageVectorizer().fit(corpus, size=3)
+
+    def test_cooccurence_when_no_pruning_equals_frame_filtered_afterwards(self):
+        vectorizer = self.create_vectorizer()
+        df = vectorizer.cooccurence()
+        pruned = vectorizer.cooccurence(min_nw_xy=5, min_cwr=0.0001)
+        expected = df[(df.nw_xy >= 5) & (df.cwr >= 0.0001)].reset_index(drop=True)
+        self.assertTrue(len(pruned) < len(df))
+        self.assertTrue(expected.equals(pruned))
+
+    def test_cooccurence_when_top_k_keeps_pair_if_among_top_k_of_either_term(self):
+        vectorizer = self.create_vectorizer()
+        df = vectorizer.cooccurence()
+        pruned = vectorizer.cooccurence(top_k=3)
+        x_rank = df.groupby('x_id').cwr.rank(method='first', ascending=False)
+        y_rank = df.groupby('y_id').cwr.rank(method='first', ascending=False)
+        expected = df[(x_rank <= 3) | (y_rank <= 3)].reset_index(drop=True)
+        self.assertEqual(len(expected), len(pruned))
+        self.assertEqual(set(zip(expected.x_id, expected.y_id)), set(zip(pruned.x_id, pruned.y_id)))
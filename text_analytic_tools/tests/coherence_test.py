@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+import gensim
+
+from text_analytic_tools.text_analysis import topic_model_corpus
+from text_analytic_tools.text_analysis.coherence import CoherenceService
+
+def create_corpus():
+    random = np.random.RandomState(0)
+    terms = [ [ 'w0' ] + [ 'w{}'.format(x) for x in random.zipf(1.3, random.randint(0, 150)) % 100 ] for _ in range(0, 40) ]
+    return terms, topic_model_corpus.TrainCorpus.build(terms)
+
+class test_CoherenceService(unittest.TestCase):
+
+    def setUp(self):
+        self.terms, self.train_corpus = create_corpus()
+        self.service = CoherenceService(self.train_corpus)
+        random = np.random.RandomState(1)
+        self.topics = [ random.choice(len(self.train_corpus.id2word), 10, replace=False) for _ in range(0, 4) ]
+        # Include a word that occurs in all documents (gensim versions differ in how they count documents without topic words)
+        self.topics[0][0] = self.train_corpus.id2word.token2id['w0']
+
+    def assert_equals_gensim_coherence(self, coherence, **kwargs):
+        expected = gensim.models.CoherenceModel(
+            topics=[ [ self.train_corpus.id2word[i] for i in topic ] for topic in self.topics ],
+            dictionary=self.train_corpus.id2word,
+            coherence=coherence,
+            processes=1,
+            **kwargs
+        ).get_coherence_per_topic()
+        _, result = self.service.score(self.topics, coherence=coherence)
+        self.assertTrue(np.allclose(expected, result))
+
+    def test_score_c_v_equals_gensim_coherence(self):
+        self.assert_equals_gensim_coherence('c_v', texts=self.terms)
+
+    def test_score_c_npmi_equals_gensim_coherence(self):
+        self.assert_equals_gensim_coherence('c_npmi', texts=self.terms)
+
+    def test_score_u_mass_equals_gensim_coherence(self):
+        self.assert_equals_gensim_coherence('u_mass', corpus=self.train_corpus.bow_corpus)
+
+    def test_window_index_when_scored_twice_reuses_cached_statistics(self):
+        self.service.score(self.topics, coherence='c_npmi')
+        index = self.service.window_index(10)
+        self.service.score(self.topics, coherence='c_npmi')
+        self.assertIs(index, self.service.window_index(10))
@@ -0,0 +1,32 @@
+import unittest
+
+import spacy
+
+from text_analytic_tools.common.textacy_utility import file_io
+
+TEXTS = [
+    'The first document is short.',
+    'The second document is a long one, that is split into chunks when parsed. It has two sentences.',
+    'Third.'
+]
+
+def create_reader():
+    return ( ('d{}.txt'.format(i), i, text, dict(year=2000 + i)) for i, text in enumerate(TEXTS) )
+
+class test_CreateTextacyCorpus(unittest.TestCase):
+
+    def test_split_text_chunks_splits_at_whitespace(self):
+        chunks = file_io.split_text_chunks(TEXTS[1], 30)
+        self.assertEqual(TEXTS[1], ''.join(chunks))
+        self.assertTrue(all(len(x) <= 30 for x in chunks))
+        self.assertTrue(all(x.endswith(' ') for x in chunks[:-1]))
+        self.assertEqual([ 'abc' ], file_io.split_text_chunks('abc', 30))
+
+    def test_create_textacy_corpus_when_batched_returns_all_documents_in_order(self):
+        nlp = spacy.blank('en')
+        ticks = []
+        corpus = file_io.create_textacy_corpus(create_reader(), nlp, tick=ticks.append, n_chunk_threshold=30, batch_size=2)
+        self.assertEqual(TEXTS, [ doc.text for doc in corpus ])
+        self.assertEqual([ len(nlp(text)) for text in TEXTS ], [ len(doc) for doc in corpus ])
+        self.assertEqual([ dict(year=2000 + i, filename='d{}.txt'.format(i), document_id=i) for i in range(0, 3) ], [ doc._.meta for doc in corpus ])
+        self.assertEqual([ 1, 2, 3 ], ticks)
@@ -0,0 +1,129 @@
+import os
+import types
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy as np
+import pandas as pd
+import gensim
+
+from gensim.models.ldaseqmodel import LdaPost
+
+from text_analytic_tools.text_analysis import dtm_topic_model
+from text_analytic_tools.text_analysis import topic_model_utility
+
+TERMS = [
+    [ 'a', 'b', 'c', 'a', 'f' ],
+    [ 'b', 'c', 'd', 'g' ],
+    [ 'a', 'e', 'e', 'b', 'f' ],
+    [ 'c', 'a', 'b', 'h', 'h' ],
+    [ 'd', 'g', 'g', 'e' ],
+    [ 'a', 'h', 'f', 'f' ]
+]
+
+YEARS = [ 2001, 2000, 2002, 2000, 2001, 2002 ]
+
+def create_corpus():
+    id2word = gensim.corpora.Dictionary(TERMS)
+    bow_corpus = [ id2word.doc2bow(tokens) for tokens in TERMS ]
+    return bow_corpus, id2word
+
+def create_model(bow_corpus=None, workers=1, **kwargs):
+    default_corpus, id2word = create_corpus()
+    document_order, time_slice = dtm_topic_model.compute_time_slices(pd.DataFrame({ 'year': YEARS }), 'year')
+    return dtm_topic_model.DtmTopicModel(
+        bow_corpus or default_corpus, time_slice=time_slice, document_order=document_order, id2word=id2word, num_topics=2,
+        passes=2, random_state=1, em_min_iter=1, workers=workers, **kwargs
+    )
+
+class test_DtmTopicModel(unittest.TestCase):
+
+    def test_compute_time_slices_when_index_is_unsorted_returns_order_and_counts(self):
+        document_order, time_slice = dtm_topic_model.compute_time_slices(pd.DataFrame({ 'year': YEARS }), 'year')
+        self.assertEqual([ 2, 2, 2 ], time_slice)
+        self.assertEqual([ 2000, 2000, 2001, 2001, 2002, 2002 ], [ YEARS[i] for i in document_order ])
+
+    def test_fit_document_equals_lda_post(self):
+        bow_corpus, _ = create_corpus()
+        topics = np.log(np.random.RandomState(1).dirichlet(np.ones(8), size=3).T)
+        alpha = np.full(3, 0.1)
+        ldapost = LdaPost(max_doc_len=5, num_topics=3, lda=types.SimpleNamespace(num_topics=3, alpha=alpha, topics=topics))
+        ldapost.doc = bow_corpus[0]
+        ldapost.gamma = np.zeros(3)
+        ldapost.lhood = np.zeros(4)
+        ldapost.fit_lda_post(0, 0, None, lda_inference_max_iter=25)
+        ids = np.array([ i for i, _ in bow_corpus[0] ])
+        counts = np.array([ c for _, c in bow_corpus[0] ], dtype=np.float64)
+        gamma, phi, _ = dtm_topic_model.fit_document(ids, counts, topics, alpha, 25)
+        self.assertTrue(np.allclose(ldapost.gamma, gamma, atol=1e-6))
+        self.assertTrue(np.allclose(ldapost.phi[:len(ids)], phi, atol=1e-6))
+
+    def test_document_topic_matrix_is_in_original_document_order(self):
+        model = create_model(em_max_iter=1)
+        theta = model.get_document_topic_matrix()
+        self.assertEqual((len(TERMS), 2), theta.shape)
+        self.assertTrue(np.allclose(1.0, theta.sum(axis=1)))
+        self.assertTrue(np.allclose(model.gammas[0] / model.gammas[0].sum(), theta[model.document_order[0]]))
+        self.assertEqual((2, len(model.id2word)), model.get_topics().shape)
+
+    def test_model_when_checkpoint_exists_resumes_training(self):
+        folder = tempfile.mkdtemp()
+        try:
+            model = create_model(em_max_iter=0, checkpoint_folder=folder)
+            self.assertTrue(os.path.isfile(os.path.join(folder, dtm_topic_model.CHECKPOINT_FILENAME)))
+            iterations = model.em_iteration
+            model = create_model(em_max_iter=iterations + 1, checkpoint_folder=folder)
+            self.assertTrue(model.em_iteration > iterations)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_model_when_checkpoint_is_for_other_corpus_does_not_resume(self):
+        folder = tempfile.mkdtemp()
+        try:
+            create_model(em_max_iter=0, checkpoint_folder=folder)
+            bow_corpus, _ = create_corpus()
+            changed_corpus = [ bow_corpus[1], bow_corpus[0] ] + bow_corpus[2:]
+            resumed = []
+            resume = dtm_topic_model.DtmTopicModel._resume_from_checkpoint
+            def spy(model):
+                resumed.append(resume(model))
+                return resumed[-1]
+            with unittest.mock.patch.object(dtm_topic_model.DtmTopicModel, '_resume_from_checkpoint', spy):
+                create_model(changed_corpus, em_max_iter=0, checkpoint_folder=folder)
+                create_model(changed_corpus, em_max_iter=0, checkpoint_folder=folder, alphas=0.05)
+                create_model(changed_corpus, em_max_iter=0, checkpoint_folder=folder, alphas=0.05)
+            self.assertEqual([ False, False, True ], resumed)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_model_when_multiprocess_equals_single_process(self):
+        # Same hot start for both models
+        bow_corpus, id2word = create_corpus()
+        lda_model = gensim.models.LdaModel(bow_corpus, id2word=id2word, num_topics=2, alpha=0.01, random_state=1, dtype=np.float64)
+        expected = create_model(em_max_iter=1, workers=1, lda_model=lda_model)
+        result = create_model(em_max_iter=1, workers=2, lda_model=lda_model)
+        self.assertEqual(expected.em_iteration, result.em_iteration)
+        self.assertTrue(np.allclose(expected.gammas, result.gammas))
+        self.assertTrue(np.allclose(expected.get_topics(), result.get_topics()))
+        self.assertTrue(np.allclose(expected.get_document_topic_matrix(), result.get_document_topic_matrix()))
+
+    def test_model_when_hot_started_compiles_document_topics_in_document_index_order(self):
+        # DTM-HOT as set up by topic_model.setup_gensim_algorithms (topic_model is not imported here, since it
+        # requires gensim 3.x), with metadata compiled from an unsorted document index
+        bow_corpus, id2word = create_corpus()
+        documents = pd.DataFrame({ 'document_id': range(0, len(YEARS)), 'year': YEARS })
+        document_order, time_slice = dtm_topic_model.compute_time_slices(documents, 'year')
+        model = dtm_topic_model.DtmTopicModel(
+            corpus=bow_corpus, id2word=id2word, num_topics=2, time_slice=time_slice, document_order=document_order,
+            passes=2, em_max_iter=1, em_min_iter=1, workers=1, random_state=1
+        )
+        theta = topic_model_utility.get_document_topic_matrix(model, bow_corpus)
+        self.assertTrue(np.allclose(model.get_document_topic_matrix(), theta))
+        df = topic_model_utility.compile_document_topics(model, bow_corpus, documents, minimum_probability=0.0)
+        self.assertEqual(sorted(documents.index), sorted(df.index.unique()))
+        for document_id in documents.index:
+            position = list(document_order).index(document_id)
+            expected = model.gammas[position] / model.gammas[position].sum()
+            self.assertTrue(np.allclose(expected, df.loc[[ document_id ]].sort_values('topic_id').weight.values))
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+import gensim
+
+from text_analytic_tools.text_analysis import gibbs_topic_model
+
+def create_planted_corpus(n_documents=200, random_state=0):
+    # Two topics with disjoint vocabularies, each document mainly from one of them
+    rs = np.random.RandomState(random_state)
+    vocabularies = [ [ 'a{}'.format(i) for i in range(0, 20) ], [ 'b{}'.format(i) for i in range(0, 20) ] ]
+    terms = [ list(rs.choice(vocabularies[d % 2], 30)) for d in range(0, n_documents) ]
+    id2word = gensim.corpora.Dictionary(terms)
+    return terms, id2word, [ id2word.doc2bow(tokens) for tokens in terms ]
+
+class test_GibbsTopicModel(unittest.TestCase):
+
+    def assert_recovers_planted_topics(self, workers):
+        terms, id2word, bow_corpus = create_planted_corpus()
+        model = gibbs_topic_model.GibbsTopicModel(
+            bow_corpus, id2word=id2word, num_topics=2, iterations=50, optimize_burn_in=20, workers=workers, random_seed=1
+        )
+        topics = model.get_topics()
+        is_a = np.array([ id2word[i].startswith('a') for i in range(0, len(id2word)) ])
+        self.assertTrue(np.allclose(1.0, topics.sum(axis=1)))
+        self.assertGreater(max(topics[0, is_a].sum(), topics[0, ~is_a].sum()), 0.95)
+        theta = model.get_document_topic_matrix()
+        self.assertEqual((len(terms), 2), theta.shape)
+        self.assertNotEqual(np.argmax(theta[0]), np.argmax(theta[1]))
+        self.assertEqual(sum(len(x) for x in terms), model.doc_topic_counts.sum())
+
+    def test_train_recovers_planted_topics(self):
+        self.assert_recovers_planted_topics(workers=1)
+
+    def test_train_when_multithreaded_recovers_planted_topics(self):
+        self.assert_recovers_planted_topics(workers=3)
+
+    def test_corpus2tokens_expands_bow_counts(self):
+        token_ids, offsets = gibbs_topic_model.corpus2tokens([ [ (0, 2), (3, 1) ], [], [ (1, 1.0) ] ])
+        self.assertEqual([ 0, 0, 3, 1 ], list(token_ids))
+        self.assertEqual([ 0, 3, 3, 4 ], list(offsets))
+
+    def test_corpus2tokens_when_weights_are_not_counts_fails(self):
+        with self.assertRaises(AssertionError):
+            gibbs_topic_model.corpus2tokens([ [ (0, 0.6), (3, 1) ] ])
+
+    def test_train_when_multithreaded_with_same_seed_gives_same_counts(self):
+        _, id2word, bow_corpus = create_planted_corpus(n_documents=60)
+        models = [
+            gibbs_topic_model.GibbsTopicModel(bow_corpus, id2word=id2word, num_topics=3, iterations=10, workers=3, random_seed=2)
+                for _ in range(0, 2)
+        ]
+        self.assertTrue(np.array_equal(models[0].word_topics, models[1].word_topics))
+        self.assertEqual(30 * 60, models[0].word_topics.sum())
+
+    def test_sample_documents_keeps_shared_counts_and_tracks_changes_as_sparse_deltas(self):
+        _, id2word, bow_corpus = create_planted_corpus(n_documents=40)
+        model = gibbs_topic_model.GibbsTopicModel(id2word=id2word, num_topics=4)
+        token_ids, offsets = gibbs_topic_model.corpus2tokens(bow_corpus)
+        z = np.random.RandomState(3).randint(0, 4, size=len(token_ids)).astype(np.int32)
+        nwt, nt = model._count_word_topics(token_ids, z)
+        word_offsets, word_topics = gibbs_topic_model._index_word_topics(nwt)
+        self.assertEqual(np.count_nonzero(nwt), len(word_topics))
+        self.assertEqual(list(np.nonzero(nwt[5])[0]), list(word_topics[word_offsets[5]:word_offsets[6]]))
+        partitions = np.array([ 0, 40 ])
+        slot_starts, n_slots = gibbs_topic_model.delta_slots(token_ids, offsets, partitions, model.num_terms, 4)
+        self.assertLessEqual(n_slots, 2 * len(token_ids))
+        slot_nnz = np.zeros((1, model.num_terms), dtype=np.int32)
+        slot_topics, slot_counts = np.empty(n_slots, dtype=np.int32), np.empty(n_slots, dtype=np.int32)
+        shared_nwt, local_nt = nwt.copy(), nt.copy()
+        gibbs_topic_model._sample_documents(
+            token_ids, offsets, 0, 40, z, nwt, word_offsets, word_topics, local_nt,
+            slot_starts[0], slot_nnz[0], slot_topics, slot_counts, model.alpha, 0.01, 0.01 * model.num_terms, 1
+        )
+        self.assertTrue(np.array_equal(shared_nwt, nwt))
+        delta = np.zeros_like(nwt)
+        for w in range(0, model.num_terms):
+            for j in range(slot_starts[0, w], slot_starts[0, w] + slot_nnz[0, w]):
+                delta[w, slot_topics[j]] += slot_counts[j]
+        expected_nwt, expected_nt = model._count_word_topics(token_ids, z)
+        self.assertTrue(np.array_equal(expected_nwt, nwt + delta))
+        self.assertTrue(np.array_equal(expected_nt, local_nt))
+
+    def test_optimize_alpha_when_documents_are_sparse_decreases_alpha(self):
+        alpha = np.array([ 1.0, 1.0 ])
+        topic_ids, counts, doc_lengths = np.array([ 0, 1, 0, 1 ]), np.array([ 10, 10, 10, 10 ]), np.array([ 10, 10, 10, 10 ])
+        self.assertTrue(np.all(gibbs_topic_model.optimize_alpha(alpha, topic_ids, counts, doc_lengths) < 1.0))
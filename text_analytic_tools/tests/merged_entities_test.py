@@ -0,0 +1,59 @@
+import os
+import unittest
+import tempfile
+import unittest.mock as mock
+
+import spacy
+
+from spacy.tokens import Span
+
+from text_analytic_tools.common.textacy_utility import sharded_corpus, merged_entities
+from text_analytic_tools.common.textacy_utility import utils as textacy_utils
+
+def create_docs(nlp):
+    docs = []
+    for i in range(0, 5):
+        doc = nlp('Pope John Paul met the people of New York in {}'.format(1980 + i))
+        doc.ents = [ Span(doc, 1, 3, label='PERSON'), Span(doc, 7, 9, label='GPE') ]
+        doc._.meta = dict(document_id=i, filename='d{}.txt'.format(i), year=1980 + i)
+        docs.append(doc)
+    return docs
+
+class test_merged_entities(unittest.TestCase):
+
+    def setUp(self):
+        self.nlp = spacy.blank('en')
+
+    def test_merge_document_entities_merges_entities_into_single_tokens(self):
+        doc = merged_entities.merge_document_entities(create_docs(self.nlp)[0])
+        self.assertEqual([ 'Pope', 'John Paul', 'met', 'the', 'people', 'of', 'New York', 'in', '1980' ], [ t.text for t in doc ])
+        self.assertEqual([ ('John Paul', 'PERSON'), ('New York', 'GPE') ], [ (e.text, e.label_) for e in doc.ents ])
+
+    def test_merge_corpus_entities_when_a_document_fails_keeps_it_unmerged_and_merges_others(self):
+        docs = create_docs(self.nlp)
+        merge = merged_entities.merge_document_entities
+        def failing_merge(doc):
+            if doc._.meta['document_id'] == 2:
+                raise ValueError('bad span')
+            return merge(doc)
+        with mock.patch.object(merged_entities, 'merge_document_entities', side_effect=failing_merge):
+            merged_entities.merge_corpus_entities(docs)
+        self.assertEqual([ 9, 9, 11, 9, 9 ], [ len(doc) for doc in docs ])
+
+    def test_store_merged_entities_variant_stores_merged_documents_and_token_counts(self):
+        docs = create_docs(self.nlp)
+        with tempfile.TemporaryDirectory() as folder:
+            source_folder, target_folder = os.path.join(folder, 'corpus'), os.path.join(folder, 'corpus_merged_entities')
+            sharded_corpus.store_sharded_corpus(docs, source_folder, shard_size=2, codec='zstd')
+            merged_entities.store_merged_entities_variant(source_folder, target_folder, n_workers=2)
+            store = sharded_corpus.ShardedCorpus(target_folder, self.nlp)
+            corpus = store.load()
+            self.assertEqual([ d._.meta for d in docs ], [ d._.meta for d in corpus ])
+            self.assertTrue(all(len(doc) == 9 and doc[6].text == 'New York' for doc in corpus))
+            self.assertEqual([ 9 ] * 5, list(store.document_index.n_tokens))
+            self.assertEqual([ 11 ] * 5, list(sharded_corpus.ShardedCorpus(source_folder, self.nlp).document_index.n_tokens))
+
+    def test_generate_corpus_filename_when_merged_entities_adds_suffix(self):
+        filename = textacy_utils.generate_corpus_filename('/data/corpus.zip', 'en', extension='shards', compression='zstd', merge_entities=True)
+        self.assertTrue('_merged_entities' in filename)
+        self.assertNotEqual(filename, textacy_utils.generate_corpus_filename('/data/corpus.zip', 'en', extension='shards', compression='zstd'))
@@ -0,0 +1,45 @@
+import unittest
+import tempfile
+
+import spacy
+
+from text_analytic_tools.common.textacy_utility import parse_cache
+from text_analytic_tools.common.textacy_utility import file_io
+
+TEXTS = [ 'The first document.', 'A second document, with a comma.', 'The third one.' ]
+
+def create_reader(texts):
+    return ( ('d{}.txt'.format(i), i, text, dict(year=2000 + i)) for i, text in enumerate(texts) )
+
+class test_ParseCache(unittest.TestCase):
+
+    def test_pipe_when_texts_are_cached_parses_only_new_texts(self):
+        nlp = spacy.blank('en')
+        with tempfile.TemporaryDirectory() as folder:
+            cache = parse_cache.ParseCache(folder, nlp)
+            self.assertEqual(TEXTS[:2], [ doc.text for doc in cache.pipe(TEXTS[:2]) ])
+            self.assertEqual((0, 2), (cache.n_hits, cache.n_misses))
+            cache = parse_cache.ParseCache(folder, nlp)
+            docs = list(cache.pipe(( (text, i) for i, text in enumerate(TEXTS) ), as_tuples=True, block_size=2))
+            self.assertEqual((2, 1), (cache.n_hits, cache.n_misses))
+        self.assertEqual([ (text, i) for i, text in enumerate(TEXTS) ], [ (doc.text, i) for doc, i in docs ])
+        self.assertEqual([ t.text for t in nlp(TEXTS[1]) ], [ t.text for t in docs[1][0] ])
+
+    def test_fingerprint_when_model_version_or_config_differs_is_different(self):
+        nlp = spacy.blank('en')
+        fingerprint = parse_cache.nlp_fingerprint(nlp)
+        self.assertEqual(fingerprint, parse_cache.nlp_fingerprint(spacy.blank('en')))
+        self.assertNotEqual(fingerprint, parse_cache.nlp_fingerprint(nlp, tokenizer='keep_hyphen'))
+        nlp.meta['version'] = '0.0.1'
+        self.assertNotEqual(fingerprint, parse_cache.nlp_fingerprint(nlp))
+
+    def test_create_textacy_corpus_when_cached_returns_same_corpus_with_new_metadata(self):
+        nlp = spacy.blank('en')
+        with tempfile.TemporaryDirectory() as folder:
+            cache = parse_cache.ParseCache(folder, nlp)
+            file_io.create_textacy_corpus(create_reader(TEXTS[:2]), nlp, parse_cache=cache)
+            cache = parse_cache.ParseCache(folder, nlp)
+            corpus = file_io.create_textacy_corpus(create_reader(TEXTS), nlp, parse_cache=cache)
+            self.assertEqual((2, 1), (cache.n_hits, cache.n_misses))
+        self.assertEqual(TEXTS, [ doc.text for doc in corpus ])
+        self.assertEqual([ 0, 1, 2 ], [ doc._.meta['document_id'] for doc in corpus ])
@@ -0,0 +1,91 @@
+import os
+import sys
+import runpy
+import unittest
+import tempfile
+import zipfile
+import subprocess
+import unittest.mock as mock
+
+from text_analytic_tools.common import phrase_detector
+from text_analytic_tools.common import corpus_utils
+
+def create_docs():
+    # "new york city" is the only frequent n-gram, other terms occur in varying contexts
+    return [
+        [ 'w{}'.format(i), 'x{}'.format(i % 13), 'new', 'york', 'city', 'y{}'.format(i % 17), 'z{}'.format(i) ]
+            for i in range(0, 80)
+    ]
+
+LEARN_ARGS = dict(n_gram_size=3, min_count=5, threshold=2.0)
+
+ROOT_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Learns phrases with counting workers from a script's main module, as the extract document tokens runner does
+LEARN_SCRIPT = '''
+from text_analytic_tools.common import phrase_detector
+from text_analytic_tools.tests.phrase_detector_test import create_docs, LEARN_ARGS
+
+def main():
+    docs = create_docs()
+    detector = phrase_detector.PhraseDetector.learn(lambda: iter(docs), n_workers=2, shard_size=7, **LEARN_ARGS)
+    print(' '.join(detector[docs[0]]))
+
+if __name__ == '__main__':
+    main()
+'''
+
+class test_PhraseDetector(unittest.TestCase):
+
+    def test_learn_joins_bigrams_and_trigrams(self):
+        docs = create_docs()
+        detector = phrase_detector.PhraseDetector.learn(lambda: iter(docs), n_workers=1, **LEARN_ARGS)
+        self.assertEqual(3, detector.n_gram_size)
+        self.assertIn('new_york_city', detector[[ 'a', 'new', 'york', 'city' ]])
+
+    def test_learn_when_counted_in_parallel_shards_returns_same_phrases(self):
+        docs = create_docs()
+        serial = phrase_detector.PhraseDetector.learn(lambda: iter(docs), n_workers=1, **LEARN_ARGS)
+        parallel = phrase_detector.PhraseDetector.learn(lambda: iter(docs), n_workers=2, shard_size=7, **LEARN_ARGS)
+        self.assertEqual(list(serial.transform(docs)), list(parallel.transform(docs)))
+        vocab, word_count = serial._count(docs, 1, 10)
+        self.assertEqual((vocab, word_count), serial._count(iter(docs), 2, 7))
+
+    def test_learn_when_called_from_script_with_several_workers_returns_phrases(self):
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'learn_script.py')
+            with open(filename, 'w') as f:
+                f.write(LEARN_SCRIPT)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join([ ROOT_FOLDER ] + sys.path))
+            output = subprocess.run([ sys.executable, filename ], env=env, check=True, stdout=subprocess.PIPE, timeout=120).stdout
+        self.assertIn('new_york_city', output.decode('utf8').split())
+
+    def test_extract_document_tokens_runner_when_imported_by_spawned_worker_does_not_run(self):
+        import text_analytic_tools.common.textacy_utility as textacy_utility
+        with mock.patch.object(textacy_utility, 'load_or_create') as load_or_create:
+            module = runpy.run_path(os.path.join(ROOT_FOLDER, 'tCoIR_extract_document_tokens_runner.py'), run_name='__mp_main__')
+        self.assertIn('main', module)
+        load_or_create.assert_not_called()
+
+    def test_load_or_learn_when_stored_loads_phrasers(self):
+        docs = create_docs()
+        with tempfile.TemporaryDirectory() as folder:
+            folder = os.path.join(folder, 'phrases')
+            detector = phrase_detector.PhraseDetector.load_or_learn(folder, lambda: iter(docs), n_workers=1, **LEARN_ARGS)
+            self.assertEqual([ 'phraser_2.gensim', 'phraser_3.gensim' ], sorted(os.listdir(folder)))
+            loaded = phrase_detector.PhraseDetector.load_or_learn(folder, None, n_gram_size=2)
+        self.assertEqual(2, loaded.n_gram_size)
+        self.assertEqual(phrase_detector.apply_phrasers(detector.phrasers[:1], docs[0]), loaded[docs[0]])
+        self.assertIn('new_york', loaded[docs[0]])
+
+    def test_store_tokenized_corpus_as_archive_when_detector_given_stores_phrases(self):
+        docs = create_docs()
+        detector = phrase_detector.PhraseDetector.learn(lambda: iter(docs), n_workers=1, **LEARN_ARGS)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'test.tokenized.zip')
+            tokenized_docs = ( (i, 'doc.txt', i, tokens) for i, tokens in enumerate(docs[:2]) )
+            df_summary = corpus_utils.store_tokenized_corpus_as_archive(tokenized_docs, filename, phrase_detector=detector)
+            with zipfile.ZipFile(filename) as zf:
+                text = zf.read(zf.namelist()[1]).decode('utf8')
+        self.assertIn('new_york_city', text.split(' '))
+        self.assertEqual(len(detector[docs[1]]), df_summary.n_tokens[1])
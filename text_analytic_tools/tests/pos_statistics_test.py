@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+import spacy
+
+from spacy.tokens import Doc
+
+from text_analytic_tools.common.textacy_utility import utils
+from text_analytic_tools.common.textacy_utility import sharded_corpus
+
+POS = [
+    [ 'DET', 'NOUN', 'VERB', 'ADJ', 'NOUN', 'PUNCT' ],
+    [ 'PROPN', 'NUM', 'NOUN', 'SPACE', 'X', 'AUX' ],
+    [],
+    [ 'PRON', 'VERB', 'ADV', 'ADP', 'DET', 'NOUN', 'CCONJ', 'INTJ', 'SYM', 'PART' ]
+]
+
+def create_docs(nlp):
+    docs = []
+    for i, pos in enumerate(POS):
+        doc = Doc(nlp.vocab, words=[ 'w{}'.format(j) for j in range(0, len(pos)) ])
+        for token, tag in zip(doc, pos):
+            token.pos_ = tag
+        doc._.meta = dict(document_id=10 + i, filename='d{}.txt'.format(i), year=2000 + i)
+        docs.append(doc)
+    return docs
+
+class test_PosStatistics(unittest.TestCase):
+
+    def test_get_pos_statistics_matrix_equals_token_counts(self):
+        docs = create_docs(spacy.blank('en'))
+        expected = [ [ utils.get_pos_statistics(doc)[x] for x in utils.POS_NAMES ] for doc in docs ]
+        self.assertEqual(expected, utils.get_pos_statistics_matrix(docs).tolist())
+
+    def test_get_corpus_data_when_precomputed_statistics_returns_same_data(self):
+        docs = create_docs(spacy.blank('en'))
+        document_index = pd.DataFrame([ doc._.meta for doc in docs ]).set_index('document_id')
+        expected = utils.get_corpus_data(docs, document_index, title='filename')
+        statistics = utils.get_pos_statistics_frame(docs)
+        df = utils.get_corpus_data(docs[1:3], document_index, title='filename', pos_statistics=statistics)
+        self.assertTrue(expected.iloc[1:3].reset_index(drop=True).equals(df.reset_index(drop=True)))
+        self.assertEqual([ 5, 2, 0, 10 ], list(expected.words))
+
+    def test_sharded_corpus_pos_statistics_equals_document_counts(self):
+        nlp = spacy.blank('en')
+        docs = create_docs(nlp)
+        with tempfile.TemporaryDirectory() as folder:
+            sharded_corpus.store_sharded_corpus(docs, folder, shard_size=3)
+            store = sharded_corpus.ShardedCorpus(folder, nlp, n_workers=2)
+            statistics = store.pos_statistics()
+            self.assertTrue(statistics.equals(store.pos_statistics()))
+        self.assertEqual([ 10, 11, 12, 13 ], list(statistics.index))
+        self.assertTrue(np.array_equal(utils.get_pos_statistics_matrix(docs), statistics.values))
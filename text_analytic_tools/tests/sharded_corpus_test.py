@@ -0,0 +1,70 @@
+import os
+import unittest
+import tempfile
+
+import spacy
+
+from text_analytic_tools.common.textacy_utility import sharded_corpus
+
+def create_docs(nlp):
+    docs = []
+    for i in range(0, 7):
+        doc = nlp('This is document number {} of pope {}'.format(i, 'a' if i < 3 else 'b'))
+        doc._.meta = dict(document_id=i, filename='d{}.txt'.format(i), year=2000 + i, pope='a' if i < 3 else 'b')
+        docs.append(doc)
+    return docs
+
+class test_ShardedCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.nlp = spacy.blank('en')
+
+    def assert_load_returns_stored_documents(self, codec):
+        docs = create_docs(self.nlp)
+        with tempfile.TemporaryDirectory() as folder:
+            sharded_corpus.store_sharded_corpus(docs, folder, shard_size=3, codec=codec, n_workers=2)
+            self.assertTrue(sharded_corpus.is_sharded_corpus(folder))
+            self.assertEqual(3, len([ x for x in os.listdir(folder) if x.endswith('.spacy') ]))
+            corpus = sharded_corpus.ShardedCorpus(folder, self.nlp, n_workers=2).load()
+            self.assertEqual([ d.text for d in docs ], [ d.text for d in corpus ])
+            self.assertEqual([ d._.meta for d in docs ], [ d._.meta for d in corpus ])
+
+    def test_load_when_uncompressed_returns_stored_documents(self):
+        self.assert_load_returns_stored_documents(None)
+
+    def test_load_when_zstd_compressed_returns_stored_documents(self):
+        self.assert_load_returns_stored_documents('zstd')
+
+    def test_load_when_zstd_compressed_with_level_returns_stored_documents(self):
+        self.assert_load_returns_stored_documents('zstd-9')
+
+    def test_load_when_lz4_compressed_returns_stored_documents(self):
+        self.assert_load_returns_stored_documents('lz4')
+
+    def test_parse_codec_returns_name_and_level(self):
+        self.assertEqual(('none', None), sharded_corpus.parse_codec(None))
+        self.assertEqual(('zstd', 3), sharded_corpus.parse_codec('zstd'))
+        self.assertEqual(('zstd', 19), sharded_corpus.parse_codec('zstd-19'))
+        with self.assertRaises(AssertionError):
+            sharded_corpus.parse_codec('gzip')
+
+    def test_load_when_filtered_reads_only_shards_of_selected_documents(self):
+        docs = create_docs(self.nlp)
+        with tempfile.TemporaryDirectory() as folder:
+            sharded_corpus.store_sharded_corpus(docs, folder, shard_size=3)
+            store = sharded_corpus.ShardedCorpus(folder, self.nlp)
+            self.assertEqual([ 0, 0, 0, 1, 1, 1, 2 ], list(store.document_index.shard))
+            read_shards = []
+            read_shard = store._read_shard
+            store._read_shard = lambda shard: read_shards.append(shard) or read_shard(shard)
+            corpus = store.load(year=(2004, 2005), pope=[ 'b' ])
+            self.assertEqual([ 4, 5 ], [ d._.meta['document_id'] for d in corpus ])
+            self.assertEqual([ 1 ], read_shards)
+
+    def test_document_filter_combines_criteria(self):
+        docs = create_docs(self.nlp)
+        with tempfile.TemporaryDirectory() as folder:
+            sharded_corpus.store_sharded_corpus(docs, folder, shard_size=3)
+            store = sharded_corpus.ShardedCorpus(folder, self.nlp)
+        self.assertEqual([ 1, 2 ], list(store.select(pope='a', year=lambda x: x > 2000).document_id))
+        self.assertEqual([ 0, 6 ], list(store.select(document_id={ 0, 6 }).document_id))
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from text_analytic_tools.text_analysis import topic_model_aggregate
+
+def create_data():
+    documents = pd.DataFrame({
+        'pope': [ 'a', 'a', 'b', 'b', 'b' ],
+        'year': [ 2000, 2001, 2001, 2003, 2003 ],
+        'words': [ 10, 20, 30, 40, 50 ]
+    })
+    document_topic_weights = pd.DataFrame({
+        'document_id': [ 0, 0, 1, 2, 2, 3, 4 ],
+        'topic_id': [ 0, 2, 1, 0, 1, 2, 2 ],
+        'weight': [ 0.6, 0.4, 1.0, 0.3, 0.7, 1.0, 1.0 ]
+    }).set_index('document_id')
+    return document_topic_weights, documents
+
+class test_TopicAggregator(unittest.TestCase):
+
+    def test_topic_proportions_equals_pivot_computation(self):
+        document_topic_weights, documents = create_data()
+        aggregator = topic_model_aggregate.TopicAggregator.create(document_topic_weights, documents)
+        theta = pd.pivot_table(document_topic_weights.reset_index(), values='weight', index=['document_id'], columns=['topic_id'])
+        expected = theta.mul(documents.words, axis=0).sum()
+        expected = expected / expected.sum()
+        self.assertTrue(np.allclose(expected.values, aggregator.topic_proportions().values))
+
+    def test_group_weights_equals_groupby_of_long_format(self):
+        document_topic_weights, documents = create_data()
+        aggregator = topic_model_aggregate.TopicAggregator.create(document_topic_weights, documents)
+        df = aggregator.group_weights([ 'pope', 'year' ], threshold=0.35)
+        expected = pd.merge(documents, document_topic_weights, left_index=True, right_index=True)
+        expected = expected[expected.weight > 0.35].groupby([ 'pope', 'year', 'topic_id' ]).weight.agg([ 'sum', 'count', 'mean', 'max' ]).reset_index()
+        self.assertEqual(expected[[ 'pope', 'year', 'topic_id' ]].values.tolist(), df[[ 'pope', 'year', 'topic_id' ]].values.tolist())
+        self.assertTrue(np.allclose(expected[[ 'sum', 'count', 'mean', 'max' ]].values, df[[ 'sum', 'count', 'mean', 'max' ]].values))
+        self.assertIs(df, aggregator.group_weights([ 'pope', 'year' ], threshold=0.35))
+
+    def test_group_shares_sums_to_one_per_group(self):
+        document_topic_weights, documents = create_data()
+        aggregator = topic_model_aggregate.TopicAggregator.create(document_topic_weights, documents)
+        shares = aggregator.group_shares([ 'pope' ])
+        self.assertEqual([ 'a', 'b' ], list(shares.index))
+        self.assertTrue(np.allclose(1.0, shares.sum(axis=1)))
+        self.assertTrue(np.allclose([ 6.0 / 30.0, 20.0 / 30.0, 4.0 / 30.0 ], shares.loc['a'].values))
+
+    def test_rolling_trend_includes_years_without_documents(self):
+        document_topic_weights, documents = create_data()
+        aggregator = topic_model_aggregate.TopicAggregator.create(document_topic_weights, documents)
+        trend = aggregator.rolling_trend('year', window=1)
+        self.assertEqual([ 2000, 2001, 2002, 2003 ], list(trend.index))
+        self.assertTrue(np.allclose(0.0, trend.loc[2002].values))
+        self.assertTrue(np.allclose(aggregator.group_shares([ 'year' ]).loc[2003].values, trend.loc[2003].values))
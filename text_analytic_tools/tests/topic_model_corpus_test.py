@@ -0,0 +1,47 @@
+import unittest
+import tempfile
+
+import gensim
+
+from text_analytic_tools.text_analysis import topic_model_corpus
+
+TERMS = [
+    [ 'a', 'b', 'c', 'a' ],
+    [ 'b', 'c', 'd' ],
+    [ 'a', 'e', 'e', 'b' ],
+    [ 'c', 'a', 'b' ]
+]
+
+class test_TrainCorpus(unittest.TestCase):
+
+    def test_build_equals_gensim_dictionary_and_bow(self):
+        expected_dictionary = gensim.corpora.Dictionary(TERMS)
+        expected_bow = [ expected_dictionary.doc2bow(tokens) for tokens in TERMS ]
+        corpus = topic_model_corpus.TrainCorpus.build(TERMS)
+        self.assertEqual(expected_dictionary.token2id, corpus.id2word.token2id)
+        self.assertEqual(expected_bow, corpus.bow_corpus)
+        self.assertEqual(TERMS, list(corpus.texts))
+        self.assertEqual(TERMS, list(corpus.texts))
+
+    def test_build_when_filter_extremes_removes_filtered_tokens_from_documents(self):
+        corpus = topic_model_corpus.TrainCorpus.build(TERMS, filter_extremes=dict(no_below=2, no_above=1.0))
+        self.assertNotIn('d', corpus.id2word.token2id)
+        self.assertNotIn('e', corpus.id2word.token2id)
+        self.assertEqual([ [ 'a', 'b', 'c', 'a' ], [ 'b', 'c' ], [ 'a', 'b' ], [ 'c', 'a', 'b' ] ], list(corpus.texts))
+        self.assertEqual([ corpus.id2word.doc2bow(tokens) for tokens in corpus.texts ], corpus.bow_corpus)
+
+    def test_load_or_build_when_cached_returns_stored_corpus(self):
+        with tempfile.TemporaryDirectory() as folder:
+            corpus = topic_model_corpus.load_or_build(TERMS, cache_folder=folder, tfidf_weiging=True)
+            loaded = topic_model_corpus.load_or_build(TERMS, cache_folder=folder, tfidf_weiging=True)
+            other = topic_model_corpus.load_or_build(TERMS[:2], cache_folder=folder, tfidf_weiging=True)
+        self.assertEqual(corpus.bow_corpus, loaded.bow_corpus)
+        self.assertEqual(list(corpus.texts), list(loaded.texts))
+        self.assertEqual(2, len(other))
+
+    def test_load_or_build_when_terms_is_generator_builds_full_corpus(self):
+        with tempfile.TemporaryDirectory() as folder:
+            corpus = topic_model_corpus.load_or_build(( tokens for tokens in TERMS ), cache_folder=folder)
+            loaded = topic_model_corpus.load_or_build(( tokens for tokens in TERMS ), cache_folder=folder)
+        self.assertEqual(TERMS, list(corpus.texts))
+        self.assertEqual(corpus.bow_corpus, loaded.bow_corpus)
@@ -0,0 +1,108 @@
+import types
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from text_analytic_tools.text_analysis import topic_model_store
+from text_analytic_tools.text_analysis import topic_model_inference
+from text_analytic_tools.text_analysis import sttm_topic_model
+from text_analytic_tools.tests.topic_model_store_test import create_model_data, TERMS
+
+NEW_TERMS = [
+    [ 'a', 'b', 'f', 'a' ],
+    [ 'g', 'd', 'x', 'y' ],
+    [ 'x', 'y' ],
+    [ 'e', 'e', 'h', 'c', 'b' ]
+]
+
+EXTRACT_ARGS = dict(args=dict(normalize='lemma'), min_length=1, extra_stop_words=set([ 'b', 'z' ]), substitutions={ 'aa': 'a' })
+
+def create_doc(terms):
+    # Document with the term extraction API used by `extract_document_terms` (textacy's Doc.to_terms_list)
+    return types.SimpleNamespace(_=types.SimpleNamespace(to_terms_list=lambda **kwargs: terms))
+
+class test_TopicModelInference(unittest.TestCase):
+
+    def test_fold_in_when_terms_are_from_one_topic_returns_that_topic(self):
+        topic_terms = np.array([ [ 0.5, 0.0 ], [ 0.5, 0.0 ], [ 0.0, 0.5 ], [ 0.0, 0.5 ] ])
+        doc_term_matrix = sp.csr_matrix(np.array([ [ 2, 1, 0, 0 ], [ 0, 0, 1, 3 ], [ 0, 0, 0, 0 ] ]))
+        theta = topic_model_inference.fold_in(doc_term_matrix, topic_terms, np.array([ 0.1, 0.1 ]))
+        self.assertTrue(theta[0, 0] > 0.9)
+        self.assertTrue(theta[1, 1] > 0.9)
+        self.assertTrue(np.allclose([ 0.5, 0.5 ], theta[2]))
+
+    def test_infer_when_service_is_created_from_store_returns_normalized_weights(self):
+        data = create_model_data()
+        with tempfile.TemporaryDirectory() as folder:
+            topic_model_store.store(data, folder)
+            service = topic_model_inference.InferenceService(folder, n_workers=1)
+            theta = service.infer(NEW_TERMS)
+        self.assertEqual((len(NEW_TERMS), 3), theta.shape)
+        self.assertTrue(np.allclose(1.0, theta.sum(axis=1)))
+        self.assertTrue(np.allclose(service.alpha / service.alpha.sum(), theta[2]))
+        self.assertEqual(2, service.doc_term_matrix(NEW_TERMS)[0, data.id2term.token2id['a']])
+
+    def test_infer_when_batched_over_workers_returns_same_weights(self):
+        service = topic_model_inference.InferenceService(create_model_data(), n_workers=1, chunksize=2)
+        expected = service.infer(NEW_TERMS + TERMS)
+        service.n_workers = 2
+        self.assertTrue(np.allclose(expected, service.infer(NEW_TERMS + TERMS)))
+
+    def test_document_topic_weights_returns_weights_merged_with_documents(self):
+        service = topic_model_inference.InferenceService(create_model_data(), n_workers=1)
+        documents = pd.DataFrame({ 'year': [ 2020, 2020, 2021, 2021 ] }, index=[ 10, 11, 12, 13 ])
+        df = service.document_topic_weights(NEW_TERMS, documents, minimum_probability=0.0)
+        self.assertEqual(len(NEW_TERMS) * 3, len(df))
+        self.assertEqual([ 10, 11, 12, 13 ], sorted(set(df.index)))
+        self.assertTrue(np.allclose(1.0, df.groupby(level=0).weight.sum()))
+
+    def test_tokenize_when_extract_args_are_stored_with_model_uses_same_options(self):
+        data = create_model_data()
+        data.options = dict(method='gensim_lda', extract_args=EXTRACT_ARGS)
+        with tempfile.TemporaryDirectory() as folder:
+            topic_model_store.store(data, folder)
+            service = topic_model_inference.InferenceService(folder, n_workers=1)
+        self.assertEqual([ 'b', 'z' ], service.extract_args['extra_stop_words'])
+        self.assertEqual({ 'aa': 'a' }, service.extract_args['substitutions'])
+        terms = list(service.tokenize([ create_doc([ 'aa', 'b', 'c', 'x', 'z', 'e' ]) ]))
+        self.assertEqual([ [ 'a', 'c', 'e' ] ], terms)
+
+    def test_init_when_model_is_lsi_raises(self):
+        data = create_model_data()
+        data.options = dict(method='gensim_lsi')
+        with self.assertRaises(topic_model_inference.topic_model_utility.TopicModelException):
+            topic_model_inference.InferenceService(data, n_workers=1)
+
+    def test_init_when_topic_term_weights_are_signed_raises(self):
+        data = create_model_data()
+        data.phi = data.topic_model.get_topics() - 0.1
+        with self.assertRaises(topic_model_inference.topic_model_utility.TopicModelException):
+            topic_model_inference.InferenceService(data, n_workers=1)
+
+class test_STTMTopicModel(unittest.TestCase):
+
+    def create_model(self):
+        model = sttm_topic_model.STTMTopicModel(
+            None, 'LDA', None, id2word={ 0: 'a', 1: 'b', 2: 'c', 3: 'd' }, num_topics=2, alpha=0.1
+        )
+        model.word_topics = np.array([ [ 5.0, 5.0, 0.0, 0.0 ], [ 0.0, 0.0, 5.0, 5.0 ] ])
+        return model
+
+    def test_getitem_when_bow_returns_folded_in_topic_distribution(self):
+        model = self.create_model()
+        weights = model[[ (0, 2), (1, 1) ]]
+        self.assertEqual([ 0, 1 ], [ topic_id for topic_id, _ in weights ])
+        self.assertTrue(weights[0][1] > 0.9)
+        self.assertTrue(np.isclose(1.0, sum(w for _, w in weights)))
+
+    def test_getitem_when_corpus_returns_distribution_per_document(self):
+        model = self.create_model()
+        corpus = [ [ (0, 2), (1, 1) ], [ (2, 1), (3, 3) ], [] ]
+        weights = model[corpus]
+        self.assertEqual(3, len(weights))
+        self.assertTrue(weights[0][0][1] > 0.9)
+        self.assertTrue(weights[1][1][1] > 0.9)
+        self.assertTrue(np.allclose([ 0.5, 0.5 ], [ w for _, w in weights[2] ]))
@@ -0,0 +1,44 @@
+import os
+import gzip
+import unittest
+import tempfile
+
+import numpy as np
+
+from text_analytic_tools.text_analysis import topic_model_output
+
+def write_file(folder, filename, text, compress=False):
+    path = os.path.join(folder, filename)
+    with (gzip.open(path, 'wt') if compress else open(path, 'w')) as f:
+        f.write(text)
+    return path
+
+class test_TopicModelOutput(unittest.TestCase):
+
+    def test_read_sttm_theta_removes_small_weights_and_renormalizes(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = write_file(folder, 'model.theta', '0.5 0.5 0.0000001 \n0.2 0.2 0.6 \n0.1 0.3 0.6 \n')
+            for chunksize in [ None, 2 ]:
+                theta = topic_model_output.read_sttm_theta(path, 3, chunksize=chunksize)
+                self.assertEqual((3, 3), theta.shape)
+                self.assertTrue(np.allclose([ [ 0.5, 0.5, 0.0 ], [ 0.2, 0.2, 0.6 ], [ 0.1, 0.3, 0.6 ] ], theta.toarray()))
+                self.assertEqual(8, theta.nnz)
+
+    def test_read_mallet_doctopics_when_dense_or_sparse_format_returns_same_matrix(self):
+        with tempfile.TemporaryDirectory() as folder:
+            dense = write_file(folder, 'dense.txt', '#doc name topic proportion ...\n0\t0\t0.25\t0.75\n1\t1\t1.0\t0.0\n')
+            sparse = write_file(folder, 'sparse.txt', '#doc name topic proportion ...\n0 0 1 0.75 0 0.25 \n1 1 0 1.0 \n')
+            expected = [ [ 0.25, 0.75 ], [ 1.0, 0.0 ] ]
+            self.assertTrue(np.allclose(expected, topic_model_output.read_mallet_doctopics(dense, 2).toarray()))
+            self.assertTrue(np.allclose(expected, topic_model_output.read_mallet_doctopics(dense, 2, chunksize=1).toarray()))
+            self.assertTrue(np.allclose(expected, topic_model_output.read_mallet_doctopics(sparse, 2).toarray()))
+
+    def test_read_mallet_state_counts_topic_words(self):
+        state = '#doc source pos typeindex type topic\n#alpha : 0.5 1.5\n#beta : 0.01\n' \
+            '0 NA 0 0 nan 1\n0 NA 1 1 b 0\n1 NA 0 1 b 0\n1 NA 1 2 unknown 1\n1 NA 2 0 nan 1\n'
+        with tempfile.TemporaryDirectory() as folder:
+            path = write_file(folder, 'state.mallet.gz', state, compress=True)
+            word_topics, alpha, beta = topic_model_output.read_mallet_state(path, { 'b': 0, 'nan': 1 }, 2, chunksize=2)
+        self.assertEqual([ [ 2.0, 0.0 ], [ 0.0, 2.0 ] ], word_topics.tolist())
+        self.assertEqual([ 0.5, 1.5 ], alpha.tolist())
+        self.assertEqual(0.01, beta)
@@ -0,0 +1,60 @@
+import os
+import unittest
+import tempfile
+import types
+
+import numpy as np
+import pandas as pd
+import gensim
+
+from text_analytic_tools.text_analysis import topic_model_store
+from text_analytic_tools.text_analysis import topic_model_utility
+
+TERMS = [
+    [ 'a', 'b', 'c', 'a', 'f' ],
+    [ 'b', 'c', 'd', 'g' ],
+    [ 'a', 'e', 'e', 'b', 'f' ],
+    [ 'c', 'a', 'b', 'h', 'h' ],
+    [ 'd', 'g', 'g', 'e' ]
+]
+
+def create_model_data():
+    id2word = gensim.corpora.Dictionary(TERMS)
+    bow_corpus = [ id2word.doc2bow(tokens) for tokens in TERMS ]
+    model = gensim.models.LdaModel(bow_corpus, id2word=id2word, num_topics=3, passes=5, random_state=1)
+    documents = pd.DataFrame({ 'filename': [ 'd{}.txt'.format(i) for i in range(0, len(TERMS)) ], 'year': [ 2000, 2000, 2001, 2001, 2002 ] })
+    processed = topic_model_utility.compile_metadata(model, bow_corpus, id2word, documents)
+    return types.SimpleNamespace(
+        topic_model=model, id2term=id2word, bow_corpus=bow_corpus, processed=processed,
+        perplexity_score=-1.5, coherence_score=0.4, options=dict(method='gensim_lda'), coherence_scores=None
+    )
+
+class test_TopicModelStore(unittest.TestCase):
+
+    def test_load_model_when_stored_returns_equal_components(self):
+        data = create_model_data()
+        with tempfile.TemporaryDirectory() as folder:
+            topic_model_store.store(data, folder)
+            loaded = topic_model_store.load(folder)
+            self.assertEqual((2000, 2002), loaded.processed.year_period)
+            self.assertEqual(0.4, loaded.coherence_score)
+            self.assertEqual(3, loaded.num_topics)
+            self.assertTrue(loaded.processed.topic_token_weights.equals(data.processed.topic_token_weights))
+            self.assertTrue(loaded.processed.document_topic_weights.equals(data.processed.document_topic_weights))
+            self.assertTrue(loaded.processed.topic_token_overview.equals(data.processed.topic_token_overview))
+            self.assertEqual(data.id2term.token2id, loaded.id2term.token2id)
+            self.assertEqual(data.bow_corpus, [ [ (int(i), int(n)) for i, n in d ] for d in loaded.bow_corpus ])
+            self.assertTrue(np.allclose(data.topic_model.get_topics(), loaded.topic_model.get_topics()))
+            self.assertTrue(np.allclose(data.topic_model.get_topics(), loaded.phi))
+            self.assertEqual((len(TERMS), 3), loaded.theta.shape)
+
+    def test_load_model_when_store_is_opened_loads_no_components(self):
+        data = create_model_data()
+        with tempfile.TemporaryDirectory() as folder:
+            topic_model_store.store(data, folder)
+            loaded = topic_model_store.load(folder)
+            self.assertEqual({}, loaded._cache)
+            self.assertEqual({}, loaded.processed._cache)
+            _ = loaded.processed.topic_token_overview
+            self.assertEqual([ 'topic_token_overview' ], list(loaded.processed._cache.keys()))
+            self.assertTrue(os.path.isfile(os.path.join(folder, 'model', 'model.gensim')))
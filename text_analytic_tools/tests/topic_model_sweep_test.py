@@ -0,0 +1,77 @@
+import os
+import types
+import unittest
+import unittest.mock
+
+import pandas as pd
+
+from text_analytic_tools.text_analysis import topic_model_sweep
+
+TERMS = [
+    [ 'a', 'b', 'c', 'a' ],
+    [ 'b', 'c', 'd' ],
+    [ 'a', 'e', 'e', 'b' ],
+    [ 'c', 'a', 'b' ]
+]
+
+DOCUMENTS = pd.DataFrame({ 'document_id': range(0, 4), 'year': [ 2000, 2000, 2001, 2001 ] })
+
+TM_ARGS = dict(passes=1, iterations=5)
+
+def fake_compute(terms, documents, method, vec_args, tm_args, train_corpus=None, coherence_service=None, **args):
+    # Model data is the computing process and the train corpus shared by the sweep
+    n_topics = tm_args['n_topics']
+    return types.SimpleNamespace(
+        topic_model=os.getpid(),
+        train_corpus=train_corpus,
+        perplexity_score=-float(n_topics),
+        coherence_score=n_topics / 10.0
+    )
+
+class test_topic_model_sweep(unittest.TestCase):
+
+    def patch_compute(self):
+        # Replaces topic_model.compute in the current process only (workers are spawned)
+        patcher = unittest.mock.patch.object(topic_model_sweep.topic_model, 'compute', fake_compute)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_n_topics_window_returns_window_of_at_least_two_topics(self):
+        self.assertEqual([ 3, 4, 5, 6, 7 ], topic_model_sweep.n_topics_window(5, 2))
+        self.assertEqual([ 2, 3, 4, 5 ], topic_model_sweep.n_topics_window(3, 2))
+
+    def test_n_topics_window_always_includes_n_topics(self):
+        self.assertEqual([ 1, 2, 3 ], topic_model_sweep.n_topics_window(1, 2))
+
+    def test_sweep_when_keep_models_returns_model_data_only_for_kept_models(self):
+        results = dict(topic_model_sweep.sweep(TERMS, DOCUMENTS, 'gensim_lda', [ 2, 3, 4 ], tm_args=TM_ARGS, n_workers=2, keep_models=[ 3 ]))
+        self.assertEqual([ 2, 3, 4 ], sorted(results.keys()))
+        self.assertEqual(3, results[3].topic_model.num_topics)
+        self.assertFalse(hasattr(results[2], 'topic_model'))
+        self.assertTrue(all(data.perplexity_score is not None and data.coherence_score is not None for data in results.values()))
+
+    def test_sweep_when_gensim_method_shares_one_train_corpus(self):
+        self.patch_compute()
+        results = dict(topic_model_sweep.sweep(TERMS, DOCUMENTS, 'gensim_lda-multicore', [ 2, 3 ], keep_models=[ 2, 3 ]))
+        self.assertIs(results[2].train_corpus, results[3].train_corpus)
+        self.assertEqual(4, len(results[2].train_corpus.bow_corpus))
+
+    def test_sweep_when_multiprocess_method_computes_models_in_current_process(self):
+        self.patch_compute()
+        method = topic_model_sweep.MULTIPROCESS_METHODS[0]
+        results = list(topic_model_sweep.sweep(TERMS, DOCUMENTS, method, [ 2, 3, 4 ], keep_models=[ 2, 3, 4 ]))
+        self.assertEqual([ 2, 3, 4 ], [ n_topics for n_topics, _ in results ])
+        self.assertTrue(all(data.topic_model == os.getpid() for _, data in results))
+
+    def test_sweep_when_kept_model_not_in_range_fails(self):
+        with self.assertRaises(AssertionError):
+            list(topic_model_sweep.sweep(TERMS, DOCUMENTS, 'gensim_lda', [ 2, 3 ], keep_models=[ 5 ]))
+
+    def test_sweep_scores_returns_kept_models_and_scores_sorted_by_n_topics(self):
+        self.patch_compute()
+        results = topic_model_sweep.sweep(TERMS, DOCUMENTS, 'gensim_lda-multicore', [ 4, 2, 3 ], keep_models=[ 4 ])
+        models, scores = topic_model_sweep.sweep_scores(results)
+        self.assertEqual([ 4 ], list(models.keys()))
+        self.assertEqual([ 2, 3, 4 ], list(scores.index))
+        self.assertEqual([ 0.2, 0.3, 0.4 ], list(scores.coherence_score))
+        self.assertEqual([ -2.0, -3.0, -4.0 ], list(scores.perplexity_score))
@@ -0,0 +1,52 @@
+import unittest
+import unittest.mock
+
+import gensim
+import pandas as pd
+
+from text_analytic_tools.text_analysis import topic_model
+from text_analytic_tools.text_analysis import topic_model_utility
+
+TERMS = [ [ 'w{}'.format((i * j) % 11) for j in range(0, 8) ] for i in range(0, 20) ]
+
+DOCUMENTS = pd.DataFrame({ 'document_id': range(0, 20), 'year': [ 2000 + i % 2 for i in range(0, 20) ] })
+
+TM_ARGS = dict(n_topics=2, passes=1, max_iter=5, random_state=3)
+
+class test_compute(unittest.TestCase):
+
+    def test_compute_when_holdout_computes_perplexity_on_held_out_documents(self):
+        evaluated = []
+        log_perplexity = gensim.models.LdaModel.log_perplexity
+        def spy(model, chunk, total_docs=None):
+            evaluated.append(list(chunk))
+            return log_perplexity(model, chunk, total_docs)
+        with unittest.mock.patch.object(gensim.models.LdaModel, 'log_perplexity', spy):
+            data = topic_model.compute(TERMS, DOCUMENTS, method='gensim_lda', tm_args=dict(TM_ARGS, holdout=0.25))
+        _, expected = topic_model_utility.split_holdout(data.bow_corpus, 0.25, random_state=3)
+        # Earlier calls are LdaModel's own evaluations during training (eval_every)
+        self.assertEqual(expected, evaluated[-1])
+        self.assertEqual(5, len(expected))
+        self.assertIsNotNone(data.perplexity_score)
+
+    def test_compute_when_holdout_trains_on_remaining_documents(self):
+        with unittest.mock.patch.object(topic_model, 'setup_gensim_algorithms', wraps=topic_model.setup_gensim_algorithms) as setup:
+            data = topic_model.compute(TERMS, DOCUMENTS, method='gensim_lda', tm_args=dict(TM_ARGS, holdout=0.25))
+        train_corpus, _ = topic_model_utility.split_holdout(data.bow_corpus, 0.25, random_state=3)
+        self.assertEqual(train_corpus, setup.call_args[0][2])
+        self.assertEqual(len(TERMS), len(data.processed.document_topic_weights.index.unique()))
+
+    def test_compute_when_holdout_and_engine_is_not_lda_fails(self):
+        with self.assertRaises(topic_model_utility.TopicModelException):
+            topic_model.compute(TERMS, DOCUMENTS, method='gensim_lsi', tm_args=dict(TM_ARGS, holdout=0.25))
+
+    def test_compute_when_dtm_hot_and_unsorted_index_returns_topics_of_all_documents(self):
+        documents = DOCUMENTS.assign(year=[ 2000 + (i * 7) % 3 for i in range(0, 20) ])
+        data = topic_model.compute(
+            TERMS, documents, method='gensim_dtm-hot', tm_args=dict(n_topics=2, passes=1, max_iter=1, workers=1, random_state=3)
+        )
+        theta = data.topic_model.get_document_topic_matrix()
+        self.assertEqual((len(TERMS), 2), theta.shape)
+        weights = data.processed.document_topic_weights
+        self.assertEqual(list(documents.index), sorted(weights.index.unique()))
+        self.assertTrue((weights.year == documents.year[weights.index]).all())
@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+import gensim
+
+from text_analytic_tools.text_analysis import topic_model_store
+from text_analytic_tools.text_analysis import topic_model_update
+from text_analytic_tools.text_analysis import gibbs_topic_model
+from text_analytic_tools.tests.topic_model_store_test import create_model_data, TERMS
+from text_analytic_tools.tests.gibbs_topic_model_test import create_planted_corpus
+
+NEW_TERMS = [
+    [ 'a', 'b', 'x', 'x', 'y' ],
+    [ 'd', 'g', 'y', 'e' ]
+]
+
+NEW_DOCUMENTS = pd.DataFrame({ 'filename': [ 'n0.txt', 'n1.txt' ], 'year': [ 2003, 2004 ] })
+
+class test_TopicModelUpdate(unittest.TestCase):
+
+    def test_extend_lda_vocabulary_keeps_existing_topic_term_weights(self):
+        data = create_model_data()
+        model = data.topic_model
+        lambdas = model.state.get_lambda().copy()
+        topic_model_update.extend_dictionary(model.id2word, NEW_TERMS)
+        topic_model_update.extend_lda_vocabulary(model, len(model.id2word))
+        self.assertEqual((3, len(model.id2word)), model.get_topics().shape)
+        self.assertTrue(np.allclose(lambdas, model.state.get_lambda()[:, :lambdas.shape[1]]))
+        self.assertTrue(np.allclose(model.eta[0], model.state.get_lambda()[:, lambdas.shape[1]:]))
+
+    def test_update_model_when_stored_lda_appends_new_documents(self):
+        data = create_model_data()
+        with tempfile.TemporaryDirectory() as folder:
+            topic_model_store.store(data, folder)
+            updated = topic_model_update.update_model(folder, NEW_TERMS, NEW_DOCUMENTS)
+            with tempfile.TemporaryDirectory() as update_folder:
+                topic_model_store.store(updated, update_folder)
+                loaded = topic_model_store.load(update_folder)
+                self.assertEqual((len(TERMS) + 2, 3), loaded.theta.shape)
+        processed = updated.processed
+        self.assertEqual(list(range(0, len(TERMS) + 2)), list(processed.documents.index))
+        self.assertEqual((2000, 2004), processed.year_period)
+        self.assertEqual(set(range(0, len(TERMS) + 2)), set(processed.document_topic_weights.index))
+        self.assertTrue(data.processed.document_topic_weights.equals(processed.document_topic_weights.loc[:len(TERMS) - 1]))
+        self.assertIn('x', set(processed.dictionary.token))
+        self.assertEqual(len(TERMS) + 2, len(updated.bow_corpus))
+        self.assertEqual(len(updated.id2term), updated.topic_model.get_topics().shape[1])
+
+    def test_update_model_when_gibbs_model_adds_counts_of_new_documents(self):
+        terms, id2word, bow_corpus = create_planted_corpus(n_documents=40)
+        model = gibbs_topic_model.GibbsTopicModel(bow_corpus[:30], id2word=id2word, num_topics=2, iterations=30, optimize_burn_in=10, workers=1, random_seed=1)
+        documents = pd.DataFrame({ 'year': [ 2000 ] * 30 })
+        data = create_model_data()
+        data.topic_model, data.id2term, data.bow_corpus = model, id2word, bow_corpus[:30]
+        data.processed = topic_model_update.topic_model_utility.compile_metadata(model, bow_corpus[:30], id2word, documents)
+        new_terms = terms[30:] + [ [ 'c0', 'c0', 'a0' ] ]
+        updated = topic_model_update.update_model(data, new_terms, pd.DataFrame({ 'year': [ 2001 ] * 11 }))
+        self.assertEqual(sum(len(x) for x in terms) + 3, model.doc_topic_counts.sum())
+        self.assertEqual((41, 2), model.get_document_topic_matrix().shape)
+        self.assertEqual(len(id2word), model.word_topics.shape[1])
+        self.assertEqual(set(range(0, 41)), set(updated.processed.document_topic_weights.index))
+        theta = model.get_document_topic_matrix()
+        self.assertEqual(np.argmax(theta[0]), np.argmax(theta[30]))
+
+    def test_update_model_when_model_is_not_lda_raises_exception(self):
+        data = create_model_data()
+        data.topic_model = gensim.models.LsiModel(data.bow_corpus, id2word=data.id2term, num_topics=2)
+        with self.assertRaises(topic_model_update.topic_model_utility.TopicModelException):
+            topic_model_update.update_model(data, NEW_TERMS, NEW_DOCUMENTS)
@@ -0,0 +1,100 @@
+import types
+import unittest
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import gensim
+
+from text_analytic_tools.text_analysis import topic_model_utility
+
+TERMS = [
+    [ 'a', 'b', 'c', 'a', 'f' ],
+    [ 'b', 'c', 'd', 'g' ],
+    [ 'a', 'e', 'e', 'b', 'f' ],
+    [ 'c', 'a', 'b', 'h', 'h' ],
+    [ 'd', 'g', 'g', 'e' ]
+]
+
+def create_lda_model():
+    id2word = gensim.corpora.Dictionary(TERMS)
+    bow_corpus = [ id2word.doc2bow(tokens) for tokens in TERMS ]
+    model = gensim.models.LdaModel(bow_corpus, id2word=id2word, num_topics=3, passes=5, random_state=1)
+    return model, bow_corpus
+
+class test_TopicModelUtility(unittest.TestCase):
+
+    def test_compile_topic_token_weights_equals_show_topics(self):
+        model, _ = create_lda_model()
+        dictionary = topic_model_utility.compile_dictionary(model)
+        df = topic_model_utility.compile_topic_token_weights(model, dictionary, n_tokens=4)
+        expected = [
+            (topic_id, token, weight)
+                for topic_id, tokens in model.show_topics(num_topics=-1, num_words=4, formatted=False)
+                    for token, weight in tokens
+        ]
+        self.assertEqual([ (x[0], x[1]) for x in expected ], list(zip(df.topic_id, df.token)))
+        self.assertTrue(np.allclose([ x[2] for x in expected ], df.weight))
+        self.assertEqual([ model.id2word.token2id[x] for x in df.token ], list(df.token_id))
+
+    def test_compile_topic_token_overview_joins_top_tokens_by_weight(self):
+        topic_token_weights = pd.DataFrame({
+            'topic_id': [ 0, 0, 0, 1, 1 ],
+            'token': [ 'x', 'y', 'z', 'u', 'v' ],
+            'weight': [ 0.2, 0.5, 0.3, 0.1, 0.9 ]
+        })
+        df = topic_model_utility.compile_topic_token_overview(topic_token_weights, alpha=[ 0.1, 0.2 ], n_tokens=2)
+        self.assertEqual([ 'y z', 'v u' ], list(df.tokens))
+        self.assertEqual([ 0.1, 0.2 ], list(df.alpha))
+
+    def test_document_topic_weights_when_dense_or_sparse_returns_same_weights(self):
+        theta = np.array([ [ 0.5, 0.0, 0.5 ], [ 0.0, 0.9, 0.1 ] ])
+        dense = topic_model_utility.document_topic_weights(theta, 0.2)
+        sparse = topic_model_utility.document_topic_weights(sp.csr_matrix(theta), 0.2)
+        for expected, x, y in zip([ [ 0, 0, 1 ], [ 0, 2, 1 ], [ 0.5, 0.5, 0.9 ] ], dense, sparse):
+            self.assertEqual(expected, list(x))
+            self.assertEqual(expected, list(y))
+
+    def test_compile_document_topics_returns_weights_merged_with_documents(self):
+        model, bow_corpus = create_lda_model()
+        documents = pd.DataFrame({ 'year': [ 2000, 2000, 2001, 2001, 2002 ] })
+        df = topic_model_utility.compile_document_topics(model, bow_corpus, documents, minimum_probability=0.0)
+        self.assertEqual(len(TERMS) * 3, len(df))
+        self.assertTrue(np.allclose(1.0, df.groupby(level=0).weight.sum()))
+        self.assertEqual([ 2000, 2000, 2000 ], list(df.loc[0].year))
+
+    def test_compile_dictionary_when_scikit_learn_model_computes_dfs_from_doc_term_matrix(self):
+        vectorizer = types.SimpleNamespace(id_to_term={ 0: 'x', 1: 'y', 2: 'z' })
+        doc_term_matrix = sp.csr_matrix(np.array([ [ 2, 0, 1 ], [ 1, 0, 0 ], [ 0, 0, 3 ] ]))
+        df = topic_model_utility.compile_dictionary(object(), vectorizer, doc_term_matrix=doc_term_matrix)
+        self.assertEqual([ 'x', 'y', 'z' ], list(df.token))
+        self.assertEqual([ 2, 0, 2 ], list(df.dfs))
+
+class test_split_holdout(unittest.TestCase):
+
+    def create_bow_corpus(self, n_documents):
+        return [ [ (i % 7, 1), (7 + i % 3, 2) ] for i in range(0, n_documents) ]
+
+    def test_split_holdout_holds_out_fraction_of_documents(self):
+        bow_corpus = self.create_bow_corpus(100)
+        train_corpus, holdout_corpus = topic_model_utility.split_holdout(bow_corpus, 0.2, random_state=1)
+        self.assertEqual(80, len(train_corpus))
+        self.assertEqual(20, len(holdout_corpus))
+        self.assertEqual(sorted(bow_corpus), sorted(train_corpus + holdout_corpus))
+
+    def test_split_holdout_when_no_holdout_returns_full_corpus(self):
+        bow_corpus = self.create_bow_corpus(10)
+        self.assertEqual((bow_corpus, []), topic_model_utility.split_holdout(bow_corpus, None))
+        self.assertEqual((bow_corpus, []), topic_model_utility.split_holdout(bow_corpus, 0.05))
+
+    def test_split_holdout_holds_out_at_most_max_holdout_documents(self):
+        bow_corpus = [ [] ] * (topic_model_utility.MAX_HOLDOUT_DOCUMENTS * 2 + 10)
+        train_corpus, holdout_corpus = topic_model_utility.split_holdout(bow_corpus, 0.9, random_state=1)
+        self.assertEqual(topic_model_utility.MAX_HOLDOUT_DOCUMENTS, len(holdout_corpus))
+        self.assertEqual(len(bow_corpus) - topic_model_utility.MAX_HOLDOUT_DOCUMENTS, len(train_corpus))
+
+    def test_split_holdout_when_same_random_state_returns_same_split(self):
+        bow_corpus = [ [ (i, 1) ] for i in range(0, 50) ]
+        expected = topic_model_utility.split_holdout(bow_corpus, 0.3, random_state=7)
+        self.assertEqual(expected, topic_model_utility.split_holdout(bow_corpus, 0.3, random_state=7))
+        self.assertNotEqual(expected, topic_model_utility.split_holdout(bow_corpus, 0.3, random_state=8))
@@ -1,2 +1,4 @@
 from . compute import *
 from . compute_ui import *
+from . result_store import CoOccurrenceStore
+from . hal_state import HalState, update_state
@@ -4,9 +4,21 @@ import text_analytic_tools.utility as utility
 import text_analytic_tools.common.text_corpus as text_corpus
 import text_analytic_tools.text_analysis.co_occurrence.vectorizer_glove as vectorizer_glove
 import text_analytic_tools.text_analysis.co_occurrence.vectorizer_hal as vectorizer_hal
+import text_analytic_tools.text_analysis.co_occurrence.windows as windows
 
 logger = utility.getLogger('corpus_text_analysis')
 
+def prepare_terms(corpus, boundaries=None):
+    '''Returns normalized document terms (lowercased, short terms removed) and boundaries remapped to the filtered terms'''
+
+    texts = list(corpus.get_texts())
+    doc_terms = [ [ t.lower().strip('_') for t in terms if len(t) > 2] for terms in texts ]
+
+    if boundaries is not None:
+        boundaries = [ windows.filtered_offsets([ len(t) > 2 for t in terms ], offsets) for terms, offsets in zip(texts, boundaries) ]
+
+    return doc_terms, boundaries
+
 def compute(
     corpus,
     document_index,
@@ -15,10 +27,23 @@ def compute(
     normalize='size',
     method='HAL',
     zero_diagonal=True,
-    direction_sensitive=False
+    direction_sensitive=False,
+    boundaries=None,
+    min_nw_xy=None,
+    min_cwr=None,
+    top_k=None
 ):
+    '''Computes yearly co-occurrence statistics for corpus
+
+    boundaries: optional per document list of segment start offsets (e.g. sentences or chunks), aligned with corpus documents.
+      HAL never counts co-occurrences across a segment border.
+    min_nw_xy, min_cwr, top_k: optional pruning applied per year on the sparse counts before any frame is created, i.e.
+      minimum co-occurrence count, minimum (size/max normalized, not yet max-scaled) cwr and max number of partners per term.
+    '''
+
+    prune_opts = dict(min_nw_xy=min_nw_xy, min_cwr=min_cwr, top_k=top_k)
 
-    doc_terms = [ [ t.lower().strip('_') for t in terms if len(t) > 2] for terms in corpus.get_texts() ]
+    doc_terms, boundaries = prepare_terms(corpus, boundaries)
 
     common_token2id = text_corpus.build_vocab(doc_terms)
 
@@ -31,25 +56,25 @@ def compute(
         year_indexes = list(document_index.loc[document_index.year == year].sequence_id)
 
         docs = [ doc_terms[y] for y in year_indexes ]
+        year_boundaries = [ boundaries[y] for y in year_indexes ] if boundaries is not None else None
 
         logger.info('Year %s...', year)
 
         if method == "HAL":
 
             vectorizer = vectorizer_hal.HyperspaceAnalogueToLanguageVectorizer(token2id=common_token2id)\
-                .fit(docs, size=window_size, distance_metric=distance_metric)
+                .fit(docs, size=window_size, distance_metric=distance_metric, boundaries=year_boundaries)
 
-            df = vectorizer.cooccurence(direction_sensitive=direction_sensitive, normalize=normalize, zero_diagonal=zero_diagonal)
+            df = vectorizer.cooccurence(direction_sensitive=direction_sensitive, normalize=normalize, zero_diagonal=zero_diagonal, **prune_opts)
 
         else:
 
             vectorizer = vectorizer_glove.GloveVectorizer(token2id=common_token2id)\
-                .fit(docs, size=window_size)
+                .fit(docs, size=window_size, boundaries=year_boundaries, zero_out_diag=zero_diagonal)
 
-            df = vectorizer.cooccurence(normalize=normalize, zero_diagonal=zero_diagonal)
+            df = vectorizer.cooccurence(normalize=normalize, zero_diagonal=zero_diagonal, **prune_opts)
 
         df['year'] = year
-        #df = df[df.cwr >= threshhold]
 
         dfs.append(df[['year', 'x_term', 'y_term', 'nw_xy', 'nw_x', 'nw_y', 'cwr']])
 
@@ -0,0 +1,289 @@
+import os
+import json
+import types
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import text_analytic_tools.utility as utility
+
+from . import vectorizer_hal
+from . compute import prepare_terms
+
+logger = utility.getLogger('corpus_text_analysis')
+
+FRAME_COLUMNS = [ 'year', 'x_term', 'y_term', 'nw_xy', 'nw_x', 'nw_y', 'cwr' ]
+
+# Document index columns that identify a document between updates (first one found is used)
+DOCUMENT_KEY_COLUMNS = [ 'filename', 'document_id' ]
+
+def resize_matrix(matrix, n):
+    """Returns square csr `matrix` padded with empty rows and columns to size n x n"""
+    matrix = matrix.tocsr()
+    indptr = np.concatenate([ matrix.indptr, np.full(n - matrix.shape[0], matrix.indptr[-1], dtype=matrix.indptr.dtype) ])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=(n, n))
+
+def resize_vector(vector, n):
+    return np.concatenate([ vector, np.zeros(n - len(vector), dtype=vector.dtype) ])
+
+class HalState():
+    """Persisted per-year HAL co-occurrence counts that can be updated with new documents
+
+    Counts (nw_xy, nw_x, term count) are additive over documents since windows never cross document borders,
+    so new documents are folded into the years they belong to without recomputing other years. The vocabulary
+    only grows: new terms are appended, existing ids are never renumbered.
+
+    Normalized (unscaled) cwr frames are cached per year, and are regenerated only for years changed by an update.
+    Stored in `folder` as:
+
+        state.json                  run parameters, per year term counts, document key column, folded documents
+        vocabulary.json             terms ordered by id
+        year=YYYY/nw_xy.npz         sparse co-occurrence counts
+        year=YYYY/nw_x.npy          window counts
+        year=YYYY/frame.parquet     cached co-occurrence frame
+    """
+    def __init__(
+        self, window_size, distance_metric, normalize='size', zero_diagonal=True, direction_sensitive=False,
+        min_nw_xy=None, min_cwr=None, top_k=None
+    ):
+
+        self.window_size = window_size
+        self.distance_metric = distance_metric
+        self.normalize = normalize
+        self.zero_diagonal = zero_diagonal
+        self.direction_sensitive = direction_sensitive
+        self.prune_opts = dict(min_nw_xy=min_nw_xy, min_cwr=min_cwr, top_k=top_k)
+
+        self.token2id = {}
+        self.years = {}
+        self.frames = {}
+        self.document_key = None
+        self.documents = set()
+        self.changed = set()
+
+    @property
+    def run_params(self):
+        return dict(
+            window_size=self.window_size,
+            distance_metric=self.distance_metric,
+            normalize=self.normalize,
+            zero_diagonal=self.zero_diagonal,
+            direction_sensitive=self.direction_sensitive,
+            **self.prune_opts
+        )
+
+    @property
+    def id2token(self):
+        return { v: k for k, v in self.token2id.items() }
+
+    def add_terms(self, doc_terms):
+        """Adds unseen terms to vocabulary (appended with new ids)"""
+        for terms in doc_terms:
+            for term in terms:
+                if term not in self.token2id:
+                    self.token2id[term] = len(self.token2id)
+
+    def get_document_keys(self, document_index):
+        """Returns keys of documents in `document_index` (values of first DOCUMENT_KEY_COLUMNS column found)
+
+        The key column must be the same for all updates of a state, and must exist, since documents already
+        folded in are identified by their keys.
+        """
+        key_column = self.document_key or next((x for x in DOCUMENT_KEY_COLUMNS if x in document_index.columns), None)
+        if key_column is None or key_column not in document_index.columns:
+            raise ValueError('document index has no document key column (expected {})'.format(key_column or ' or '.join(DOCUMENT_KEY_COLUMNS)))
+        keys = document_index[key_column]
+        if keys.isnull().any() or keys.duplicated().any():
+            raise ValueError('document key column {} has missing or duplicate values'.format(key_column))
+        self.document_key = key_column
+        return [ k.item() if hasattr(k, 'item') else k for k in keys ]
+
+    def update(self, corpus, document_index, boundaries=None):
+        """Folds documents in corpus into state. Documents already folded in (same key, see `get_document_keys`) are skipped.
+
+        Parameters
+        ----------
+        corpus, document_index, boundaries :
+            Same as for `co_occurrence.compute`
+
+        Returns
+        -------
+        list of int
+            Years that were changed by the update
+        """
+        doc_terms, boundaries = prepare_terms(corpus, boundaries)
+
+        document_index = document_index.reset_index(drop=True)
+
+        keys = self.get_document_keys(document_index)
+        is_new = [ key not in self.documents for key in keys ]
+
+        self.add_terms(terms for terms, new in zip(doc_terms, is_new) if new)
+
+        vocab_size = len(self.token2id)
+
+        changed_years = []
+
+        for year, year_index in document_index[is_new].groupby('year').groups.items():
+
+            year = int(year)
+            docs = [ doc_terms[i] for i in year_index ]
+            year_boundaries = [ boundaries[i] for i in year_index ] if boundaries is not None else None
+
+            logger.info('Updating year %s with %s documents...', year, len(docs))
+
+            vectorizer = vectorizer_hal.HyperspaceAnalogueToLanguageVectorizer(token2id=self.token2id)\
+                .fit(docs, size=self.window_size, distance_metric=self.distance_metric, boundaries=year_boundaries)
+
+            self._add_counts(year, vectorizer.nw_xy, vectorizer.nw_x, vectorizer.term_count, vocab_size)
+
+            self.frames.pop(year, None)
+            self.changed.add(year)
+            changed_years.append(year)
+
+        self.documents.update(key for key, new in zip(keys, is_new) if new)
+
+        return sorted(changed_years)
+
+    def _add_counts(self, year, nw_xy, nw_x, term_count, vocab_size):
+
+        counts = self.years.get(year)
+
+        if counts is None:
+            self.years[year] = types.SimpleNamespace(nw_xy=nw_xy.tocsr(), nw_x=nw_x, term_count=term_count)
+            return
+
+        counts.nw_xy = resize_matrix(counts.nw_xy, vocab_size) + nw_xy
+        counts.nw_x = resize_vector(counts.nw_x, vocab_size) + nw_x
+        counts.term_count += term_count
+
+    def cooccurrence(self, year):
+        """Returns (cached) co-occurrence frame for year, cwr is normalized but not scaled by global max"""
+
+        if year not in self.frames:
+
+            counts = self.years[year]
+
+            vectorizer = vectorizer_hal.HyperspaceAnalogueToLanguageVectorizer(token2id=self.token2id)
+            vectorizer.nw_xy = resize_matrix(counts.nw_xy, len(self.token2id))
+            vectorizer.nw_x = resize_vector(counts.nw_x, len(self.token2id))
+            vectorizer.term_count = counts.term_count
+
+            df = vectorizer.cooccurence(
+                direction_sensitive=self.direction_sensitive, normalize=self.normalize, zero_diagonal=self.zero_diagonal, **self.prune_opts
+            )
+            df['year'] = year
+
+            self.frames[year] = df[FRAME_COLUMNS]
+
+        return self.frames[year]
+
+    def compute(self, years=None):
+        """Returns co-occurrence frame for `years` (default all) in the same format as `co_occurrence.compute`"""
+
+        years = sorted(self.years.keys()) if years is None else years
+
+        df = pd.concat([ self.cooccurrence(year) for year in years ], ignore_index=True)
+
+        df['cwr'] = df.cwr / np.max(df.cwr, axis=0)
+
+        return df
+
+    def store(self, folder):
+        """Stores state in folder. Only years changed since last store (or load) are written."""
+
+        os.makedirs(folder, exist_ok=True)
+
+        for year, counts in self.years.items():
+
+            year_folder = os.path.join(folder, 'year={}'.format(year))
+            frame_filename = os.path.join(year_folder, 'frame.parquet')
+
+            if year in self.changed:
+                os.makedirs(year_folder, exist_ok=True)
+                sp.save_npz(os.path.join(year_folder, 'nw_xy.npz'), counts.nw_xy)
+                np.save(os.path.join(year_folder, 'nw_x.npy'), counts.nw_x)
+                if os.path.isfile(frame_filename):
+                    os.remove(frame_filename)
+
+            if year in self.frames and not os.path.isfile(frame_filename):
+                self.frames[year].to_parquet(frame_filename, index=False)
+
+        with open(os.path.join(folder, 'vocabulary.json'), 'w') as f:
+            json.dump(sorted(self.token2id, key=self.token2id.get), f)
+
+        with open(os.path.join(folder, 'state.json'), 'w') as f:
+            json.dump(dict(
+                self.run_params,
+                years={ str(year): counts.term_count for year, counts in self.years.items() },
+                document_key=self.document_key,
+                documents=sorted(self.documents)
+            ), f)
+
+        self.changed = set()
+
+        logger.info('Stored HAL state (%s years, %s terms) in %s', len(self.years), len(self.token2id), folder)
+
+    @staticmethod
+    def exists(folder):
+        return os.path.isfile(os.path.join(folder, 'state.json'))
+
+    @staticmethod
+    def load(folder):
+
+        with open(os.path.join(folder, 'state.json'), 'r') as f:
+            data = json.load(f)
+
+        with open(os.path.join(folder, 'vocabulary.json'), 'r') as f:
+            tokens = json.load(f)
+
+        state = HalState(**{ k: v for k, v in data.items() if k not in [ 'years', 'document_key', 'documents' ] })
+
+        state.token2id = { token: i for i, token in enumerate(tokens) }
+        state.document_key = data.get('document_key', 'filename' if data['documents'] else None)
+        state.documents = set(data['documents'])
+
+        for year, term_count in data['years'].items():
+
+            year_folder = os.path.join(folder, 'year={}'.format(year))
+
+            state.years[int(year)] = types.SimpleNamespace(
+                nw_xy=sp.load_npz(os.path.join(year_folder, 'nw_xy.npz')).tocsr(),
+                nw_x=np.load(os.path.join(year_folder, 'nw_x.npy')),
+                term_count=term_count
+            )
+
+            frame_filename = os.path.join(year_folder, 'frame.parquet')
+            if os.path.isfile(frame_filename):
+                state.frames[int(year)] = pd.read_parquet(frame_filename)
+
+        return state
+
+def update_state(folder, corpus, document_index, window_size, distance_metric, boundaries=None, **run_params):
+    """Loads (or creates) HAL state in folder, folds in new documents in corpus, and stores updated state
+
+    All run parameters (window, distance metric, normalization and pruning options) must equal those of a stored state.
+
+    Returns
+    -------
+    (HalState, list of int)
+        Updated state and changed years
+    """
+    state = HalState(window_size, distance_metric, **run_params)
+
+    if HalState.exists(folder):
+        stored_state = HalState.load(folder)
+        if stored_state.run_params != state.run_params:
+            differs = [ k for k in state.run_params if state.run_params[k] != stored_state.run_params[k] ]
+            raise ValueError('state in {} has different run parameters ({})'.format(folder, ', '.join(differs)))
+        state = stored_state
+
+    changed_years = state.update(corpus, document_index, boundaries=boundaries)
+
+    for year in changed_years:
+        state.cooccurrence(year)
+
+    state.store(folder)
+
+    return state, changed_years
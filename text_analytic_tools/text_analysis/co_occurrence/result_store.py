@@ -0,0 +1,220 @@
+import os
+import glob
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger('corpus_text_analysis')
+
+RUN_PARAMETERS = [ 'method', 'window_size', 'distance_metric', 'normalize', 'tag' ]
+
+VALUE_COLUMNS = [ 'nw_xy', 'nw_x', 'nw_y', 'cwr' ]
+
+# Data folders and their sort order, see `CoOccurrenceStore`
+DATA_ORDERS = { 'data': [ 'x_id', 'y_id' ], 'data_by_y': [ 'y_id', 'x_id' ] }
+
+YEAR_PARTITIONING = ds.partitioning(pa.schema([ ('year', pa.int32()) ]), flavor='hive')
+
+def run_key(**run_params):
+    """Returns relative (hive style) folder name that identifies a co-occurrence run
+
+    Known parameters (RUN_PARAMETERS) are added in a fixed order, any other parameters are appended in alphabetical order.
+    """
+    keys = [ k for k in RUN_PARAMETERS if k in run_params ] + sorted(k for k in run_params if k not in RUN_PARAMETERS)
+    parts = [ '{}={}'.format(k, utility.filename_whitelist(str(run_params[k]))) for k in keys if run_params[k] is not None ]
+    assert len(parts) > 0, 'at least one run parameter must be specified'
+    return os.path.join(*parts)
+
+def encode_terms(df):
+    """Returns vocabulary and int32 token ids for co-occurrence frame `df` (with x_term and y_term columns)"""
+    codes, tokens = pd.factorize(pd.concat([df.x_term, df.y_term], ignore_index=True))
+    x_codes, y_codes = np.split(codes.astype(np.int32), 2)
+    return np.asarray(tokens), x_codes, y_codes
+
+def compact_frame(df):
+    """Returns compact (numeric only) copy of co-occurrence frame `df` and its vocabulary"""
+
+    tokens, x_ids, y_ids = encode_terms(df)
+
+    data = pd.DataFrame({
+        'year': df.year.astype(np.int32).values,
+        'x_id': x_ids,
+        'y_id': y_ids,
+    })
+
+    for column in VALUE_COLUMNS:
+        values = df[column]
+        dtype = np.int32 if pd.api.types.is_integer_dtype(values) else np.float32
+        data[column] = values.astype(dtype).values
+
+    vocabulary = pd.DataFrame({
+        'token_id': np.arange(0, len(tokens), dtype=np.int32),
+        'token': tokens
+    })
+
+    return data.sort_values(['year', 'x_id', 'y_id']).reset_index(drop=True), vocabulary
+
+class CoOccurrenceStore():
+    """Columnar store for co-occurrence results computed by `co_occurrence.compute`
+
+    Each run is stored in a folder named by its run parameters (e.g. method=HAL/window_size=5/tag=...):
+
+        run.json                run parameters
+        vocabulary.parquet      token_id (int32), token
+        data/year=YYYY/         co-occurrence values (x_id, y_id, nw_xy, nw_x, nw_y, cwr) sorted by x_id, y_id
+        data_by_y/year=YYYY/    same values sorted by y_id, x_id
+
+    Terms are stored once in the vocabulary, and are returned as categoricals when data is loaded. The values are
+    stored in both orders so that a term lookup reads only matching row groups of either side (row group statistics
+    cannot prune a filter on x_id OR y_id).
+    """
+    def __init__(self, folder):
+        self.folder = folder
+
+    def run_folder(self, **run_params):
+        return os.path.join(self.folder, run_key(**run_params))
+
+    def exists(self, **run_params):
+        return os.path.isfile(os.path.join(self.run_folder(**run_params), 'run.json'))
+
+    def store(self, df, row_group_size=100000, **run_params):
+        """Stores co-occurrence frame `df` as a run identified by `run_params`. An existing run is replaced.
+
+        Parameters
+        ----------
+        df : DataFrame
+            Result from `co_occurrence.compute` i.e. with columns year, x_term, y_term, nw_xy, nw_x, nw_y, cwr
+        row_group_size : int, optional
+            Max number of rows per Parquet row group (smaller groups make term lookups more selective)
+
+        Returns
+        -------
+        str
+            Run folder
+        """
+        folder = self.run_folder(**run_params)
+
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+
+        os.makedirs(folder)
+
+        data, vocabulary = compact_frame(df)
+
+        pq.write_table(pa.Table.from_pandas(vocabulary, preserve_index=False), os.path.join(folder, 'vocabulary.parquet'))
+
+        for year, year_data in data.groupby('year'):
+            year_data = year_data.drop(columns='year')
+            for data_folder, sort_columns in DATA_ORDERS.items():
+                year_folder = os.path.join(folder, data_folder, 'year={}'.format(year))
+                os.makedirs(year_folder)
+                table = pa.Table.from_pandas(year_data.sort_values(sort_columns), preserve_index=False)
+                pq.write_table(table, os.path.join(year_folder, 'part-0.parquet'), row_group_size=row_group_size)
+
+        with open(os.path.join(folder, 'run.json'), 'w') as f:
+            json.dump(dict(run_params, n_rows=len(data), n_tokens=len(vocabulary)), f)
+
+        logger.info('Stored {} co-occurrence pairs in {}'.format(len(data), folder))
+
+        return folder
+
+    def runs(self):
+        """Returns a DataFrame with parameters of all runs in store"""
+        filenames = glob.glob(os.path.join(self.folder, '**', 'run.json'), recursive=True)
+        data = []
+        for filename in filenames:
+            with open(filename, 'r') as f:
+                data.append(utility.extend(json.load(f), folder=os.path.dirname(filename)))
+        return pd.DataFrame(data)
+
+    def vocabulary(self, **run_params):
+        """Returns run's vocabulary as a token Series indexed by token_id"""
+        df = pq.read_table(os.path.join(self.run_folder(**run_params), 'vocabulary.parquet')).to_pandas()
+        return df.set_index('token_id').token
+
+    def dataset(self, data_folder='data', **run_params):
+        return ds.dataset(
+            os.path.join(self.run_folder(**run_params), data_folder),
+            format='parquet',
+            partitioning=YEAR_PARTITIONING
+        )
+
+    def load(self, year=None, term=None, columns=None, **run_params):
+        """Loads (a subset of) stored run. Only partitions and row groups that match `year` and `term` are read.
+
+        Pairs of `term` are read as pairs where x_term is the term (from data sorted by x_id) and pairs where only
+        y_term is the term (from data sorted by y_id), so that both reads are pruned by row group statistics.
+
+        Parameters
+        ----------
+        year : int or list of int, optional
+            Year(s) to load, default all years
+        term : str or list of str, optional
+            Load only pairs where x_term or y_term is one of given term(s)
+        columns : list of str, optional
+            Value columns to load, default all
+
+        Returns
+        -------
+        DataFrame
+            Frame with columns year, x_id, y_id, x_term, y_term and value columns. Terms are categoricals.
+        """
+        vocabulary = self.vocabulary(**run_params)
+        year_expression = self._year_expression(year)
+        columns = [ 'year', 'x_id', 'y_id' ] + list(columns or VALUE_COLUMNS)
+
+        if term is None:
+            df = self.dataset(**run_params).to_table(columns=columns, filter=year_expression).to_pandas()
+            return self._decode(df, vocabulary)
+
+        ids = self._term_ids(vocabulary, term)
+
+        expressions = {
+            'data': ds.field('x_id').isin(ids),
+            'data_by_y': ds.field('y_id').isin(ids) & ~ds.field('x_id').isin(ids)
+        }
+
+        tables = [
+            self.dataset(data_folder, **run_params).to_table(
+                columns=columns, filter=expression if year_expression is None else (year_expression & expression)
+            ) for data_folder, expression in expressions.items()
+        ]
+
+        df = pa.concat_tables(tables).to_pandas()
+
+        return self._decode(df.sort_values([ 'year', 'x_id', 'y_id' ]).reset_index(drop=True), vocabulary)
+
+    def top_pairs(self, term=None, year=None, n_top=25, sort_by='cwr', **run_params):
+        """Returns `n_top` pairs for given term and/or year(s) having highest `sort_by` value
+
+        If `year` is None then the top pairs are returned for each year.
+        """
+        df = self.load(year=year, term=term, **run_params)
+
+        df = df.sort_values(['year', sort_by], ascending=[True, False])
+
+        return df.groupby('year').head(n_top).reset_index(drop=True)
+
+    def _year_expression(self, year=None):
+        if year is None:
+            return None
+        years = year if isinstance(year, (list, tuple, set)) else [ year ]
+        return ds.field('year').isin([ int(x) for x in years ])
+
+    def _term_ids(self, vocabulary, term):
+        terms = term if isinstance(term, (list, tuple, set)) else [ term ]
+        token2id = pd.Series(vocabulary.index, index=vocabulary.values)
+        return [ int(token2id[x]) for x in terms if x in token2id.index ]
+
+    def _decode(self, df, vocabulary):
+        categories = vocabulary.sort_index().values
+        df['x_term'] = pd.Categorical.from_codes(df.x_id, categories=categories)
+        df['y_term'] = pd.Categorical.from_codes(df.y_id, categories=categories)
+        return df[[ 'year', 'x_id', 'y_id', 'x_term', 'y_term' ] + [ x for x in VALUE_COLUMNS if x in df.columns ]]
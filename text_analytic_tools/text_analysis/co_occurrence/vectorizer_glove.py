@@ -1,12 +1,120 @@
-#import glove
+import concurrent.futures
+
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 import text_analytic_tools.utility as utility
 import text_analytic_tools.common.text_corpus as text_corpus
-import glove
+
+from . import windows
+from . import vectorizer_hal
+
+try:
+    import numba
+    njit = numba.njit
+except ImportError:
+    # Same results without numba, but orders of magnitude slower (and the threads are serialized by the GIL)
+    numba = None
+    def njit(*args, **kwargs):
+        return args[0] if len(args) == 1 and callable(args[0]) else (lambda f: f)
 
 logger = utility.getLogger('corpus_text_analysis')
 
+def glove_cooccurrence_matrix(token_ids, segments, size, vocab_size, zero_out_diag=True):
+    """Returns GloVe co-occurrence matrix i.e. symmetric 1/d weighted counts within `size` tokens,
+    stored as an upper triangular matrix (same layout as glove.Corpus.matrix). The diagonal (a term co-occurring
+    with itself) is kept only if `zero_out_diag` is False."""
+    matrix = windows.cooccurrence_matrix(token_ids, segments, size, vocab_size, distance_metric=1, zero_out_diag=zero_out_diag)
+    upper = sp.triu(matrix + matrix.T, k=1)
+    if not zero_out_diag:
+        upper = upper + sp.diags(matrix.diagonal())
+    return upper.tocsr()
+
+@njit(nogil=True)
+def _train_pairs(W, C, bw, bc, GW, GC, Gbw, Gbc, rows, cols, log_counts, f_counts, index, learning_rate):
+    """AdaGrad updates of parameters (in place) for pairs `index`, returns the loss. Runs without the GIL."""
+    loss = 0.0
+    for k in range(len(index)):
+        p = index[k]
+        i, j = rows[p], cols[p]
+
+        diff = bw[i] + bc[j] - log_counts[p]
+        for c in range(W.shape[1]):
+            diff += W[i, c] * C[j, c]
+        fdiff = f_counts[p] * diff
+        loss += 0.5 * fdiff * diff
+
+        for c in range(W.shape[1]):
+            gw = fdiff * C[j, c]
+            gc = fdiff * W[i, c]
+            W[i, c] -= learning_rate * gw / np.sqrt(GW[i, c])
+            C[j, c] -= learning_rate * gc / np.sqrt(GC[j, c])
+            GW[i, c] += gw * gw
+            GC[j, c] += gc * gc
+
+        bw[i] -= learning_rate * fdiff / np.sqrt(Gbw[i])
+        bc[j] -= learning_rate * fdiff / np.sqrt(Gbc[j])
+        Gbw[i] += fdiff * fdiff
+        Gbc[j] += fdiff * fdiff
+
+    return loss
+
+def train_glove(
+    matrix,
+    n_components=100,
+    epochs=10,
+    learning_rate=0.05,
+    x_max=100.0,
+    alpha=0.75,
+    n_threads=4,
+    random_state=None,
+    tick=utility.noop
+):
+    """Trains GloVe word vectors on co-occurrence `matrix` using AdaGrad
+
+    Both (x, y) and (y, x) are used as training pairs when `matrix` is triangular (the diagonal is not used).
+    Each epoch the shuffled pairs are split between `n_threads` threads that update shared parameters pair by
+    pair (Hogwild). The update kernel is compiled with numba and releases the GIL, so the threads run in parallel.
+
+    Returns
+    -------
+    (ndarray, ndarray, list)
+        word vectors (W + W~), word biases (b + b~) and mean loss per epoch
+    """
+    coo = sp.triu(matrix, k=1).tocoo()
+    rows = np.concatenate([coo.row, coo.col]).astype(np.int32)
+    cols = np.concatenate([coo.col, coo.row]).astype(np.int32)
+    counts = np.concatenate([coo.data, coo.data]).astype(np.float64)
+
+    vocab_size = matrix.shape[0]
+    random = np.random.RandomState(random_state)
+
+    W = (random.rand(vocab_size, n_components) - 0.5) / n_components
+    C = (random.rand(vocab_size, n_components) - 0.5) / n_components
+    bw = np.zeros(vocab_size)
+    bc = np.zeros(vocab_size)
+
+    # AdaGrad accumulators are initialized to 1 (as in reference implementation)
+    GW, GC = np.ones_like(W), np.ones_like(C)
+    Gbw, Gbc = np.ones_like(bw), np.ones_like(bc)
+
+    log_counts = np.log(counts)
+    f_counts = np.minimum(1.0, (counts / x_max) ** alpha)
+
+    def train_partition(index):
+        return _train_pairs(W, C, bw, bc, GW, GC, Gbw, Gbc, rows, cols, log_counts, f_counts, index, learning_rate)
+
+    losses = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for epoch in range(0, epochs):
+            partitions = np.array_split(random.permutation(len(counts)), n_threads)
+            loss = sum(executor.map(train_partition, partitions))
+            losses.append(loss / max(len(counts), 1))
+            logger.info('GloVe epoch %s: loss %.6f', epoch, losses[-1])
+            tick()
+
+    return W + C, bw + bc, losses
+
 # See http://www.foldl.me/2014/glove-python/
 class GloveVectorizer():
 
@@ -16,6 +124,12 @@ class GloveVectorizer():
         self._id2token = None
         self.corpus = corpus
 
+        self.nw_xy = None
+        self.nw_x = None
+        self.word_vectors = None
+        self.word_biases = None
+        self.losses = None
+
     @property
     def corpus(self):
         return self._corpus
@@ -37,58 +151,65 @@ class GloveVectorizer():
                 self._id2token = { v:k for k,v in self.token2id.items() }
         return self._id2token
 
-    #def fit(self, sentences, window=2, dictionary=None):
-    def fit(self, corpus=None, size=2):  #, distance_metric=0, zero_out_diag=False):
+    def fit(self, corpus=None, size=2, boundaries=None, zero_out_diag=True):
+        """Computes GloVe co-occurrence matrix nw_xy and term window counts nw_x for corpus
 
+        The matrix equals the one computed by `glove.Corpus.fit(corpus, window=size)`, the window counts are computed as in HAL.
+        Self co-occurrences are kept on the diagonal if `zero_out_diag` is False (they are never used in training).
+        """
         if corpus is not None:
             self.corpus = corpus
 
         assert self.token2id is not None, "Fit with no vocabulary!"
         assert self.corpus is not None, "Fit with no corpus!"
 
-        glove_corpus = glove.Corpus(dictionary=self.token2id)
-        glove_corpus.fit(corpus, window=size)
+        vocab_size = len(self.token2id)
+
+        token_ids, segments, positions = windows.flatten_documents(self.corpus, self.token2id, boundaries=boundaries)
 
-        self.nw_xy = glove_corpus.matrix
+        self.nw_xy = glove_cooccurrence_matrix(token_ids, segments, size, vocab_size, zero_out_diag=zero_out_diag)
+        self.nw_x = windows.window_counts(token_ids, positions, size, vocab_size)
 
         return self
 
-    def cooccurence(self, normalize='size', zero_diagonal=True):
-        '''Return computed co-occurrence values'''
+    def train(self, n_components=100, epochs=10, learning_rate=0.05, n_threads=4, random_state=None, **kwargs):
+        """Trains word vectors on computed co-occurrence matrix, see `train_glove` for arguments"""
 
-        matrix = self.nw_xy
+        assert self.nw_xy is not None, "Train before fit!"
 
-        #if zero_diagonal:
-        #    matrix.fill_diagonal(0)
+        self.word_vectors, self.word_biases, self.losses = train_glove(
+            self.nw_xy,
+            n_components=n_components,
+            epochs=epochs,
+            learning_rate=learning_rate,
+            n_threads=n_threads,
+            random_state=random_state,
+            **kwargs
+        )
 
-        coo_matrix = matrix #.tocoo(copy=False)
+        return self
 
-        df = pd.DataFrame({
-            'x_id': coo_matrix.row,
-            'y_id': coo_matrix.col,
-            'nw_xy': coo_matrix.data,
-            'nw_x': 0,
-            'nw_y': 0,
-        }).reset_index(drop=True)
+    def most_similar(self, token, n_top=10):
+        """Returns `n_top` tokens having most similar (cosine) word vectors"""
 
-        df = df.assign(
-            x_term=df.x_id.apply(lambda x: self.id2token[x]),
-            y_term=df.y_id.apply(lambda x: self.id2token[x])
-        )
+        assert self.word_vectors is not None, "No word vectors (train first)!"
+
+        vectors = self.word_vectors / np.linalg.norm(self.word_vectors, axis=1)[:, None]
+        similarity = vectors.dot(vectors[self.token2id[token]])
+        similarity[self.token2id[token]] = -np.inf
+
+        top_ids = np.argsort(-similarity)[:n_top]
 
-        df = df[['x_id', 'y_id', 'x_term', 'y_term', 'nw_xy', 'nw_x', 'nw_y']]
+        return pd.DataFrame({
+            'token': [ self.id2token[i] for i in top_ids ],
+            'similarity': similarity[top_ids]
+        })
 
-        norm = 1.0
-        if normalize == 'size':
-            norm = self.term_count
-        elif normalize == 'max':
-            norm = np.max(coo_matrix)
-        elif normalize is None:
-            logger.warning('No normalize method specified. Using absolute counts...')
-            pass # return as as is..."
-        else:
-            assert False, 'Unknown normalize specifier'
+    def cooccurence(self, normalize='size', zero_diagonal=True, **prune_opts):
+        '''Return computed co-occurrence values, see `vectorizer_hal.cooccurrence_frame` for pruning options
 
-        df_nw_xy = df.assign(cwr=df.nw_xy / norm)
+        Self co-occurrences are included only if `zero_diagonal` is False and the matrix was fitted with them.
+        '''
+        matrix = sp.triu(self.nw_xy, k=1) if zero_diagonal else self.nw_xy
 
-        return df_nw_xy[df_nw_xy.cwr > 0]
+        return vectorizer_hal.cooccurrence_frame(matrix, self.nw_x, self.id2token, self.term_count, normalize=normalize, **prune_opts)
@@ -1,10 +1,11 @@
 import scipy.sparse as sp
 import numpy as np
 import pandas as pd
-import itertools
 import text_analytic_tools.utility as utility
 import text_analytic_tools.common.text_corpus as text_corpus
 
+from . import windows
+
 logger = utility.getLogger('corpus_text_analysis')
 
 class HyperspaceAnalogueToLanguageVectorizer():
@@ -46,18 +47,22 @@ class HyperspaceAnalogueToLanguageVectorizer():
                 self._id2token = { v:k for k,v in self.token2id.items() }
         return self._id2token
 
-    def sliding_window(self, seq, n):
-        it = itertools.chain(iter(seq), [None] * n)
-        memory = tuple(itertools.islice(it, n+1))
-        if len(memory) == n+1:
-            yield memory
-        for x in it:
-            memory = memory[1:] + (x,)
-            yield memory
-
-    def fit(self, corpus=None, size=2, distance_metric=0, zero_out_diag=False):
-
-        '''Trains HAL for a document. Note that sentence borders (for now) are ignored'''
+    def fit(self, corpus=None, size=2, distance_metric=0, zero_out_diag=False, boundaries=None):
+        """Trains HAL for a corpus. Co-occurrences are never counted across document (or segment) borders.
+
+        Parameters
+        ----------
+        corpus : Iterable[Iterable[str]], optional
+            Tokenized documents
+        size : int
+            Window size i.e. number of tokens looked ahead
+        distance_metric : int
+            0 = linear (size - d + 1), 1 = inverse (1 / d), 2 = constant (1)
+        zero_out_diag : bool
+            Skip pairs of identical terms
+        boundaries : Iterable[Iterable[int]], optional
+            Per document segment (e.g. sentence or chunk) start offsets, see `windows.chunk_offsets`
+        """
 
         if corpus is not None:
             self.corpus = corpus
@@ -65,49 +70,14 @@ class HyperspaceAnalogueToLanguageVectorizer():
         assert self.token2id is not None, "Fit with no vocabulary!"
         assert self.corpus is not None, "Fit with no corpus!"
 
-        nw_xy = sp.lil_matrix ((len(self.token2id), len(self.token2id)), dtype=np.int32)
-        nw_x = np.zeros(len(self.token2id), dtype=np.int32)
-
-        for terms in corpus:
-
-            id_terms = ( self.token2id[size] for size in terms)
-
-            self.tick()
-
-            for win in self.sliding_window(id_terms, size):
-
-                #logger.info([ self.id2token[x] if x is not None else None for x in win])
-
-                if win[0] is None:
-                    continue
-
-                for x in win:
-                    if x is not None:
-                        nw_x[x] += 1
-
-                for i in range(1, size+1):
-
-                    if win[i] is None:
-                        continue
-
-                    if zero_out_diag:
-                        if win[0] == win[i]:
-                            continue
+        vocab_size = len(self.token2id)
 
-                    d = float(i) # abs(n - i)
-                    if distance_metric == 0: #  linear i.e. adjacent equals window size, then decreasing by one
-                        w = (size - d + 1) # / size
-                    elif distance_metric == 1: # f(d) = 1 / d
-                        w = 1.0 / d
-                    elif distance_metric == 2: # Constant value of 1
-                        w = 1
+        token_ids, segments, positions = windows.flatten_documents(self.corpus, self.token2id, boundaries=boundaries, tick=self.tick)
 
-                    #print('*', i, self.id2token[win[0]], self.id2token[win[i]], w, [ self.id2token[x] if x is not None else None for x in win])
-                    nw_xy[win[0], win[i]] += w
-
-        self.nw_x = nw_x
-        self.nw_xy = nw_xy
-        #self.f_xy = nw_xy / np.max(nw_xy)
+        self.nw_x = windows.window_counts(token_ids, positions, size, vocab_size)
+        self.nw_xy = windows.cooccurrence_matrix(
+            token_ids, segments, size, vocab_size, distance_metric=distance_metric, zero_out_diag=zero_out_diag
+        )
 
         return self
 
@@ -178,57 +148,92 @@ class HyperspaceAnalogueToLanguageVectorizer():
 
     #     return df
 
-    def cooccurence(self, direction_sensitive=False, normalize='size', zero_diagonal=True):
-        '''Return computed co-occurrence values'''
+    def cooccurence(self, direction_sensitive=False, normalize='size', zero_diagonal=True, **prune_opts):
+        '''Return computed co-occurrence values, see `cooccurrence_frame` for pruning options (min_nw_xy, min_cwr, top_k)'''
 
         matrix = self.nw_xy
 
         if not direction_sensitive:
-            matrix += matrix.T
-            matrix[np.tril_indices(matrix.shape[0])] = 0
-        else:
-            if zero_diagonal:
-                matrix.fill_diagonal(0)
-
-        coo_matrix = matrix.tocoo(copy=False)
-
-        df_nw_x = pd.DataFrame(self.nw_x, columns=['nw'])
-
-        df = pd.DataFrame({
-            'x_id': coo_matrix.row,
-            'y_id': coo_matrix.col,
-            'nw_xy': coo_matrix.data
-        })[['x_id', 'y_id', 'nw_xy']].sort_values(['x_id', 'y_id']).reset_index(drop=True)
-
-        df = df.assign(
-            x_term=df.x_id.apply(lambda x: self.id2token[x]),
-            y_term=df.y_id.apply(lambda x: self.id2token[x])
-        )
-
-        df = df.merge(df_nw_x, left_on='x_id', right_index=True, how='inner').rename(columns={'nw': 'nw_x'})
-        df = df.merge(df_nw_x, left_on='y_id', right_index=True, how='inner').rename(columns={'nw': 'nw_y'})
-
-        df = df[['x_id', 'y_id', 'x_term', 'y_term', 'nw_xy', 'nw_x', 'nw_y']]
-
-        norm = 1.0
-        if normalize == 'size':
-            norm = self.term_count
-        elif normalize == 'max':
-            norm = np.max(coo_matrix)
-        elif normalize is None:
-            logger.warning('No normalize method specified. Using absolute counts...')
-            # return as as is..."
-        else:
-            assert False, 'Unknown normalize specifier'
-
-        #logger.info('Normalizing for document corpus size %s.', norm)
-
-        df_nw_xy = df.assign(cwr=((df.nw_xy / (df.nw_x + df.nw_y - df.nw_xy)) / norm))
-
-        df_nw_xy.loc[df_nw_xy.cwr < 0.0, 'cwr'] = 0
-        df_nw_xy.cwr.fillna(0.0, inplace=True)
-
-        return df_nw_xy[df_nw_xy.cwr > 0]
+            matrix = sp.triu(matrix + matrix.T, k=1)
+        elif zero_diagonal:
+            matrix = sp.triu(matrix, k=1) + sp.tril(matrix, k=-1)
+
+        return cooccurrence_frame(matrix, self.nw_x, self.id2token, self.term_count, normalize=normalize, **prune_opts)
+
+def top_k_mask(keys, values, k):
+    """Returns mask that is True for the `k` highest `values` within each group of equal `keys`"""
+    order = np.lexsort((-values, keys))
+    sorted_keys = keys[order]
+    group_start = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])) if len(keys) > 0 else np.zeros(0, dtype=np.int64)
+    group_sizes = np.diff(np.concatenate([group_start, [len(keys)]]))
+    rank = np.arange(len(keys)) - np.repeat(group_start, group_sizes)
+    mask = np.zeros(len(keys), dtype=bool)
+    mask[order[rank < k]] = True
+    return mask
+
+def cooccurrence_frame(matrix, nw_x, id2token, term_count, normalize='size', min_nw_xy=None, min_cwr=None, top_k=None):
+    '''Returns co-occurrence values in sparse `matrix` as a frame with HAL normalized cwr values
+
+    cwr = nw_xy / (nw_x + nw_y - nw_xy), normalized by corpus size (term_count) or max value
+
+    Pairs are pruned on the sparse data before the frame is created:
+        min_nw_xy   skip pairs having fewer co-occurrences
+        min_cwr     skip pairs having a lower (normalized) cwr
+        top_k       keep only pairs that are among the top_k (by cwr) partners of either x or y
+    '''
+    coo_matrix = matrix.tocoo(copy=False)
+
+    norm = 1.0
+    if normalize == 'size':
+        norm = term_count
+    elif normalize == 'max':
+        norm = coo_matrix.max()
+    elif normalize is None:
+        logger.warning('No normalize method specified. Using absolute counts...')
+        # return as as is..."
+    else:
+        assert False, 'Unknown normalize specifier'
+
+    x_id, y_id, nw_xy = coo_matrix.row, coo_matrix.col, coo_matrix.data
+    nw_x_values, nw_y_values = nw_x[x_id], nw_x[y_id]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cwr = (nw_xy / (nw_x_values.astype(np.float64) + nw_y_values - nw_xy)) / norm
+
+    cwr[np.isnan(cwr) | (cwr < 0.0)] = 0.0
+
+    mask = cwr > 0
+
+    if min_nw_xy is not None:
+        mask &= nw_xy >= min_nw_xy
+
+    if min_cwr is not None:
+        mask &= cwr >= min_cwr
+
+    if top_k is not None:
+        index = np.flatnonzero(mask)
+        keep = top_k_mask(x_id[index], cwr[index], top_k) | top_k_mask(y_id[index], cwr[index], top_k)
+        mask[index[~keep]] = False
+
+    index = np.flatnonzero(mask)
+    index = index[np.lexsort((y_id[index], x_id[index]))]
+
+    x_id, y_id = x_id[index], y_id[index]
+
+    token_ids, codes = np.unique(np.concatenate([x_id, y_id]), return_inverse=True)
+    tokens = np.array([ id2token[i] for i in token_ids ], dtype=object)
+    x_codes, y_codes = np.split(codes.reshape(-1), 2)
+
+    return pd.DataFrame({
+        'x_id': x_id,
+        'y_id': y_id,
+        'x_term': tokens[x_codes],
+        'y_term': tokens[y_codes],
+        'nw_xy': nw_xy[index],
+        'nw_x': nw_x_values[index],
+        'nw_y': nw_y_values[index],
+        'cwr': cwr[index]
+    })
 
 def test_burgess_litmus_test():
     terms = 'The Horse Raced Past The Barn Fell .'.lower().split()
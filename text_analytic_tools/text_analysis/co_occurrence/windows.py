@@ -0,0 +1,113 @@
+import numpy as np
+import scipy.sparse as sp
+
+import text_analytic_tools.utility as utility
+
+def chunk_offsets(n_tokens):
+    """Returns segment start offsets for a document made up of chunks having `n_tokens` tokens each
+
+    Use e.g. with the n_tokens column of a tokenized archive's summary, grouped by document_id and ordered by chunk_index.
+    """
+    return np.concatenate([[0], np.cumsum(n_tokens)[:-1]]).astype(np.int64)
+
+def filtered_offsets(keep, offsets):
+    """Maps segment offsets in a token sequence onto the sequence that remains when tokens where `keep` is False are removed"""
+    kept_before = np.concatenate([[0], np.cumsum(np.asarray(keep, dtype=np.int64))])
+    return np.unique(kept_before[np.clip(np.asarray(offsets, dtype=np.int64), 0, len(kept_before) - 1)])
+
+def flatten_documents(documents, token2id, boundaries=None, tick=utility.noop):
+    """Concatenates tokenized documents into a single token id vector with segment and position data
+
+    Parameters
+    ----------
+    documents : Iterable[Iterable[str]]
+        Tokenized documents
+    token2id : dict
+        Vocabulary
+    boundaries : Iterable[Iterable[int]], optional
+        Per document segment (e.g. sentence or chunk) start offsets. A document is always a segment of its own.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray)
+        token ids, segment index for each token, and position of each token within its segment
+    """
+    boundaries = iter(boundaries) if boundaries is not None else None
+
+    token_ids = []
+    segment_starts = []
+    offset = 0
+
+    for terms in documents:
+
+        ids = np.fromiter((token2id[t] for t in terms), dtype=np.int32)
+
+        starts = { 0 }
+        if boundaries is not None:
+            starts.update(int(x) for x in next(boundaries) if 0 < int(x) < len(ids))
+
+        token_ids.append(ids)
+        segment_starts.extend(offset + x for x in sorted(starts) if x < len(ids))
+        offset += len(ids)
+
+        tick()
+
+    token_ids = np.concatenate(token_ids) if len(token_ids) > 0 else np.zeros(0, dtype=np.int32)
+
+    is_segment_start = np.zeros(len(token_ids), dtype=np.int64)
+    is_segment_start[segment_starts] = 1
+
+    segments = np.cumsum(is_segment_start) - 1
+    positions = np.arange(len(token_ids)) - np.asarray(segment_starts, dtype=np.int64)[segments]
+
+    return token_ids, segments, positions
+
+def window_pairs(segments, size):
+    """Yields (distance, left, right) for each distance 1..size in a forward looking window
+
+    `left` and `right` are index vectors of token pairs that are `distance` tokens apart within the same segment.
+    """
+    n = len(segments)
+    for d in range(1, size + 1):
+        if d >= n:
+            break
+        left = np.flatnonzero(segments[:-d] == segments[d:])
+        yield d, left, left + d
+
+def window_counts(token_ids, positions, size, vocab_size):
+    """Returns number of windows each token type occurs in, i.e. each token occurrence
+    is counted once for every window (starting at a token in the same segment) that covers it"""
+    weights = np.minimum(positions, size) + 1
+    return np.bincount(token_ids, weights=weights, minlength=vocab_size).astype(np.int32)
+
+def distance_weight(distance_metric, size, d):
+    """Returns weight for tokens `d` positions apart given window `size`"""
+    if distance_metric == 0:    # linear i.e. adjacent equals window size, then decreasing by one
+        return size - d + 1
+    if distance_metric == 1:    # f(d) = 1 / d
+        return 1.0 / d
+    if distance_metric == 2:    # constant value of 1
+        return 1
+    assert False, 'Unknown distance metric'
+    return None
+
+def cooccurrence_matrix(token_ids, segments, size, vocab_size, distance_metric=0, zero_out_diag=False, dtype=None):
+    """Returns forward looking (direction sensitive) co-occurrence matrix where [x, y] is the
+    weighted count of y occurring within `size` tokens after x in the same segment"""
+
+    dtype = dtype or (np.float64 if distance_metric == 1 else np.int32)
+    matrix = sp.csr_matrix((vocab_size, vocab_size), dtype=dtype)
+
+    for d, left, right in window_pairs(segments, size):
+
+        x, y = token_ids[left], token_ids[right]
+
+        if zero_out_diag:
+            keep = x != y
+            x, y = x[keep], y[keep]
+
+        w = np.full(len(x), distance_weight(distance_metric, size, d), dtype=dtype)
+
+        matrix = matrix + sp.csr_matrix((w, (x, y)), shape=(vocab_size, vocab_size), dtype=dtype)
+
+    return matrix
@@ -0,0 +1,225 @@
+import numpy as np
+import scipy.sparse as sp
+import gensim
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Same value as in gensim.topic_coherence.direct_confirmation_measure
+EPSILON = 1e-12
+
+# Default sliding window sizes (same as gensim's CoherenceModel), None means boolean document
+WINDOW_SIZES = { 'c_v': 110, 'c_npmi': 10, 'u_mass': None }
+
+def merge_intervals(starts, ends):
+    """Returns union of closed integer intervals (sorted by start) as (starts, ends) of disjoint intervals"""
+    if len(starts) == 0:
+        return starts, ends
+    running_end = np.maximum.accumulate(ends)
+    is_new = np.concatenate([[True], starts[1:] > running_end[:-1] + 1])
+    first = np.flatnonzero(is_new)
+    return starts[first], np.maximum.reduceat(ends, first)
+
+class WindowIndex():
+    """Boolean sliding window occurrence statistics for a corpus
+
+    A virtual document (window) is identified by its start position in the concatenated corpus. For each word the
+    set of windows that contain the word is stored as a list of disjoint (merged) intervals of start positions,
+    so the number of windows containing a word is the total interval length, and the number of windows containing
+    both a and b is |A| + |B| - |A u B|. As in gensim, a document shorter than the window is a single window.
+
+    Window membership follows gensim's WordOccurrenceAccumulator (so that scores are comparable with earlier
+    results): when the window slides, the word leaving the window is removed even if it occurs again later in
+    the window. Hence an occurrence at p marks windows from p - size + 1 up to the first occurrence of the word
+    at or after that window's start.
+    """
+    def __init__(self, token_ids, offsets, window_size, vocab_size):
+
+        self.window_size = window_size
+
+        doc_starts, doc_ends = offsets[:-1], offsets[1:]
+        last_starts = np.maximum(doc_starts, doc_ends - window_size)
+
+        self.n_windows = last_starts - doc_starts + 1
+
+        document_ids = np.repeat(np.arange(0, len(doc_starts)), doc_ends - doc_starts)
+        positions = np.arange(0, len(token_ids), dtype=np.int64)
+
+        # Sort occurrences by word, then position
+        order = np.argsort(token_ids, kind='stable')
+        words, positions, document_ids = token_ids[order], positions[order], document_ids[order]
+
+        starts = np.maximum(positions - window_size + 1, doc_starts[document_ids])
+
+        keys = words.astype(np.int64) * (len(token_ids) + 1) + positions
+        first_occurrence = positions[np.searchsorted(keys, words.astype(np.int64) * (len(token_ids) + 1) + starts)]
+        ends = np.minimum(first_occurrence, last_starts[document_ids])
+
+        # Starts and ends are non-decreasing within each word
+        is_new = np.concatenate([[True], (words[1:] != words[:-1]) | (starts[1:] > ends[:-1] + 1)]) if len(words) > 0 else np.zeros(0, dtype=bool)
+        first = np.flatnonzero(is_new)
+
+        self.starts = starts[first]
+        self.ends = np.maximum.reduceat(ends, first) if len(first) > 0 else ends[first]
+
+        self.word_ptr = np.searchsorted(words[first], np.arange(0, vocab_size + 1))
+        self.counts = np.zeros(vocab_size, dtype=np.int64)
+        lengths = self.ends - self.starts + 1
+        np.add.at(self.counts, words[first], lengths)
+
+        self._pair_cache = {}
+
+    def intervals(self, w):
+        return self.starts[self.word_ptr[w]:self.word_ptr[w + 1]], self.ends[self.word_ptr[w]:self.word_ptr[w + 1]]
+
+    def co_occurrence(self, a, b):
+        """Returns number of windows containing both a and b"""
+
+        if a == b:
+            return self.counts[a]
+
+        key = (a, b) if a < b else (b, a)
+
+        if key not in self._pair_cache:
+            a_starts, a_ends = self.intervals(a)
+            b_starts, b_ends = self.intervals(b)
+            starts, ends = np.concatenate([a_starts, b_starts]), np.concatenate([a_ends, b_ends])
+            order = np.argsort(starts, kind='stable')
+            union_starts, union_ends = merge_intervals(starts[order], ends[order])
+            self._pair_cache[key] = self.counts[a] + self.counts[b] - np.sum(union_ends - union_starts + 1)
+
+        return self._pair_cache[key]
+
+class CoherenceService():
+    """Scores topic models with c_v, c_npmi or u_mass coherence against cached corpus statistics
+
+    Gives the same scores as gensim's CoherenceModel (with `texts` for sliding window measures and `corpus`
+    for u_mass) but the sliding window statistics are computed once per corpus and window size, and pair
+    counts are cached between topics and models.
+
+    Parameters
+    ----------
+    train_corpus : topic_model_corpus.TrainCorpus
+        Corpus with token id array, document offsets and dictionary
+    """
+    def __init__(self, train_corpus):
+
+        self.id2word = train_corpus.id2word
+        self.token_ids = train_corpus.token_ids
+        self.offsets = train_corpus.offsets
+
+        vocab_size = len(self.id2word)
+        n_documents = len(self.offsets) - 1
+
+        document_ids = np.repeat(np.arange(0, n_documents), np.diff(self.offsets))
+
+        self.document_term_matrix = sp.csr_matrix(
+            (np.ones(len(self.token_ids), dtype=np.int32), (document_ids, self.token_ids)), shape=(n_documents, vocab_size)
+        )
+        self.document_term_matrix.data[:] = 1
+        self.document_term_matrix = self.document_term_matrix.tocsc()
+
+        self.document_counts = np.diff(self.document_term_matrix.indptr)
+
+        self._window_indexes = {}
+
+    def window_index(self, window_size):
+        if window_size not in self._window_indexes:
+            logger.info('Computing sliding window statistics (window size %s)...', window_size)
+            self._window_indexes[window_size] = WindowIndex(self.token_ids, self.offsets, window_size, len(self.id2word))
+        return self._window_indexes[window_size]
+
+    def prepare(self, coherence='c_v', window_size=None):
+        """Precomputes statistics needed for `coherence` (e.g. before statistics are shared with worker processes)"""
+        window_size = window_size or WINDOW_SIZES[coherence]
+        if window_size is not None:
+            self.window_index(window_size)
+        return self
+
+    @staticmethod
+    def model_topics(model, topn=20):
+        """Returns ids of the `topn` highest weighted words in each of model's topics"""
+        return [ gensim.matutils.argsort(topic, topn=topn, reverse=True) for topic in model.get_topics() ]
+
+    def score_model(self, model, coherence='c_v', topn=20, window_size=None):
+        return self.score(self.model_topics(model, topn=topn), coherence=coherence, window_size=window_size)
+
+    def score(self, topics, coherence='c_v', window_size=None):
+        """Returns mean coherence and coherence per topic for `topics` (lists of word ids)
+
+        Parameters
+        ----------
+        topics : list of list of int
+            Word ids for each topic (most relevant first)
+        coherence : str
+            'c_v', 'c_npmi' or 'u_mass'
+        window_size : int, optional
+            Sliding window size, default as in gensim (110 for c_v and 10 for c_npmi)
+        """
+        assert coherence in WINDOW_SIZES, 'Unknown coherence measure {}'.format(coherence)
+
+        topics = [ np.asarray(topic, dtype=np.int64) for topic in topics ]
+
+        if coherence == 'u_mass':
+            scores = self._u_mass(topics)
+        else:
+            counts, pair_counts, num_docs = self._window_statistics(topics, window_size or WINDOW_SIZES[coherence])
+            if coherence == 'c_v':
+                scores = [ self._c_v(topic, counts, pair_counts, num_docs) for topic in topics ]
+            else:
+                scores = [ self._c_npmi(topic, counts, pair_counts, num_docs) for topic in topics ]
+
+        return float(np.mean(scores)), scores
+
+    def _window_statistics(self, topics, window_size):
+
+        index = self.window_index(window_size)
+
+        words = np.unique(np.concatenate(topics))
+
+        # As in gensim 3.8, only documents containing at least one of the topic words are counted
+        is_relevant = np.asarray(self.document_term_matrix[:, words].sum(axis=1)).ravel() > 0
+        num_docs = float(np.sum(index.n_windows[is_relevant]))
+
+        pair_counts = lambda a, b: index.co_occurrence(a, b)
+
+        return index.counts, pair_counts, num_docs
+
+    @staticmethod
+    def _npmi_matrix(topic, counts, pair_counts, num_docs):
+        n = len(topic)
+        co_occurrences = np.array([ [ pair_counts(topic[i], topic[j]) for j in range(0, n) ] for i in range(0, n) ], dtype=np.float64)
+        co_probability = co_occurrences / num_docs
+        probability = counts[topic] / num_docs
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pmi = np.log((co_probability + EPSILON) / np.outer(probability, probability))
+            return pmi / -np.log(co_probability + EPSILON)
+
+    def _c_v(self, topic, counts, pair_counts, num_docs):
+        # Indirect cosine of NPMI context vectors (segmentation: each word vs. the set of all topic words)
+        npmi = self._npmi_matrix(topic, counts, pair_counts, num_docs)
+        set_vector = npmi.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similarities = npmi.dot(set_vector) / (np.linalg.norm(npmi, axis=1) * np.linalg.norm(set_vector))
+        return np.mean(similarities)
+
+    def _c_npmi(self, topic, counts, pair_counts, num_docs):
+        # Direct NPMI (segmentation: all ordered pairs of distinct words)
+        npmi = self._npmi_matrix(topic, counts, pair_counts, num_docs)
+        return np.mean(npmi[~np.eye(len(topic), dtype=bool)])
+
+    def _u_mass(self, topics):
+        # Log conditional probability (segmentation: each word vs. each preceding word) with document co-occurrence
+        num_docs = float(self.document_term_matrix.shape[0])
+        scores = []
+        for topic in topics:
+            X = self.document_term_matrix[:, topic]
+            co_counts = (X.T @ X).toarray()
+            w_prime, w_star = np.tril_indices(len(topic), k=-1)
+            star_counts = self.document_counts[topic][w_star]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.log(((co_counts[w_prime, w_star] / num_docs) + EPSILON) / (star_counts / num_docs))
+            values[star_counts == 0] = 0.0
+            scores.append(np.mean(values))
+        return scores
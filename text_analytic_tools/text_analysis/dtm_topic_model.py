@@ -0,0 +1,341 @@
+import os
+import hashlib
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+import scipy.special
+import gensim
+
+from gensim.models.ldaseqmodel import sslm
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.common.textacy_utility as textacy_utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Same constants as gensim's LdaSeqModel.fit_lda_seq
+LDASQE_EM_THRESHOLD = 1e-4
+LOWER_ITER = 10
+ITER_MULT_LOW = 2
+MAX_ITER = 500
+LDA_INFERENCE_CONVERGED = 1e-8
+
+CHECKPOINT_FILENAME = 'dtm_checkpoint.gensim'
+
+# Documents of each time slice, set in worker processes by the pool initializer
+_slices = None
+
+def compute_time_slices(document_index, year_column='year'):
+    '''Returns document order that sorts `document_index` by `year_column`, and number of documents per time slice
+
+    The index need not be sorted. The slices are validated against `count_documents_in_index_by_pivot` of the sorted index.
+    '''
+    document_order = np.argsort(document_index[year_column].values, kind='stable')
+    _, time_slice = np.unique(document_index[year_column].values, return_counts=True)
+
+    expected = textacy_utility.count_documents_in_index_by_pivot(document_index.iloc[document_order], year_column)
+
+    assert list(time_slice) == list(expected), 'time slices do not match document counts per {}'.format(year_column)
+
+    return document_order, [ int(x) for x in time_slice ]
+
+def fit_document(ids, counts, topics, alpha, lda_inference_max_iter):
+    '''Variational inference for one document given slice log topic-word probabilities (vectorized LdaPost.fit_lda_post)
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, float)
+        gamma, phi (words x topics) and document likelihood bound
+    '''
+    num_topics = len(alpha)
+    total = counts.sum()
+
+    if total == 0:
+        return alpha.copy(), np.zeros((0, num_topics)), 0.0
+
+    log_topics = topics[ids]
+    gamma = np.full(num_topics, alpha[0] + float(total) / num_topics)
+    phi = np.full((len(ids), num_topics), 1.0 / num_topics)
+    log_phi = np.zeros((len(ids), num_topics))
+
+    def lhood(gamma, phi, log_phi):
+        gamma_sum = np.sum(gamma)
+        e_log_theta = scipy.special.digamma(gamma) - scipy.special.digamma(gamma_sum)
+        terms = (alpha - gamma) * e_log_theta + scipy.special.gammaln(gamma) - scipy.special.gammaln(alpha)
+        word_terms = np.where(phi > 0, counts[:, None] * phi * (e_log_theta[None, :] + log_topics - log_phi), 0.0)
+        return scipy.special.gammaln(np.sum(alpha)) - scipy.special.gammaln(gamma_sum) + np.sum(terms) + np.sum(word_terms)
+
+    def update(phi):
+        gamma = alpha + np.sum(phi * counts[:, None], axis=0)
+        log_phi = scipy.special.digamma(gamma)[None, :] + log_topics
+        log_phi = log_phi - scipy.special.logsumexp(log_phi, axis=1)[:, None]
+        return gamma, np.exp(log_phi), log_phi
+
+    bound = lhood(gamma, phi, log_phi)
+    iteration, converged = 0, 1.0
+
+    while iteration == 0 or (converged > LDA_INFERENCE_CONVERGED and iteration <= lda_inference_max_iter):
+        iteration += 1
+        bound_old = bound
+        gamma, phi, log_phi = update(phi)
+        bound = lhood(gamma, phi, log_phi)
+        converged = np.fabs((bound_old - bound) / (bound_old * total))
+
+    return gamma, phi, bound
+
+def infer_slice(documents, topics, alphas, lda_inference_max_iter):
+    '''E-step for the documents of a time slice
+
+    Returns
+    -------
+    (float, numpy.ndarray, numpy.ndarray)
+        Likelihood bound, gammas (documents x topics) and sufficient statistics (terms x topics) of the slice
+    '''
+    gammas = np.zeros((len(documents), len(alphas)))
+    sstats = np.zeros((topics.shape[0], len(alphas)))
+    bound = 0.0
+
+    for i, document in enumerate(documents):
+        ids = np.array([ word_id for word_id, _ in document ], dtype=np.int64)
+        counts = np.array([ count for _, count in document ], dtype=np.float64)
+        gammas[i], phi, document_bound = fit_document(ids, counts, topics, alphas, lda_inference_max_iter)
+        sstats[ids] += counts[:, None] * phi
+        bound += document_bound
+
+    return bound, gammas, sstats
+
+def checkpoint_key(corpus, document_order, time_slice, num_topics, alphas, obs_variance, chain_variance):
+    '''Returns sha1 hex digest of corpus content, document order, time slices and model options
+
+    A checkpoint is resumed only if the key is unchanged, i.e. for the same documents (in the same order) and options.
+    '''
+    digest = hashlib.sha1()
+    for document in corpus:
+        digest.update(np.asarray(document, dtype=np.float64).tobytes())
+        digest.update(b'\x1e')
+    for values in [ document_order, time_slice, alphas, [ num_topics, obs_variance, chain_variance ] ]:
+        digest.update(np.asarray(values, dtype=np.float64).tobytes())
+        digest.update(b'\x1d')
+    return digest.hexdigest()
+
+def _init_worker(slices):
+    global _slices
+    _slices = slices
+
+def _infer_slice_task(time, topics, alphas, lda_inference_max_iter):
+    return time, infer_slice(_slices[time], topics, alphas, lda_inference_max_iter)
+
+def _fit_topic_chain_task(k, chain, sstats):
+    lhood = sslm.fit_sslm(chain, sstats)
+    return k, chain, lhood
+
+class DtmTopicModel(gensim.models.LdaSeqModel):
+    '''Dynamic topic model (gensim's LdaSeqModel) hot-started from a multicore LDA, with parallel EM and checkpoints
+
+    The topic chains are initialized from the sufficient statistics of a `LdaMulticore` model (`LdaModel` if
+    `workers` is 1, or `lda_model` if given). In each EM iteration the E-step runs time slices in parallel worker processes (document inference is
+    vectorized per document), and the M-step fits topic chains in parallel. The model state is checkpointed to
+    `checkpoint_folder` after each EM iteration, and training resumes from the checkpoint when restarted with
+    the same corpus, document order and options (see `checkpoint_key`).
+
+    The documents need not be ordered by time: `document_order` (see `compute_time_slices`) sorts the corpus
+    into `time_slice` order, and document topics are returned in the original corpus order.
+    '''
+    def __init__(
+        self, corpus=None, time_slice=None, document_order=None, id2word=None, alphas=0.01, num_topics=10, lda_model=None,
+        obs_variance=0.5, chain_variance=0.005, passes=10, random_state=None, lda_inference_max_iter=25,
+        em_min_iter=6, em_max_iter=20, workers=None, checkpoint_folder=None
+    ):
+        super(DtmTopicModel, self).__init__(
+            corpus=None, time_slice=time_slice, id2word=id2word, alphas=alphas, num_topics=num_topics,
+            obs_variance=obs_variance, chain_variance=chain_variance
+        )
+
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_folder = checkpoint_folder
+        self.em_iteration = 0
+        self.em_bound = 0.0
+        self.em_convergence = LDASQE_EM_THRESHOLD + 1
+        self.lda_inference_max_iter = lda_inference_max_iter
+        self.checkpoint_key = None
+
+        if corpus is None:
+            return
+
+        self.corpus_len = len(corpus)
+        self.document_order = np.arange(0, len(corpus)) if document_order is None else np.asarray(document_order)
+        self.max_doc_len = max(len(document) for document in corpus)
+
+        assert sum(self.time_slice) == self.corpus_len, 'time slices do not add up to corpus length'
+
+        self.checkpoint_key = checkpoint_key(
+            corpus, self.document_order, self.time_slice, self.num_topics, self.alphas, obs_variance, chain_variance
+        )
+
+        if not self._resume_from_checkpoint():
+
+            if lda_model is None:
+                # LdaMulticore always forks a process pool, a single worker trains in-process instead
+                lda_options = dict(workers=max(1, self.workers - 1)) if self.workers > 1 else {}
+                lda_engine = gensim.models.LdaMulticore if self.workers > 1 else gensim.models.LdaModel
+                logger.info('DTM: training %s for hot start...', lda_engine.__name__)
+                lda_model = lda_engine(
+                    corpus, id2word=self.id2word, num_topics=self.num_topics, passes=passes, alpha=self.alphas,
+                    random_state=random_state, dtype=np.float64, **lda_options
+                )
+
+            self.sstats = np.transpose(lda_model.state.sstats)
+            self.init_ldaseq_ss(chain_variance, obs_variance, self.alphas, self.sstats)
+            self._checkpoint()
+
+        sorted_corpus = [ corpus[i] for i in self.document_order ]
+
+        self.fit_lda_seq(sorted_corpus, self.lda_inference_max_iter, em_min_iter, em_max_iter, None)
+
+    @property
+    def checkpoint_filename(self):
+        return os.path.join(self.checkpoint_folder, CHECKPOINT_FILENAME) if self.checkpoint_folder else None
+
+    def _checkpoint(self):
+        if self.checkpoint_filename is None:
+            return
+        os.makedirs(self.checkpoint_folder, exist_ok=True)
+        temp_filename = self.checkpoint_filename + '.tmp'
+        self.save(temp_filename, separately=[])
+        os.replace(temp_filename, self.checkpoint_filename)
+        logger.info('DTM: checkpoint after EM iteration %s stored in %s', self.em_iteration, self.checkpoint_filename)
+
+    def _resume_from_checkpoint(self):
+
+        if self.checkpoint_filename is None or not os.path.isfile(self.checkpoint_filename):
+            return False
+
+        state = DtmTopicModel.load(self.checkpoint_filename)
+
+        if getattr(state, 'checkpoint_key', None) != self.checkpoint_key or state.vocab_len != self.vocab_len:
+            logger.warning('DTM: checkpoint in %s is for another corpus, document order or options, ignored', self.checkpoint_folder)
+            return False
+
+        for attr in [ 'topic_chains', 'alphas', 'sstats', 'em_iteration', 'em_bound', 'em_convergence', 'lda_inference_max_iter' ]:
+            setattr(self, attr, getattr(state, attr))
+
+        self.gammas = getattr(state, 'gammas', None)
+
+        logger.info('DTM: resuming from checkpoint after EM iteration %s', self.em_iteration)
+
+        return True
+
+    def fit_lda_seq(self, corpus, lda_inference_max_iter, em_min_iter, em_max_iter, chunksize):
+        '''Same EM procedure as LdaSeqModel.fit_lda_seq, with parallel E and M steps and a checkpoint after each iteration
+
+        `corpus` must be ordered by time slice, `chunksize` is not used.
+        '''
+        offsets = np.cumsum([ 0 ] + list(self.time_slice))
+        slices = [ corpus[offsets[t]:offsets[t + 1]] for t in range(0, self.num_time_slices) ]
+
+        executor = None
+        if self.workers > 1:
+            # Spawned (not forked) workers, forking is not safe after numba's parallel threads have been started
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker, initargs=(slices,)
+            )
+        else:
+            _init_worker(slices)
+
+        try:
+            bound, convergence = self.em_bound, self.em_convergence
+            lda_inference_max_iter = self.lda_inference_max_iter
+
+            while self.em_iteration < em_min_iter or ((convergence > LDASQE_EM_THRESHOLD) and self.em_iteration <= em_max_iter):
+
+                logger.info("DTM: EM iteration %i, E-step", self.em_iteration)
+
+                old_bound = bound
+
+                bound, self.gammas, topic_suffstats = self._e_step(executor, offsets, lda_inference_max_iter)
+
+                logger.info("DTM: EM iteration %i, M-step", self.em_iteration)
+
+                bound += self._m_step(executor, topic_suffstats)
+
+                if (bound - old_bound) < 0:
+                    if lda_inference_max_iter < LOWER_ITER:
+                        lda_inference_max_iter *= ITER_MULT_LOW
+                    logger.info("Bound went down, increasing iterations to %i", lda_inference_max_iter)
+
+                convergence = np.fabs((bound - old_bound) / old_bound) if old_bound != 0 else 1.0
+
+                if convergence < LDASQE_EM_THRESHOLD:
+                    lda_inference_max_iter = MAX_ITER
+                    logger.info("Starting final iterations, max iter is %i", lda_inference_max_iter)
+                    convergence = 1.0
+
+                logger.info("iteration %i iteration lda seq bound is %f convergence is %f", self.em_iteration, bound, convergence)
+
+                self.em_iteration += 1
+                self.em_bound, self.em_convergence, self.lda_inference_max_iter = bound, convergence, lda_inference_max_iter
+
+                self._checkpoint()
+
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return bound
+
+    def _e_step(self, executor, offsets, lda_inference_max_iter):
+
+        gammas = np.zeros((self.corpus_len, self.num_topics))
+        topic_suffstats = [ np.zeros((self.vocab_len, self.num_time_slices)) for _ in range(0, self.num_topics) ]
+
+        def slice_topics(time):
+            return np.column_stack([ chain.e_log_prob[:, time] for chain in self.topic_chains ])
+
+        if executor is None:
+            results = ( _infer_slice_task(t, slice_topics(t), self.alphas, lda_inference_max_iter) for t in range(0, self.num_time_slices) )
+        else:
+            futures = [
+                executor.submit(_infer_slice_task, t, slice_topics(t), self.alphas, lda_inference_max_iter)
+                    for t in range(0, self.num_time_slices)
+            ]
+            results = ( future.result() for future in concurrent.futures.as_completed(futures) )
+
+        bound = 0.0
+        for time, (slice_bound, slice_gammas, slice_sstats) in results:
+            bound += slice_bound
+            gammas[offsets[time]:offsets[time + 1]] = slice_gammas
+            for k in range(0, self.num_topics):
+                topic_suffstats[k][:, time] = slice_sstats[:, k]
+
+        return bound, gammas, topic_suffstats
+
+    def _m_step(self, executor, topic_suffstats):
+
+        if executor is None:
+            return self.fit_lda_seq_topics(topic_suffstats)
+
+        futures = [
+            executor.submit(_fit_topic_chain_task, k, chain, topic_suffstats[k])
+                for k, chain in enumerate(self.topic_chains)
+        ]
+
+        lhood = 0.0
+        for future in concurrent.futures.as_completed(futures):
+            k, chain, lhood_term = future.result()
+            self.topic_chains[k] = chain
+            lhood += lhood_term
+
+        return lhood
+
+    def get_topics(self, time=None):
+        '''Returns topic-word distributions at `time` slice, or averaged over all time slices if time is None'''
+        probabilities = np.array([ np.exp(chain.e_log_prob) for chain in self.topic_chains ])
+        probabilities = probabilities / probabilities.sum(axis=1)[:, None, :]
+        return probabilities.mean(axis=2) if time is None else probabilities[:, :, time]
+
+    def get_document_topic_matrix(self):
+        '''Returns normalized document-topic weights (theta) in original corpus order'''
+        theta = np.zeros_like(self.gammas)
+        theta[self.document_order] = self.gammas / self.gammas.sum(axis=1)[:, None]
+        return theta
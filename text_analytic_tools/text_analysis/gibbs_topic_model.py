@@ -0,0 +1,461 @@
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.special
+
+from gensim import utils, matutils
+from gensim.models import basemodel
+
+import text_analytic_tools.utility as utility
+
+try:
+    import numba
+    njit, prange = numba.njit, numba.prange
+except ImportError:
+    # Same results without numba, but orders of magnitude slower
+    numba = None
+    prange = range
+    def njit(*args, **kwargs):
+        return args[0] if len(args) == 1 and callable(args[0]) else (lambda f: f)
+
+logger = utility.getLogger("text_analytic_tools")
+
+def corpus2tokens(corpus):
+    """Returns BoW corpus as a flat token id array and document offsets (weights must be counts, e.g. not TF-IDF)"""
+    documents = []
+    for document in corpus:
+        ids, counts = (np.array(x) for x in zip(*document)) if len(document) > 0 else (np.zeros(0), np.zeros(0))
+        assert np.all(counts == np.floor(counts)), 'Gibbs LDA requires integer term counts (not weights such as TF-IDF)'
+        documents.append(np.repeat(ids.astype(np.int32), counts.astype(np.int64)))
+    offsets = np.cumsum([0] + [ len(x) for x in documents ]).astype(np.int64)
+    token_ids = np.concatenate(documents) if len(documents) > 0 else np.zeros(0, dtype=np.int32)
+    return token_ids, offsets
+
+@njit(cache=True)
+def _remove_topic(topics, n, topic):
+    # Swap-remove `topic` from the first n elements of `topics`
+    for j in range(0, n):
+        if topics[j] == topic:
+            topics[j] = topics[n - 1]
+            return n - 1
+    return n
+
+@njit(cache=True)
+def _index_word_topics(nwt):
+    """Returns topics with non-zero count for each word as CSR-style (offsets, topics), topics of word w are in
+    topics[offsets[w]:offsets[w + 1]]"""
+    n_words, n_topics = nwt.shape
+    offsets = np.zeros(n_words + 1, dtype=np.int64)
+    for w in range(0, n_words):
+        offsets[w + 1] = offsets[w]
+        for t in range(0, n_topics):
+            if nwt[w, t] > 0:
+                offsets[w + 1] += 1
+    topics = np.empty(offsets[n_words], dtype=np.int32)
+    for w in range(0, n_words):
+        k = offsets[w]
+        for t in range(0, n_topics):
+            if nwt[w, t] > 0:
+                topics[k] = t
+                k += 1
+    return offsets, topics
+
+def delta_slots(token_ids, offsets, partitions, n_terms, n_topics):
+    """Returns start positions (partitions x terms) and total size of the word-topic count delta slots of all partitions
+
+    During a sweep, the counts of word w that partition p's tokens moved between topics are kept in slots starting
+    at starts[p, w]. At most min(n_topics, 2 * occurrences of w in p) topics can have a non-zero delta (the topics
+    of w's tokens before the sweep, and the topics sampled in it), so the slots take at most two entries per token.
+    """
+    partition_ids = np.repeat(np.arange(0, len(partitions) - 1), np.diff(offsets[partitions]))
+    counts = np.bincount(partition_ids * n_terms + token_ids, minlength=(len(partitions) - 1) * n_terms)
+    sizes = np.minimum(2 * counts, n_topics)
+    starts = np.concatenate([ [ 0 ], np.cumsum(sizes) ])
+    return starts[:-1].reshape(len(partitions) - 1, n_terms), int(starts[-1])
+
+@njit(cache=True)
+def _add_delta(slot_topics, slot_counts, start, nnz, topic, value):
+    # Adds value to delta of topic in slots start..start+nnz-1, returns new number of non-zero slots
+    for j in range(start, start + nnz):
+        if slot_topics[j] == topic:
+            slot_counts[j] += value
+            if slot_counts[j] == 0:
+                slot_topics[j], slot_counts[j] = slot_topics[start + nnz - 1], slot_counts[start + nnz - 1]
+                return nnz - 1
+            return nnz
+    slot_topics[start + nnz], slot_counts[start + nnz] = topic, value
+    return nnz + 1
+
+@njit(cache=True)
+def _sample_documents(
+    token_ids, offsets, doc_start, doc_end, z, nwt, word_offsets, word_topics, nt,
+    slot_starts, slot_nnz, slot_topics, slot_counts, alpha, beta, beta_sum, seed
+):
+    """One collapsed Gibbs sweep over documents doc_start..doc_end-1 (updates assignments `z` and topic counts `nt`)
+
+    The word-topic counts `nwt` and their index (`word_offsets`, `word_topics`, see `_index_word_topics`) are shared
+    by all partitions and not changed during the sweep. The sweep's own changes are kept as sparse deltas in the
+    partition's slots (see `delta_slots`), i.e. the count of topic t for word w is nwt[w, t] + delta[w, t].
+
+    Uses SparseLDA's bucket decomposition of the sampling distribution, which makes the cost per token proportional
+    to the number of topics present in the token's document and word, rather than to the number of topics:
+
+        p(t) ~ alpha[t] * beta / (beta_sum + nt[t])                  smoothing bucket (s), all topics, rarely sampled
+             + ndt[t] * beta / (beta_sum + nt[t])                    document bucket (r), topics in document
+             + (alpha[t] + ndt[t]) * nwt[w, t] / (beta_sum + nt[t])  word bucket (q), topics assigned to word
+    """
+    np.random.seed(seed)
+
+    n_topics = nwt.shape[1]
+
+    slot_nnz[:] = 0
+
+    inv = np.empty(n_topics, dtype=np.float64)
+    coef = np.empty(n_topics, dtype=np.float64)
+    for t in range(0, n_topics):
+        inv[t] = 1.0 / (beta_sum + nt[t])
+        coef[t] = alpha[t] * inv[t]
+
+    ndt = np.zeros(n_topics, dtype=np.int32)
+    doc_topics = np.empty(n_topics, dtype=np.int32)
+
+    # Topics (and their counts) of the current token's word, `marks` flags topics already listed for token i
+    q_topics = np.empty(n_topics, dtype=np.int32)
+    q_counts = np.zeros(n_topics, dtype=np.int64)
+    q_values = np.empty(n_topics, dtype=np.float64)
+    marks = np.full(n_topics, -1, dtype=np.int64)
+
+    for d in range(doc_start, doc_end):
+
+        start, end = offsets[d], offsets[d + 1]
+
+        s_sum = 0.0
+        for t in range(0, n_topics):
+            s_sum += alpha[t] * beta * inv[t]
+
+        doc_nnz = 0
+        for i in range(start, end):
+            t = z[i]
+            if ndt[t] == 0:
+                doc_topics[doc_nnz] = t
+                doc_nnz += 1
+            ndt[t] += 1
+
+        r_sum = 0.0
+        for j in range(0, doc_nnz):
+            t = doc_topics[j]
+            r_sum += ndt[t] * beta * inv[t]
+            coef[t] = (alpha[t] + ndt[t]) * inv[t]
+
+        for i in range(start, end):
+
+            w, t = token_ids[i], z[i]
+            slot_start = slot_starts[w]
+
+            # Remove token from counts
+            s_sum -= alpha[t] * beta * inv[t]
+            r_sum -= ndt[t] * beta * inv[t]
+            ndt[t] -= 1
+            slot_nnz[w] = _add_delta(slot_topics, slot_counts, slot_start, slot_nnz[w], t, -1)
+            nt[t] -= 1
+            inv[t] = 1.0 / (beta_sum + nt[t])
+            s_sum += alpha[t] * beta * inv[t]
+            r_sum += ndt[t] * beta * inv[t]
+            coef[t] = (alpha[t] + ndt[t]) * inv[t]
+
+            if ndt[t] == 0:
+                doc_nnz = _remove_topic(doc_topics, doc_nnz, t)
+
+            # Counts of word's topics, the shared counts plus this sweep's deltas
+            word_nnz = 0
+            for j in range(word_offsets[w], word_offsets[w + 1]):
+                t = word_topics[j]
+                q_topics[word_nnz], q_counts[t], marks[t] = t, nwt[w, t], i
+                word_nnz += 1
+            for j in range(slot_start, slot_start + slot_nnz[w]):
+                t = slot_topics[j]
+                if marks[t] != i:
+                    q_topics[word_nnz], q_counts[t], marks[t] = t, 0, i
+                    word_nnz += 1
+                q_counts[t] += slot_counts[j]
+
+            q_sum = 0.0
+            for j in range(0, word_nnz):
+                q_values[j] = coef[q_topics[j]] * q_counts[q_topics[j]]
+                q_sum += q_values[j]
+
+            u = np.random.random() * (s_sum + r_sum + q_sum)
+
+            if u < q_sum:
+                j = 0
+                while j < word_nnz - 1 and u >= q_values[j]:
+                    u -= q_values[j]
+                    j += 1
+                t = q_topics[j]
+            elif u < q_sum + r_sum and doc_nnz > 0:
+                u -= q_sum
+                j = 0
+                while j < doc_nnz - 1 and u >= ndt[doc_topics[j]] * beta * inv[doc_topics[j]]:
+                    u -= ndt[doc_topics[j]] * beta * inv[doc_topics[j]]
+                    j += 1
+                t = doc_topics[j]
+            else:
+                u = max(u - q_sum - r_sum, 0.0)
+                t = 0
+                while t < n_topics - 1 and u >= alpha[t] * beta * inv[t]:
+                    u -= alpha[t] * beta * inv[t]
+                    t += 1
+
+            # Add token with new topic to counts
+            s_sum -= alpha[t] * beta * inv[t]
+            r_sum -= ndt[t] * beta * inv[t]
+            ndt[t] += 1
+            slot_nnz[w] = _add_delta(slot_topics, slot_counts, slot_start, slot_nnz[w], t, 1)
+            nt[t] += 1
+            inv[t] = 1.0 / (beta_sum + nt[t])
+            s_sum += alpha[t] * beta * inv[t]
+            r_sum += ndt[t] * beta * inv[t]
+            coef[t] = (alpha[t] + ndt[t]) * inv[t]
+
+            if ndt[t] == 1:
+                doc_topics[doc_nnz] = t
+                doc_nnz += 1
+
+            z[i] = t
+
+        for j in range(0, doc_nnz):
+            t = doc_topics[j]
+            ndt[t] = 0
+            coef[t] = alpha[t] * inv[t]
+
+@njit(parallel=True, cache=True)
+def _sample_partitions(
+    token_ids, offsets, partitions, z, nwt, word_offsets, word_topics, nt, local_nt,
+    slot_starts, slot_nnz, slot_topics, slot_counts, alpha, beta, beta_sum, seed
+):
+    """Samples document partitions in parallel threads against the shared word-topic counts (AD-LDA)
+
+    Each partition keeps its own topic counts (`local_nt`) and sparse word-topic deltas (rows of `slot_starts` and
+    `slot_nnz`, disjoint ranges of `slot_topics` and `slot_counts`), all allocated once by the caller.
+    """
+    for p in prange(len(partitions) - 1):
+        local_nt[p][:] = nt
+        _sample_documents(
+            token_ids, offsets, partitions[p], partitions[p + 1], z, nwt, word_offsets, word_topics, local_nt[p],
+            slot_starts[p], slot_nnz[p], slot_topics, slot_counts, alpha, beta, beta_sum, seed + p
+        )
+
+def optimize_alpha(alpha, topic_ids, counts, doc_lengths, iterations=5):
+    """Minka's fixed point update of asymmetric Dirichlet document-topic prior from non-zero document-topic counts"""
+    for _ in range(0, iterations):
+        alpha_sum = alpha.sum()
+        denominator = np.sum(scipy.special.digamma(doc_lengths + alpha_sum) - scipy.special.digamma(alpha_sum))
+        numerator = np.bincount(
+            topic_ids,
+            weights=scipy.special.digamma(counts + alpha[topic_ids]) - scipy.special.digamma(alpha[topic_ids]),
+            minlength=len(alpha)
+        )
+        alpha = np.maximum(alpha * numerator / denominator, 1e-10)
+    return alpha
+
+def optimize_beta(beta, nwt, nt, iterations=5):
+    """Minka's fixed point update of symmetric Dirichlet topic-word prior"""
+    n_words = nwt.shape[0]
+    counts = nwt[nwt > 0]
+    for _ in range(0, iterations):
+        numerator = np.sum(scipy.special.digamma(counts + beta) - scipy.special.digamma(beta))
+        denominator = n_words * np.sum(scipy.special.digamma(nt + n_words * beta) - scipy.special.digamma(n_words * beta))
+        beta = max(beta * numerator / denominator, 1e-10)
+    return beta
+
+class GibbsTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
+    """LDA trained in-process with a multithreaded sparse collapsed Gibbs sampler
+
+    Same model and hyperparameter optimization as MALLET's ParallelTopicModel, without serializing the corpus to
+    and parsing results from files. Documents are split into `workers` partitions sampled in parallel threads,
+    and counts are synchronized after each iteration. Every `optimize_interval` iterations after `optimize_burn_in`,
+    alpha (asymmetric) and beta (symmetric) are re-estimated with Minka's fixed point iteration.
+
+    Parameters
+    ----------
+    corpus : iterable of list of (int, float)
+        BoW corpus
+    alpha : float
+        Sum of (initial) document-topic prior, as for MALLET
+    """
+    def __init__(
+        self, corpus=None, id2word=None, num_topics=100, alpha=50.0, beta=0.01, iterations=1000,
+        optimize_interval=10, optimize_burn_in=200, workers=None, random_seed=0, log_every=50
+    ):
+        self.id2word = id2word
+        self.num_terms = 1 + max(id2word.keys()) if id2word is not None and len(id2word) > 0 else 0
+        self.num_topics = num_topics
+        self.alpha = np.full(num_topics, alpha / num_topics)
+        self.beta = beta
+        self.iterations = iterations
+        self.optimize_interval = optimize_interval
+        self.optimize_burn_in = optimize_burn_in
+        self.workers = workers or os.cpu_count() or 1
+        self.random_seed = random_seed
+        self.log_every = log_every
+
+        self.word_topics = None
+        self.doc_topic_counts = None
+
+        if corpus is not None:
+            self.train(corpus)
+
+    def train(self, corpus):
+
+        token_ids, offsets = corpus2tokens(corpus)
+
+        if self.num_terms == 0:
+            self.num_terms = int(token_ids.max()) + 1 if len(token_ids) > 0 else 0
+
+        z, nwt = self._sample(token_ids, offsets, None, self.iterations, optimize=True)
+
+        document_ids, topic_ids, counts = self._count_doc_topics(offsets, z)
+
+        self.word_topics = nwt.T.astype(np.float64)
+        self.doc_topic_counts = sp.csr_matrix((counts, (document_ids, topic_ids)), shape=(len(offsets) - 1, self.num_topics))
+        self.wordtopics = self.word_topics
+
+    def update(self, corpus, id2word=None, iterations=None):
+        """Adds new documents in `corpus` to the trained model
+
+        Topics of the new tokens are sampled against the counts of the trained documents (which are kept fixed),
+        and the new counts are then added to the model. Hyperparameters are not re-estimated. Terms may be new
+        (ids beyond the trained vocabulary, e.g. of an extended dictionary `id2word`).
+
+        Parameters
+        ----------
+        iterations : int, optional
+            Number of sampling iterations, default a tenth of the training iterations
+        """
+        token_ids, offsets = corpus2tokens(corpus)
+
+        if id2word is not None:
+            self.id2word = id2word
+
+        num_terms = max(
+            self.num_terms,
+            1 + max(self.id2word.keys()) if self.id2word is not None and len(self.id2word) > 0 else 0,
+            int(token_ids.max()) + 1 if len(token_ids) > 0 else 0
+        )
+
+        base = np.zeros((num_terms, self.num_topics), dtype=np.int32)
+        base[:self.num_terms] = np.rint(self.word_topics.T).astype(np.int32)
+        self.num_terms = num_terms
+
+        z, nwt = self._sample(token_ids, offsets, base, iterations or max(self.iterations // 10, 1), optimize=False)
+
+        document_ids, topic_ids, counts = self._count_doc_topics(offsets, z)
+
+        self.word_topics = nwt.T.astype(np.float64)
+        self.doc_topic_counts = sp.vstack([
+            self.doc_topic_counts,
+            sp.csr_matrix((counts, (document_ids, topic_ids)), shape=(len(offsets) - 1, self.num_topics))
+        ], format='csr')
+        self.wordtopics = self.word_topics
+
+    def _sample(self, token_ids, offsets, base, iterations, optimize):
+        """Samples topic assignments of tokens, returns assignments and word-topic counts
+
+        `base` (terms x topics) are fixed counts of other documents that are added to the counts of the sampled tokens.
+        """
+        n_documents = len(offsets) - 1
+        n_partitions = max(1, min(self.workers, n_documents))
+        partitions = np.unique(np.searchsorted(offsets, np.linspace(0, len(token_ids), n_partitions + 1), side='left'))
+        partitions[0], partitions[-1] = 0, n_documents
+
+        if numba is not None:
+            numba.set_num_threads(min(n_partitions, numba.config.NUMBA_NUM_THREADS))
+
+        random_state = np.random.RandomState(self.random_seed)
+        z = random_state.randint(0, self.num_topics, size=len(token_ids)).astype(np.int32)
+
+        nwt, nt = self._count_word_topics(token_ids, z, base)
+
+        # Buffers are allocated once and reused in each iteration. Partitions share the word-topic counts and their
+        # index, which are rebuilt when the partitions' changes are merged, and keep their own (sparse) changes.
+        n_buffers = len(partitions) - 1
+        slot_starts, n_slots = delta_slots(token_ids, offsets, partitions, self.num_terms, self.num_topics)
+        slot_nnz = np.zeros((n_buffers, self.num_terms), dtype=np.int32)
+        slot_topics = np.empty(n_slots, dtype=np.int32)
+        slot_counts = np.empty(n_slots, dtype=np.int32)
+        local_nt = np.empty((n_buffers, self.num_topics), dtype=np.int32)
+
+        logger.info('Gibbs LDA: %s documents, %s tokens, %s topics, %s threads', n_documents, len(token_ids), self.num_topics, len(partitions) - 1)
+
+        start_time = time.time()
+
+        for iteration in range(1, iterations + 1):
+
+            seed = self.random_seed + iteration * len(partitions)
+
+            word_offsets, word_topics = _index_word_topics(nwt)
+
+            if len(partitions) == 2:
+                local_nt[0][:] = nt
+                _sample_documents(
+                    token_ids, offsets, 0, n_documents, z, nwt, word_offsets, word_topics, local_nt[0],
+                    slot_starts[0], slot_nnz[0], slot_topics, slot_counts, self.alpha, self.beta, self.beta * self.num_terms, seed
+                )
+            else:
+                _sample_partitions(
+                    token_ids, offsets, partitions, z, nwt, word_offsets, word_topics, nt, local_nt,
+                    slot_starts, slot_nnz, slot_topics, slot_counts, self.alpha, self.beta, self.beta * self.num_terms, seed
+                )
+
+            # Merge step, counts are recomputed from the new assignments
+            nwt, nt = self._count_word_topics(token_ids, z, base)
+
+            if optimize and self.optimize_interval and iteration > self.optimize_burn_in and iteration % self.optimize_interval == 0:
+                _, topic_ids, counts = self._count_doc_topics(offsets, z)
+                self.alpha = optimize_alpha(self.alpha, topic_ids, counts, np.diff(offsets))
+                self.beta = optimize_beta(self.beta, nwt, nt)
+
+            if self.log_every and iteration % self.log_every == 0:
+                logger.info('Gibbs LDA: iteration %s of %s (%.1f s)', iteration, iterations, time.time() - start_time)
+
+        return z, nwt
+
+    def _count_word_topics(self, token_ids, z, base=None):
+        nwt = np.bincount(
+            token_ids.astype(np.int64) * self.num_topics + z, minlength=self.num_terms * self.num_topics
+        ).astype(np.int32).reshape(self.num_terms, self.num_topics)
+        if base is not None:
+            nwt += base
+        return nwt, nwt.sum(axis=0).astype(np.int32)
+
+    def _count_doc_topics(self, offsets, z):
+        document_ids = np.repeat(np.arange(0, len(offsets) - 1), np.diff(offsets))
+        keys, counts = np.unique(document_ids * self.num_topics + z, return_counts=True)
+        return keys // self.num_topics, keys % self.num_topics, counts
+
+    def get_topics(self):
+        """Returns topic-word distributions (phi), shape `num_topics` x `num_terms`"""
+        topics = self.word_topics + self.beta
+        return topics / topics.sum(axis=1)[:, None]
+
+    def get_document_topic_matrix(self):
+        """Returns document-topic distributions (theta) of training documents, shape n_documents x `num_topics`"""
+        counts = self.doc_topic_counts.toarray() + self.alpha
+        return counts / counts.sum(axis=1)[:, None]
+
+    def show_topics(self, num_topics=10, num_words=10, log=False, formatted=True):
+        if num_topics < 0 or num_topics >= self.num_topics:
+            num_topics = self.num_topics
+        shown = []
+        for i in range(0, num_topics):
+            topic = self.print_topic(i, topn=num_words) if formatted else self.show_topic(i, topn=num_words)
+            shown.append((i, topic))
+            if log:
+                logger.info("topic #%i (%.3f): %s", i, self.alpha[i], topic)
+        return shown
+
+    def show_topic(self, topicid, topn=10):
+        topic = self.get_topics()[topicid]
+        return [ (self.id2word[idx], topic[idx]) for idx in matutils.argsort(topic, topn, reverse=True) ]
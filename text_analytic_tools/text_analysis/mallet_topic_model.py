@@ -2,8 +2,12 @@ import os
 import inspect
 import logging
 
+import numpy
+
 from gensim import models
-from gensim.utils import check_output
+from gensim.utils import check_output, revdict
+
+from . import topic_model_output
 
 logging.basicConfig(format="%(asctime)s : %(levelname)s : %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,7 +18,10 @@ def filter_fn_args(f, args):
 
 class MalletTopicModel(models.wrappers.LdaMallet):
 
-    def __init__(self, corpus, id2word, default_mallet_home, **args):
+    def __init__(self, corpus, id2word, default_mallet_home, output_chunksize=None, **args):
+
+        # Lines per chunk when reading doc-topics output (None reads file in one go)
+        self.output_chunksize = output_chunksize
 
         args = filter_fn_args(super(MalletTopicModel, self).__init__, args)
 
@@ -52,3 +59,16 @@ class MalletTopicModel(models.wrappers.LdaMallet):
         check_output(args=cmd, shell=True)
         self.word_topics = self.load_word_topics()
         self.wordtopics = self.word_topics
+
+    def load_word_topics(self):
+        """Loads topic-word counts (and optimized alpha) from the state file in bulk (instead of line by line)"""
+        logger.info("loading assigned topics from %s", self.fstate())
+        word2id = self.id2word.token2id if hasattr(self.id2word, 'token2id') else revdict(self.id2word)
+        word_topics, self.alpha, _ = topic_model_output.read_mallet_state(self.fstate(), word2id, self.num_topics)
+        if word_topics.shape[1] < self.num_terms:
+            word_topics = numpy.pad(word_topics, ((0, 0), (0, self.num_terms - word_topics.shape[1])), mode='constant')
+        return word_topics
+
+    def get_document_topic_matrix(self):
+        """Returns document-topic weights (theta) of training documents as CSR matrix, read from doc-topics file in bulk"""
+        return topic_model_output.read_mallet_doctopics(self.fdoctopics(), self.num_topics, chunksize=self.output_chunksize)
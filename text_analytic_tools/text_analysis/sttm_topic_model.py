@@ -31,13 +31,16 @@ import numpy
 import scipy
 import io
 
-from smart_open import smart_open
+from smart_open import open as smart_open
 
 from gensim import utils, matutils
 from gensim.models import basemodel
 from gensim.models.ldamodel import LdaModel
 from gensim.utils import check_output, revdict
 
+from . import topic_model_output
+from . import topic_model_inference
+
 logger = logging.getLogger(__name__)
 
 AVALIABLE_MODELS = "LDA BTM PTM SATM DMM WATM".split()
@@ -58,7 +61,8 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
                  prefix='results/',
                  name='model',
                  twords=20,
-                 sstep=0
+                 sstep=0,
+                 output_chunksize=None
                 ):
         """
 
@@ -88,6 +92,8 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
             Number of the most probable topical words.
         sstep : int, optional
             Step to save the sampling outputs.
+        output_chunksize : int, optional
+            Lines per chunk when reading document-topic output (default read file in one go).
 
         """
         self.avaliable_models = AVALIABLE_MODELS
@@ -122,6 +128,7 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
         self.twords = twords
         self.iterations = iterations
         self.sstep = sstep
+        self.output_chunksize = output_chunksize
 
         if corpus is not None:
             self.train(corpus)
@@ -261,7 +268,30 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
         self.wordtopics = self.word_topics
 
     def __getitem__(self, bow, iterations=100):
-        raise ValueError('infer-topics for new, unseen documents not implemented (or even possible?)')
+        """Get topic distribution for new, unseen document(s), folded in against the trained topic-word distributions.
+
+        Parameters
+        ----------
+        bow : {list of (int, int), iterable of list of (int, int)}
+            Document (or corpus) in BoW format.
+        iterations : int, optional
+            Maximum number of fold-in iterations.
+
+        Returns
+        -------
+        {list of (int, float), list of list of (int, float)}
+            Topic distribution of document (or of each document in corpus).
+
+        """
+        is_corpus, corpus = utils.is_corpus(bow)
+        if not is_corpus:
+            corpus = [bow]
+
+        doc_term_matrix = matutils.corpus2csc(corpus, num_terms=self.num_terms).T.tocsr()
+        theta = topic_model_inference.fold_in(doc_term_matrix, self.get_topics().T, numpy.asarray(self.alpha), iterations)
+
+        result = [list(enumerate(row)) for row in theta]
+        return result if is_corpus else result[0]
 
     def load_word_topics(self):
         """Load words X topics matrix from :meth:`gensim.models.wrappers.ldamallet.LdaMallet.fstate` file.
@@ -278,11 +308,18 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
         #    text = f.read().replace(' \n', '\n')
         #word_topics = np.loadtxt(io.StringIO(text), delimiter=' ', dtype=numpy.float64)
 
-        word_topics = numpy.loadtxt(self.ftopickeys(), delimiter=' ', usecols=range(0,self.num_terms), dtype=numpy.float64)
+        return topic_model_output.read_sttm_phi(self.ftopickeys(), self.num_topics, self.num_terms)
 
-        assert word_topics.shape == (self.num_topics, self.num_terms)
+    def get_document_topic_matrix(self):
+        """Load document topics from :meth:`fdoctopics` file as CSR matrix, shape n_documents x `num_topics`.
 
-        return word_topics
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Document-topic weights (values below 1e-6 removed, rows renormalized).
+
+        """
+        return topic_model_output.read_sttm_theta(self.fdoctopics(), self.num_topics, chunksize=self.output_chunksize)
 
     def load_document_topics(self):
         """Load document topics from :meth:`gensim.models.wrappers.ldamallet.LdaMallet.fdoctopics` file.
@@ -399,15 +436,8 @@ class STTMTopicModel(utils.SaveLoad, basemodel.BaseTopicModel):
             LDA vectors for document.
 
         """
-        doc_topics = numpy.loadtxt(fname, delimiter=' ', usecols=range(0,self.num_topics), dtype=numpy.float64)
-        doc_topics[doc_topics < eps] = 0
-        m = scipy.sparse.coo_matrix(doc_topics)
+        m = topic_model_output.read_sttm_theta(fname, self.num_topics, eps=eps, renorm=renorm, chunksize=self.output_chunksize)
 
         for i in range(0, m.shape[0]):
-            row = m.getrow(i)
-            values = list(zip(row.indices, row.data))
-            if renorm:
-                total_weight = sum([w for _, w in values])
-                if total_weight != 0:
-                    values = [ (i, w / total_weight) for (i, w) in values]
-            yield values
\ No newline at end of file
+            start, end = m.indptr[i], m.indptr[i + 1]
+            yield list(zip(m.indices[start:end].tolist(), m.data[start:end].tolist()))
\ No newline at end of file
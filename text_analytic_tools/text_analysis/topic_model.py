@@ -1,5 +1,6 @@
 import types
 import textacy
+import numpy as np
 import pandas as pd
 import gensim
 import os
@@ -8,9 +9,17 @@ import pickle
 import text_analytic_tools.utility as utility
 import text_analytic_tools.text_analysis.topic_model_utility as topic_model_utility
 import text_analytic_tools.common.textacy_utility as textacy_utility
+import text_analytic_tools.common.phrase_detector as phrase_detector
 
 from . import mallet_topic_model
 from . import sttm_topic_model
+from . import gibbs_topic_model
+from . import dtm_topic_model
+from . import topic_model_corpus
+from . import coherence
+from . import topic_model_store
+from . import topic_model_aggregate
+from . import topic_model_update
 
 logger = utility.getLogger("text_analytic_tools")
 
@@ -19,17 +28,22 @@ TEMP_PATH = './tmp/'
 # OBS OBS! https://scikit-learn.org/stable/auto_examples/applications/plot_topics_extraction_with_nmf_lda.html
 DEFAULT_VECTORIZE_PARAMS = dict(tf_type='linear', apply_idf=False, idf_type='smooth', norm='l2', min_df=1, max_df=0.95)
 
-# FIXME: Bug somewhere...
-def n_gram_detector(doc_iter, n_gram_size=2, min_count=5, threshold=100):
+# Fraction of documents held out for perplexity evaluation, per gensim algorithm
+DEFAULT_HOLDOUT = { 'LDA-MULTICORE': 0.1 }
 
-    for n_span in range(2, n_gram_size+1):
-        print('Applying {}_gram detector'.format(n_span))
-        n_grams = gensim.models.Phrases(doc_iter(), min_count=min_count, threshold=threshold)
-        ngram_modifier = gensim.models.phrases.Phraser(n_grams)
-        ngram_doc_iter = lambda: ( ngram_modifier[doc] for doc in doc_iter() )
-        doc_iter = ngram_doc_iter
+# Gensim algorithms that can be trained on a subset of the documents (i.e. infer topics of held-out documents).
+# Other engines (e.g. DTM time slices, MALLET/STTM/Gibbs document topics) must be trained on the full corpus.
+HOLDOUT_ALGORITHMS = [ 'LDA', 'LDA-MULTICORE' ]
 
-    return doc_iter
+def n_gram_detector(doc_iter, n_gram_size=2, min_count=5, threshold=100, phrases_folder=None, **args):
+    '''Returns a function that returns a new iterator of the documents in `doc_iter()` with n-gram phrases joined
+
+    Phrase models are learned once (or loaded from `phrases_folder`), see `phrase_detector.PhraseDetector`.
+    '''
+    detector = phrase_detector.PhraseDetector.load_or_learn(
+        phrases_folder, doc_iter, n_gram_size=n_gram_size, min_count=min_count, threshold=threshold, **args
+    )
+    return lambda: detector.transform(doc_iter())
 
 default_options = {
     'LSI': {
@@ -76,7 +90,6 @@ def setup_gensim_algorithms(algorithm, document_index, bow_corpus, id2word, tm_a
                 'decay': 0.1, # 0.5
 
                 'chunksize': 10,
-                'per_word_topics': True,
                 'random_state': 100
 
                 #'offset': 1.0,
@@ -88,6 +101,28 @@ def setup_gensim_algorithms(algorithm, document_index, bow_corpus, id2word, tm_a
             }
         }
 
+    if algorithm == 'LDA-MULTICORE':
+        # Each update processes chunksize * workers documents, aim for at least ~10 updates per pass
+        workers = tm_args.get('workers', max((os.cpu_count() or 2) - 1, 1))
+        chunksize = tm_args.get('chunksize', min(max(len(bow_corpus) // (workers * 10), 100), 2000))
+        return {
+            'engine': gensim.models.LdaMulticore,
+            'options': {
+                'corpus': bow_corpus,
+                'num_topics':  tm_args.get('n_topics', 20),
+                'id2word':  id2word,
+                'workers': workers,
+                'iterations': tm_args.get('max_iter', 1000),
+                'passes': tm_args.get('passes', 40),
+                'chunksize': chunksize,
+                'eval_every': None,     # perplexity is computed once, on held-out documents
+                'alpha': 'symmetric',   # 'auto' is not supported by LdaMulticore
+                'eta': 'auto',
+                'decay': 0.5,
+                'random_state': 100
+            }
+        }
+
     if algorithm =='HDP':
         return {
             'engine': gensim.models.HdpModel,
@@ -118,6 +153,25 @@ def setup_gensim_algorithms(algorithm, document_index, bow_corpus, id2word, tm_a
             }
         }
 
+    if algorithm == 'DTM-HOT':
+        # Document index need not be sorted by year, the model orders the corpus into time slices
+        document_order, time_slice = dtm_topic_model.compute_time_slices(document_index, year_column)
+        return {
+            'engine': dtm_topic_model.DtmTopicModel,
+            'options': {
+                'corpus': bow_corpus,
+                'id2word':  id2word,
+                'num_topics':  tm_args.get('n_topics', 20),
+                'time_slice': time_slice,
+                'document_order': document_order,
+                'passes': tm_args.get('passes', 10),
+                'em_max_iter': tm_args.get('max_iter', 20),
+                'workers': tm_args.get('workers', None),
+                'checkpoint_folder': tm_args.get('checkpoint_folder', None),
+                'random_state': tm_args.get('random_state', 100)
+            }
+        }
+
     if algorithm == 'MALLET-LDA':
         return {
             'engine': mallet_topic_model.MalletTopicModel,
@@ -130,9 +184,27 @@ def setup_gensim_algorithms(algorithm, document_index, bow_corpus, id2word, tm_a
                 'iterations': tm_args.get('max_iter', 2000),
                 'passes': tm_args.get('passes', 20),
 
-                'prefix': TEMP_PATH,
+                'prefix': tm_args.get('prefix', TEMP_PATH),
                 'workers': 4,
                 'optimize_interval': 10,
+                'output_chunksize': tm_args.get('output_chunksize', None),
+            }
+        }
+
+    if algorithm == 'GIBBS-LDA':
+        return {
+            'engine': gibbs_topic_model.GibbsTopicModel,
+            'options': {
+                'corpus': bow_corpus,
+                'id2word': id2word,
+                'num_topics': tm_args.get('n_topics', 100),
+                'iterations': tm_args.get('max_iter', 2000),
+                'alpha': tm_args.get('alpha', 50.0),
+                'beta': tm_args.get('beta', 0.01),
+                'optimize_interval': tm_args.get('optimize_interval', 10),
+                'optimize_burn_in': tm_args.get('optimize_burn_in', 200),
+                'workers': tm_args.get('workers', None),
+                'random_seed': tm_args.get('random_state', 0)
             }
         }
 
@@ -147,20 +219,67 @@ def setup_gensim_algorithms(algorithm, document_index, bow_corpus, id2word, tm_a
                 'id2word': id2word,
                 'num_topics': tm_args.get('n_topics', 20),
                 'iterations': tm_args.get('max_iter', 2000),
-                'prefix': TEMP_PATH,
-                'name': '{}_model'.format(sttm)
+                'prefix': tm_args.get('prefix', TEMP_PATH),
+                'name': '{}_model'.format(sttm),
+                'output_chunksize': tm_args.get('output_chunksize', None)
                 #'vectors', 'alpha'=0.1, 'beta'=0.01, 'twords'=20,sstep=0
             }
         }
 
     assert False, 'Unknown model!'
 
+def setup_sklearn_algorithms(algorithm, doc_term_matrix, tm_args):
+    '''Returns textacy TopicModel arguments for scikit-learn `algorithm` (lda, nmf or lsa)
+
+    LDA runs its E-step in `n_jobs` processes (default all cores), with minibatches large enough to give each
+    process some work. NMF and LSA have no n_jobs, their speed relies on the (multithreaded) BLAS library.
+    '''
+    random_state = tm_args.get('random_state', 1)
+
+    if algorithm == 'lda':
+        n_jobs = tm_args.get('n_jobs', None) or os.cpu_count() or 1
+        return {
+            'n_topics': tm_args.get('n_topics', 20),
+            'max_iter': tm_args.get('max_iter', 10),
+            'learning_method': tm_args.get('learning_method', 'online'),
+            'batch_size': tm_args.get('batch_size', max(128, min(64 * n_jobs, doc_term_matrix.shape[0] // 10))),
+            'n_jobs': n_jobs,
+            'random_state': random_state
+        }
+
+    if algorithm == 'nmf':
+        return {
+            'n_topics': tm_args.get('n_topics', 20),
+            'max_iter': tm_args.get('max_iter', 200),
+            'random_state': random_state
+        }
+
+    return {
+        'n_topics': tm_args.get('n_topics', 20),
+        'n_iter': tm_args.get('n_iter', 5),
+        'random_state': random_state
+    }
+
 # FIXME VARYING ASPECTS:
 # documents = textacy_utility.tCoIR_get_corpus_documents(corpus)
 ### def compute(corpus, documents, tick=utility.noop, method='sklearn_lda', vec_args=None, term_args=None, tm_args=None, **args):
-def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None, **args):
+def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None, train_corpus=None, coherence_service=None, **args):
+    '''Computes topic model for `terms`
+
+    train_corpus: optional prebuilt `topic_model_corpus.TrainCorpus` e.g. shared between models in a n_topics sweep
+    coherence_service: optional `coherence.CoherenceService` for train_corpus (with cached co-occurrence statistics)
+    args:
+        tfidf_weiging       apply TF-IDF weighting to BoW corpus
+        filter_extremes     gensim dictionary filter options (no_below, no_above, keep_n)
+        cache_folder        store/reuse built train corpus in this folder (keyed by hash of terms and options)
+        coherence           coherence measure: 'c_v' (default), 'c_npmi' or 'u_mass'
+    tm_args:
+        holdout             fraction of documents held out from training and used for computing perplexity, LDA and
+                            LDA-MULTICORE only (default DEFAULT_HOLDOUT for the algorithm, otherwise perplexity is
+                            computed on the full train corpus)
+    '''
 
-    vec_args = utility.extend({}, DEFAULT_VECTORIZE_PARAMS, vec_args)
+    vec_args = utility.extend({}, DEFAULT_VECTORIZE_PARAMS, vec_args or {})
 
     ### terms = [ list(doc) for doc in textacy_utility.extract_corpus_terms(corpus, term_args) ]
     ### fx_terms = lambda: terms # [ doc for doc in textacy_utility.extract_corpus_terms(corpus, term_args) ]
@@ -172,40 +291,58 @@ def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None,
     doc_topic_matrix = None
     doc_term_matrix = None
 
-    if not os.path.exists(TEMP_PATH):
-        os.makedirs(TEMP_PATH)
+    tm_args = tm_args or {}
+
+    for folder in set([ TEMP_PATH, os.path.dirname(tm_args.get('prefix', TEMP_PATH)) ]):
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
 
     if method.startswith('sklearn'):
 
-        vectorizer = textacy.Vectorizer(**vec_args)
-        doc_term_matrix = vectorizer.fit_transform(fx_terms())
+        algorithm_name = method.split('_')[1]
+
+        vectorizer, doc_term_matrix = topic_model_corpus.vectorize(fx_terms(), vec_args, cache_folder=args.get('cache_folder', None))
 
-        model = textacy.TopicModel(method.split('_')[1], **tm_args)
+        model = textacy.TopicModel(algorithm_name, **setup_sklearn_algorithms(algorithm_name, doc_term_matrix, tm_args))
         model.fit(doc_term_matrix)
 
         doc_topic_matrix = model.transform(doc_term_matrix)
 
         id2word = vectorizer.id_to_term
+
+        # Lazy gensim view of the matrix (not iterated, metadata is compiled from doc_term_matrix and doc_topic_matrix)
         bow_corpus = gensim.matutils.Sparse2Corpus(doc_term_matrix, documents_columns=False)
 
-        # FIXME!!!
-        perplexity_score = None
+        if algorithm_name == 'lda':
+            # Per-word likelihood bound, same measure as gensim's log_perplexity
+            perplexity_score = model.model.score(doc_term_matrix) / doc_term_matrix.sum()
+
+        # Coherence is computed for gensim models only
         coherence_score = None
 
     elif method.startswith('gensim_'):
 
         algorithm_name = method.split('_')[1].upper()
 
-        id2word = gensim.corpora.Dictionary(fx_terms())
-        bow_corpus = [ id2word.doc2bow(tokens) for tokens in fx_terms() ]
+        train_corpus = train_corpus or topic_model_corpus.load_or_build(
+            fx_terms(),
+            cache_folder=args.get('cache_folder', None),
+            filter_extremes=args.get('filter_extremes', None),
+            tfidf_weiging=args.get('tfidf_weiging', False)
+        )
+
+        id2word = train_corpus.id2word
+        bow_corpus = train_corpus.bow_corpus
 
-        if args.get('tfidf_weiging', False):
-            # assert algorithm_name != 'MALLETLDA', 'MALLET training model cannot (currently) use TFIDF weighed corpus'
-            tfidf_model = gensim.models.tfidfmodel.TfidfModel(bow_corpus)
-            bow_corpus = [ tfidf_model[d] for d in bow_corpus ]
+        holdout = tm_args.get('holdout', DEFAULT_HOLDOUT.get(algorithm_name, 0.0))
+
+        if holdout and algorithm_name not in HOLDOUT_ALGORITHMS:
+            raise topic_model_utility.TopicModelException('held-out documents not supported for {} (only {})'.format(algorithm_name, ', '.join(HOLDOUT_ALGORITHMS)))
+
+        fit_corpus, holdout_corpus = topic_model_utility.split_holdout(bow_corpus, holdout, random_state=tm_args.get('random_state', 100))
 
         ### algorithms = setup_gensim_algorithms(corpus, bow_corpus, id2word, tm_args)
-        algorithm = setup_gensim_algorithms(algorithm_name, documents, bow_corpus, id2word, tm_args)
+        algorithm = setup_gensim_algorithms(algorithm_name, documents, fit_corpus, id2word, tm_args)
 
         engine = algorithm['engine']
         engine_options = algorithm['options']
@@ -213,11 +350,12 @@ def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None,
         model = engine(**engine_options)
 
         if hasattr(model, 'log_perplexity'):
-            perplexity_score = model.log_perplexity(bow_corpus, len(bow_corpus))
+            eval_corpus = holdout_corpus if len(holdout_corpus) > 0 else bow_corpus
+            perplexity_score = model.log_perplexity(eval_corpus, len(eval_corpus))
 
         try:
-            coherence_model_lda =  gensim.models.CoherenceModel(model=model, texts=fx_terms(), dictionary=id2word, coherence='c_v')
-            coherence_score = coherence_model_lda.get_coherence()
+            coherence_service = coherence_service or coherence.CoherenceService(train_corpus)
+            coherence_score, _ = coherence_service.score_model(model, coherence=args.get('coherence', 'c_v'))
         except Exception as ex:
             logger.error(ex)
             coherence_score = None
@@ -229,7 +367,8 @@ def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None,
         documents,
         vectorizer=vectorizer,
         doc_topic_matrix=doc_topic_matrix,
-        n_tokens=200
+        n_tokens=200,
+        doc_term_matrix=doc_term_matrix
     )
 
     model_data = types.SimpleNamespace(
@@ -249,27 +388,24 @@ def compute(terms, documents, method='sklearn_lda', vec_args=None, tm_args=None,
 
     return model_data
 
-def store_model(data, filename):
-
-    data = types.SimpleNamespace(
-        topic_model=data.topic_model,
-        id2term=data.id2term,
-        bow_corpus=data.bow_corpus,
-        doc_term_matrix=None, #doc_term_matrix,
-        doc_topic_matrix=None, #doc_topic_matrix,
-        vectorizer=None, #vectorizer,
-        processed=data.processed,
-        coherence_scores=data.coherence_scores
-    )
+def store_model(data, folder):
+    '''Stores model data in model store `folder` (see `topic_model_store.store`)'''
+    topic_model_store.store(data, folder)
 
-    with open(filename, 'wb') as f:
-        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+def load_model(path):
+    '''Opens model store folder (components are loaded lazily), or unpickles model data stored by earlier versions'''
 
-def load_model(filename):
-    with open(filename, 'rb') as f:
+    if topic_model_store.is_model_store(path):
+        return topic_model_store.load(path)
+
+    with open(path, 'rb') as f:
         data = pickle.load(f)
     return data
 
+def update_model(data, terms, documents, **args):
+    '''Updates model with new documents only, returns updated model data (see `topic_model_update.update_model`)'''
+    return topic_model_update.update_model(data, terms, documents, **args)
+
 def compute_topic_proportions(document_topic_weights, doc_length_series):
 
     '''
@@ -293,16 +429,10 @@ def compute_topic_proportions(document_topic_weights, doc_length_series):
     # topic.frequency <- colSums(theta * doc.length)
     # topic.proportion <- topic.frequency/sum(topic.frequency)
 
-    theta = pd.pivot_table(
-        document_topic_weights,
-        values='weight',
-        index=['document_id'],
-        columns=['topic_id']
-    ) #.set_index('document_id')
-
-    theta_mult_doc_length = theta.mul(doc_length_series.words, axis=0)
+    theta = topic_model_aggregate.to_sparse_theta(document_topic_weights, doc_length_series)
+    topic_ids = np.unique(document_topic_weights.topic_id.values)
 
-    topic_frequency = theta_mult_doc_length.sum()
-    topic_proportion = topic_frequency / topic_frequency.sum()
+    topic_frequency = (theta.T @ doc_length_series.words.values)[topic_ids]
+    topic_proportion = pd.Series(topic_frequency / topic_frequency.sum(), index=pd.Index(topic_ids, name='topic_id'))
 
     return topic_proportion
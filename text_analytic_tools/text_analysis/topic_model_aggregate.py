@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+def to_sparse_theta(document_topic_weights, documents, n_topics=None):
+    '''Returns document-topic weights as CSR matrix with rows aligned with `documents` index
+
+    `document_topic_weights` is the long format frame from `compile_document_topics` (document_id as index or column).
+    Documents with no weights have empty rows.
+    '''
+    document_ids = document_topic_weights.document_id.values \
+        if 'document_id' in document_topic_weights.columns else document_topic_weights.index.values
+
+    rows = documents.index.get_indexer(document_ids)
+    assert (rows >= 0).all(), 'document_topic_weights has documents not in document index'
+
+    topic_ids = document_topic_weights.topic_id.values
+    n_topics = n_topics or (int(topic_ids.max()) + 1 if len(topic_ids) > 0 else 0)
+
+    return sp.csr_matrix((document_topic_weights.weight.values, (rows, topic_ids)), shape=(len(documents), n_topics))
+
+def indicator_matrix(codes, n_groups):
+    '''Returns sparse group x documents matrix with a one where document belongs to group (code -1 = no group)'''
+    is_grouped = codes >= 0
+    return sp.csr_matrix(
+        (np.ones(is_grouped.sum()), (codes[is_grouped], np.nonzero(is_grouped)[0])), shape=(n_groups, len(codes))
+    )
+
+class TopicAggregator():
+    '''Aggregates document-topic weights over documents by sparse matrix products
+
+    Theta is kept as a CSR matrix (documents x topics) aligned with the document index. Grouped topic weights,
+    topic shares and trends are computed as products of a (groups x documents) indicator matrix and theta, and
+    are cached per grouping. The group columns are document index columns, e.g. the GROUP_BY_OPTIONS keys of
+    the domain (['pope', 'year'] etc.).
+
+    Parameters
+    ----------
+    theta : scipy.sparse matrix or numpy.ndarray
+        Document-topic weights, shape documents x topics, rows ordered as `documents`
+    documents : pandas.DataFrame
+        Document index
+    '''
+    def __init__(self, theta, documents):
+        self.theta = sp.csr_matrix(theta)
+        self.documents = documents
+        self.n_topics = self.theta.shape[1]
+        self._groupings = {}
+        self._cache = {}
+
+    @staticmethod
+    def create(document_topic_weights, documents, n_topics=None):
+        return TopicAggregator(to_sparse_theta(document_topic_weights, documents, n_topics), documents)
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def grouping(self, columns):
+        '''Returns (group keys frame, group code per document, group x documents indicator matrix) for grouping by `columns`'''
+        columns = tuple(columns)
+        if columns not in self._groupings:
+            grouped = self.documents.groupby(list(columns), sort=True)
+            codes = grouped.ngroup().values
+            keys = grouped.size().index.to_frame(index=False)
+            self._groupings[columns] = (keys, codes, indicator_matrix(codes, len(keys)))
+        return self._groupings[columns]
+
+    def _document_lengths(self, doc_length_column):
+        if doc_length_column is None:
+            return np.ones(len(self.documents))
+        return self.documents[doc_length_column].values.astype(np.float64)
+
+    def topic_proportions(self, doc_length_column='words'):
+        '''Returns topic proportions over the corpus computed as in LDAvis, i.e. colSums(theta * doc.length) normalized'''
+        def compute():
+            topic_frequency = self.theta.T @ self._document_lengths(doc_length_column)
+            return pd.Series(topic_frequency / topic_frequency.sum(), index=pd.RangeIndex(0, self.n_topics, name='topic_id'))
+        return self._cached(('topic_proportions', doc_length_column), compute)
+
+    def group_weights(self, columns, threshold=0.0):
+        '''Returns topic weight statistics per group and topic
+
+        Only weights above `threshold` are included, and mean is computed over documents with such weights
+        (the same as filtering the long format weights on threshold and then grouping).
+
+        Returns
+        -------
+        pandas.DataFrame
+            Group columns, topic_id, sum, count, mean and max (rows for groups and topics with weights only)
+        '''
+        def compute():
+            keys, codes, indicator = self.grouping(columns)
+            theta = self.theta.copy()
+            theta.data[theta.data <= threshold] = 0.0
+            theta.eliminate_zeros()
+
+            sums = (indicator @ theta).tocoo()
+            counts = (indicator @ (theta > 0).astype(np.float64)).tocsr()
+
+            coo = theta.tocoo()
+            maxes = pd.Series(coo.data).groupby([ codes[coo.row], coo.col ]).max()
+
+            df = keys.iloc[sums.row].reset_index(drop=True)
+            df['topic_id'] = sums.col
+            df['sum'] = sums.data
+            df['count'] = np.asarray(counts[sums.row, sums.col]).ravel().astype(np.int64)
+            df['mean'] = df['sum'] / df['count']
+            df['max'] = maxes.reindex(pd.MultiIndex.from_arrays([ sums.row, sums.col ])).values
+
+            return df.sort_values(list(columns) + [ 'topic_id' ]).reset_index(drop=True)
+
+        return self._cached(('group_weights', tuple(columns), threshold), compute)
+
+    def group_shares(self, columns, doc_length_column='words'):
+        '''Returns topic shares per group (groups x topics frame), i.e. topic proportions computed within each group'''
+        def compute():
+            keys, _, indicator = self.grouping(columns)
+            weighted = sp.diags(self._document_lengths(doc_length_column)) @ self.theta
+            frequency = (indicator @ weighted).toarray()
+            totals = frequency.sum(axis=1)
+            shares = frequency / np.where(totals == 0, 1.0, totals)[:, None]
+            return pd.DataFrame(shares, index=pd.MultiIndex.from_frame(keys) if len(columns) > 1 else pd.Index(keys.iloc[:, 0]))
+        return self._cached(('group_shares', tuple(columns), doc_length_column), compute)
+
+    def rolling_trend(self, column='year', window=3, doc_length_column='words'):
+        '''Returns rolling mean over `window` consecutive values (e.g. years) of topic shares per `column` value
+
+        Missing values within the range (e.g. years without documents) are included with zero shares.
+        '''
+        def compute():
+            shares = self.group_shares([ column ], doc_length_column)
+            values = shares.index.values
+            full_range = pd.Index(range(int(values.min()), int(values.max()) + 1), name=column)
+            return shares.reindex(full_range, fill_value=0.0).rolling(window, min_periods=1, center=True).mean()
+        return self._cached(('rolling_trend', column, window, doc_length_column), compute)
@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import collections
+
+import numpy as np
+import scipy.sparse as sp
+import gensim
+import joblib
+import textacy
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Number of fitted vectorizers (and document-term matrices) kept in memory by `vectorize`
+VECTORIZER_CACHE_SIZE = 4
+
+_vectorizer_cache = collections.OrderedDict()
+
+def terms_hash(terms, **opts):
+    """Returns sha1 hex digest of tokenized documents in `terms` and (json serializable) build options"""
+    digest = hashlib.sha1()
+    for tokens in terms:
+        digest.update('\x1f'.join(tokens).encode('utf-8'))
+        digest.update(b'\x1e')
+    digest.update(json.dumps(opts, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def reiterable(terms):
+    """Returns `terms` as is if it can be iterated more than once, otherwise (an iterator or generator) as a list"""
+    return list(terms) if iter(terms) is terms else terms
+
+class TrainCorpus():
+    """Dictionary, BoW corpus and a compact document store built from tokenized documents in a single pass
+
+    The documents are stored as a flat int32 token id array (`token_ids`) with document start `offsets`, and can be
+    iterated as tokens via `texts` (e.g. as input to coherence models) without keeping the original terms in memory.
+    """
+    def __init__(self, id2word, token_ids, offsets, tfidf_weiging=False):
+
+        self.id2word = id2word
+        self.token_ids = token_ids
+        self.offsets = offsets
+        self.tfidf_weiging = tfidf_weiging
+
+        self.bow_corpus = [ self._doc2bow(ids) for ids in self.documents() ]
+
+        if tfidf_weiging:
+            tfidf_model = gensim.models.tfidfmodel.TfidfModel(self.bow_corpus)
+            self.bow_corpus = [ tfidf_model[d] for d in self.bow_corpus ]
+
+    @staticmethod
+    def _doc2bow(ids):
+        token_ids, counts = np.unique(ids, return_counts=True)
+        return list(zip(token_ids.tolist(), counts.tolist()))
+
+    @staticmethod
+    def build(terms, filter_extremes=None, tfidf_weiging=False, tick=utility.noop):
+        """Builds corpus in a single pass over `terms`
+
+        Parameters
+        ----------
+        terms : Iterable[Iterable[str]]
+            Tokenized documents
+        filter_extremes : dict, optional
+            Arguments to gensim's `Dictionary.filter_extremes` (no_below, no_above, keep_n), filtered tokens are removed from the documents
+        tfidf_weiging : bool, optional
+            Apply TF-IDF weighting to the BoW corpus
+        """
+        id2word = gensim.corpora.Dictionary()
+        token2id = id2word.token2id
+
+        documents = []
+        for tokens in terms:
+            tokens = list(tokens)
+            id2word.doc2bow(tokens, allow_update=True)
+            documents.append(np.fromiter((token2id[t] for t in tokens), dtype=np.int32, count=len(tokens)))
+            tick()
+
+        offsets = np.cumsum([0] + [ len(x) for x in documents ]).astype(np.int64)
+        token_ids = np.concatenate(documents) if len(documents) > 0 else np.zeros(0, dtype=np.int32)
+
+        if filter_extremes is not None:
+            id2word, token_ids, offsets = TrainCorpus._filter_extremes(id2word, token_ids, offsets, filter_extremes)
+
+        return TrainCorpus(id2word, token_ids, offsets, tfidf_weiging=tfidf_weiging)
+
+    @staticmethod
+    def _filter_extremes(id2word, token_ids, offsets, filter_extremes):
+
+        old_token2id = dict(id2word.token2id)
+
+        id2word.filter_extremes(**filter_extremes)
+
+        old2new = np.full(len(old_token2id), -1, dtype=np.int32)
+        for token, new_id in id2word.token2id.items():
+            old2new[old_token2id[token]] = new_id
+
+        new_ids = old2new[token_ids]
+        keep = new_ids >= 0
+
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+
+        return id2word, new_ids[keep], kept_before[offsets]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def documents(self):
+        """Yields each document as a token id array"""
+        for i in range(0, len(self)):
+            yield self.token_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def texts(self):
+        """Re-iterable tokens per document"""
+        return _TokenView(self)
+
+    def store(self, folder):
+
+        os.makedirs(folder, exist_ok=True)
+
+        self.id2word.save(os.path.join(folder, 'dictionary.gensim'))
+        np.save(os.path.join(folder, 'token_ids.npy'), self.token_ids)
+        np.save(os.path.join(folder, 'offsets.npy'), self.offsets)
+
+        with open(os.path.join(folder, 'corpus.json'), 'w') as f:
+            json.dump({ 'tfidf_weiging': self.tfidf_weiging, 'n_documents': len(self), 'n_tokens': len(self.token_ids) }, f)
+
+    @staticmethod
+    def exists(folder):
+        return os.path.isfile(os.path.join(folder, 'corpus.json'))
+
+    @staticmethod
+    def load(folder):
+
+        with open(os.path.join(folder, 'corpus.json'), 'r') as f:
+            options = json.load(f)
+
+        return TrainCorpus(
+            gensim.corpora.Dictionary.load(os.path.join(folder, 'dictionary.gensim')),
+            np.load(os.path.join(folder, 'token_ids.npy')),
+            np.load(os.path.join(folder, 'offsets.npy')),
+            tfidf_weiging=options['tfidf_weiging']
+        )
+
+class _TokenView():
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.tokens = np.array([ corpus.id2word[i] for i in range(0, len(corpus.id2word)) ], dtype=object)
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def __iter__(self):
+        for ids in self.corpus.documents():
+            yield self.tokens[ids].tolist()
+
+def load_or_build(terms, cache_folder=None, filter_extremes=None, tfidf_weiging=False):
+    """Returns TrainCorpus for terms, loaded from (or stored in) `cache_folder` if specified
+
+    The cache is keyed by a hash of terms and build options, so a changed corpus or changed options never reuses a stale build.
+    The terms are read twice (hashed, then built if not cached), so an iterator or generator is first read into a list.
+    """
+    if cache_folder is None:
+        return TrainCorpus.build(terms, filter_extremes=filter_extremes, tfidf_weiging=tfidf_weiging)
+
+    terms = reiterable(terms)
+    key = terms_hash(terms, filter_extremes=filter_extremes, tfidf_weiging=tfidf_weiging)
+    folder = os.path.join(cache_folder, key)
+
+    if TrainCorpus.exists(folder):
+        logger.info('Loading train corpus from %s', folder)
+        return TrainCorpus.load(folder)
+
+    train_corpus = TrainCorpus.build(terms, filter_extremes=filter_extremes, tfidf_weiging=tfidf_weiging)
+    train_corpus.store(folder)
+
+    logger.info('Stored train corpus in %s', folder)
+
+    return train_corpus
+
+def vectorize(terms, vec_args, cache_folder=None):
+    """Returns fitted textacy Vectorizer and (sparse) document-term matrix for terms
+
+    Results are cached in memory (the VECTORIZER_CACHE_SIZE most recent), and in `cache_folder` if specified, keyed by
+    a hash of terms and `vec_args`, so that models computed for the same terms (e.g. in a n_topics sweep, or with
+    changed model options) reuse the same fit. An iterator or generator `terms` is first read into a list.
+    """
+    terms = reiterable(terms)
+    key = terms_hash(terms, vectorizer='textacy', **vec_args)
+
+    if key in _vectorizer_cache:
+        _vectorizer_cache.move_to_end(key)
+        return _vectorizer_cache[key]
+
+    folder = os.path.join(cache_folder, key) if cache_folder is not None else None
+
+    if folder is not None and os.path.isfile(os.path.join(folder, 'doc_term_matrix.npz')):
+        logger.info('Loading vectorizer from %s', folder)
+        result = joblib.load(os.path.join(folder, 'vectorizer.joblib')), sp.load_npz(os.path.join(folder, 'doc_term_matrix.npz'))
+    else:
+        vectorizer = textacy.Vectorizer(**vec_args)
+        result = vectorizer, sp.csr_matrix(vectorizer.fit_transform(terms))
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+            joblib.dump(result[0], os.path.join(folder, 'vectorizer.joblib'))
+            sp.save_npz(os.path.join(folder, 'doc_term_matrix.npz'), result[1])
+
+    _vectorizer_cache[key] = result
+    while len(_vectorizer_cache) > VECTORIZER_CACHE_SIZE:
+        _vectorizer_cache.popitem(last=False)
+
+    return result
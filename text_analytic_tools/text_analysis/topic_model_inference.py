@@ -0,0 +1,203 @@
+import os
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import scipy.special
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.common.textacy_utility as textacy_utility
+import text_analytic_tools.text_analysis.topic_model_utility as topic_model_utility
+import text_analytic_tools.text_analysis.topic_model_store as topic_model_store
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Topic-term matrix (terms x topics) and alpha, set in worker processes by the pool initializer
+_model = None
+
+# Engines whose topic-term weights are signed (SVD components), they cannot be used as topic-term probabilities
+NON_PROBABILISTIC_METHODS = [ 'gensim_lsi', 'sklearn_lsa' ]
+NON_PROBABILISTIC_MODELS = [ 'LsiModel', 'TruncatedSVD' ]
+
+def _method_name(model_data):
+    options = getattr(model_data, 'options', None) or {}
+    if options.get('method', None) is not None:
+        return options['method']
+    topic_model = getattr(model_data, 'topic_model', None)
+    # textacy's TopicModel wraps the scikit-learn model
+    return type(getattr(topic_model, 'model', topic_model)).__name__
+
+def fold_in(doc_term_matrix, topic_terms, alpha, iterations=50, gamma_threshold=0.001):
+    '''Infers document topic weights for a batch of documents given fixed topic-term probabilities
+
+    Runs the variational E-step of LDA (as gensim's LdaModel.inference, with phi kept fixed) for all documents
+    in the batch at once, stopping when the mean change in gamma is below `gamma_threshold`.
+
+    Parameters
+    ----------
+    doc_term_matrix : scipy.sparse.csr_matrix
+        Term counts, shape documents x terms
+    topic_terms : numpy.ndarray
+        Topic-term probabilities (transposed phi), shape terms x topics
+    alpha : numpy.ndarray
+        Document-topic prior
+
+    Returns
+    -------
+    numpy.ndarray
+        Normalized document-topic weights, shape documents x topics (uniform for documents with no known terms)
+    '''
+    doc_term_matrix = sp.csr_matrix(doc_term_matrix, dtype=np.float64)
+    rows = np.repeat(np.arange(doc_term_matrix.shape[0]), np.diff(doc_term_matrix.indptr))
+    cols = doc_term_matrix.indices
+
+    gamma = np.ones((doc_term_matrix.shape[0], len(alpha)))
+    is_active = np.ones(doc_term_matrix.shape[0], dtype=bool)
+
+    for _ in range(0, iterations):
+
+        exp_e_log_theta = np.exp(scipy.special.digamma(gamma) - scipy.special.digamma(gamma.sum(axis=1))[:, None])
+
+        norm = np.einsum('ij,ij->i', exp_e_log_theta[rows], topic_terms[cols]) + 1e-100
+        ratio = sp.csr_matrix((doc_term_matrix.data / norm, cols, doc_term_matrix.indptr), shape=doc_term_matrix.shape)
+
+        new_gamma = alpha + exp_e_log_theta * (ratio @ topic_terms)
+        change = np.mean(np.abs(new_gamma - gamma), axis=1)
+
+        gamma[is_active] = new_gamma[is_active]
+        is_active &= change >= gamma_threshold
+
+        if not is_active.any():
+            break
+
+    return gamma / gamma.sum(axis=1)[:, None]
+
+def _init_worker(topic_terms, alpha):
+    global _model
+    _model = (topic_terms, alpha)
+
+def _fold_in_task(i, doc_term_matrix, iterations, gamma_threshold):
+    topic_terms, alpha = _model
+    return i, fold_in(doc_term_matrix, topic_terms, alpha, iterations, gamma_threshold)
+
+class InferenceService():
+    '''Assigns topics to new (unseen) documents using a stored topic model, without retraining
+
+    Only the model's phi, dictionary and alpha are used, so the service works for model store or pickled model data of
+    the probabilistic engines (LDA of MALLET, STTM, gensim and scikit-learn, and DTM). Rows of phi are normalized to
+    topic-term probabilities, for NMF (non-negative, but not probabilistic) this is a heuristic. LSI/LSA models have
+    signed weights and are rejected with a TopicModelException. Documents are tokenized with the term extraction
+    options used for the model (`extract_args` in the model's options, if not given), terms not in the model's
+    dictionary are ignored. Topic weights are folded in with a batched variational E-step, batches are distributed
+    over `n_workers` processes.
+
+    Parameters
+    ----------
+    model_data : model store folder, or model data (see `topic_model.compute` and `topic_model.load_model`)
+    extract_args : dict, optional
+        Term extraction options (see `textacy_utility.extract_document_terms`)
+    '''
+    def __init__(self, model_data, extract_args=None, n_workers=None, chunksize=1000, iterations=50, gamma_threshold=0.001):
+
+        if isinstance(model_data, str):
+            model_data = topic_model_store.load(model_data)
+
+        phi = getattr(model_data, 'phi', None)
+        if phi is None:
+            phi = topic_model_utility.get_topic_term_matrix(model_data.topic_model)
+
+        phi = np.asarray(phi, dtype=np.float64)
+
+        method = _method_name(model_data)
+        if method in NON_PROBABILISTIC_METHODS + NON_PROBABILISTIC_MODELS or (phi < 0.0).any() or (phi.sum(axis=1) <= 0.0).any():
+            raise topic_model_utility.TopicModelException('topic inference needs non-negative topic-term weights, not supported for {}'.format(method))
+        self.topic_terms = np.ascontiguousarray((phi / phi.sum(axis=1)[:, None]).T)
+        self.n_topics = phi.shape[0]
+
+        dictionary = model_data.processed.dictionary
+        self.token2id = dict(zip(dictionary.token, dictionary.index))
+
+        self.alpha = self._alpha(model_data.processed.topic_token_overview)
+
+        options = getattr(model_data, 'options', None) or {}
+        self.extract_args = extract_args or options.get('extract_args', None)
+
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.iterations = iterations
+        self.gamma_threshold = gamma_threshold
+
+    def _alpha(self, topic_token_overview):
+        alpha = np.full(self.n_topics, 1.0 / self.n_topics)
+        if 'alpha' in topic_token_overview.columns:
+            values = topic_token_overview.alpha.reindex(range(0, self.n_topics)).values
+            alpha = np.where(np.isnan(values) | (values <= 0.0), alpha, values)
+        return alpha
+
+    def tokenize(self, docs):
+        '''Returns terms of (spaCy/textacy) documents extracted with the model's term extraction options
+
+        Terms are extracted per document with `extract_document_terms`, i.e. without the corpus level `min_freq`
+        and `max_doc_freq` filters that `extract_corpus_terms` applied when the model was trained (these need
+        statistics of the training corpus). Instead terms are filtered by the model's vocabulary, which excludes
+        all terms removed by those filters.
+        '''
+        assert self.extract_args is not None, 'term extraction options (extract_args) unknown for this model'
+        return (
+            [ t for t in textacy_utility.extract_document_terms(doc, self.extract_args) if t in self.token2id ]
+                for doc in docs
+        )
+
+    def doc_term_matrix(self, terms):
+        '''Returns CSR matrix of counts of known terms, shape documents x model's terms'''
+        ids, indptr = [], [ 0 ]
+        for document in terms:
+            ids.extend(i for i in ( self.token2id.get(t, None) for t in document ) if i is not None)
+            indptr.append(len(ids))
+        matrix = sp.csr_matrix(
+            (np.ones(len(ids)), np.array(ids, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.topic_terms.shape[0])
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    def infer(self, terms):
+        '''Returns document-topic matrix (documents x topics) for documents given as lists of terms'''
+
+        doc_term_matrix = self.doc_term_matrix(terms)
+        batches = [ (i, doc_term_matrix[i:i + self.chunksize]) for i in range(0, doc_term_matrix.shape[0], self.chunksize) ]
+
+        theta = np.zeros((doc_term_matrix.shape[0], self.n_topics))
+
+        if self.n_workers == 1 or len(batches) < 2:
+            for i, batch in batches:
+                theta[i:i + batch.shape[0]] = fold_in(batch, self.topic_terms, self.alpha, self.iterations, self.gamma_threshold)
+            return theta
+
+        # Spawned (not forked) workers, forking is not safe after numba's parallel threads have been started
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(self.n_workers, len(batches)), mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self.topic_terms, self.alpha)
+        ) as executor:
+            futures = [ executor.submit(_fold_in_task, i, batch, self.iterations, self.gamma_threshold) for i, batch in batches ]
+            for future in concurrent.futures.as_completed(futures):
+                i, batch_theta = future.result()
+                theta[i:i + len(batch_theta)] = batch_theta
+
+        return theta
+
+    def infer_documents(self, docs):
+        '''Returns document-topic matrix for (spaCy/textacy) documents'''
+        return self.infer(self.tokenize(docs))
+
+    def document_topic_weights(self, terms, documents, minimum_probability=0.001):
+        '''Returns topic weights of new documents merged with `documents` (same format as `compile_document_topics`)'''
+
+        theta = self.infer(terms)
+
+        document_ids, topic_ids, weights = topic_model_utility.document_topic_weights(theta, minimum_probability)
+        df_doc_topics = pd.DataFrame({ 'document_id': documents.index[document_ids], 'topic_id': topic_ids, 'weight': weights }).set_index('document_id')
+
+        return pd.merge(documents, df_doc_topics, how='inner', left_index=True, right_index=True)
@@ -0,0 +1,104 @@
+import csv
+import gzip
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import text_analytic_tools.utility as utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Read options for whitespace separated engine output. Tokens are read verbatim (no quoting, no NA values).
+READ_OPTS = dict(header=None, quoting=csv.QUOTE_NONE, keep_default_na=False, na_filter=False, engine='c')
+
+def _chunks(reader, chunksize):
+    return reader if chunksize else [ reader ]
+
+def to_sparse_topic_weights(weights, eps=1e-6, renorm=True):
+    """Returns CSR matrix of weights with values below `eps` removed, rows optionally renormalized to sum 1"""
+    weights = np.where(weights < eps, 0.0, weights)
+    if renorm:
+        totals = weights.sum(axis=1)
+        weights = weights / np.where(totals == 0, 1.0, totals)[:, None]
+    return sp.csr_matrix(weights)
+
+def read_sttm_theta(filename, num_topics, eps=1e-6, renorm=True, chunksize=None):
+    """Reads STTM's document-topic (.theta) file as CSR matrix, shape n_documents x num_topics"""
+    reader = pd.read_csv(filename, sep=' ', usecols=range(0, num_topics), dtype=np.float64, chunksize=chunksize, **READ_OPTS)
+    return sp.vstack([ to_sparse_topic_weights(chunk.values, eps, renorm) for chunk in _chunks(reader, chunksize) ], format='csr')
+
+def read_sttm_phi(filename, num_topics, num_terms):
+    """Reads STTM's topic-word (.phi) file, shape num_topics x num_terms"""
+    phi = pd.read_csv(filename, sep=' ', usecols=range(0, num_terms), dtype=np.float64, **READ_OPTS).values
+    assert phi.shape == (num_topics, num_terms)
+    return phi
+
+def read_mallet_doctopics(filename, num_topics, eps=1e-6, renorm=True, chunksize=None):
+    """Reads MALLET's doc-topics file as CSR matrix, shape n_documents x num_topics
+
+    Handles both MALLET 2.0.8's dense format (doc, name, one proportion per topic) and the older sparse format
+    (doc, name, topic-proportion pairs ordered by weight).
+    """
+    with open(filename, 'r') as f:
+        line = f.readline()
+        while line.startswith('#'):
+            line = f.readline()
+
+    if len(line.split()) == num_topics + 2:
+        reader = pd.read_csv(
+            filename, sep='\t' if '\t' in line else r'\s+', usecols=range(2, num_topics + 2), comment='#',
+            dtype=np.float64, chunksize=chunksize, header=None, engine='c'
+        )
+        return sp.vstack([ to_sparse_topic_weights(chunk.values, eps, renorm) for chunk in _chunks(reader, chunksize) ], format='csr')
+
+    rows, cols, values, n_documents = [], [], [], 0
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            pairs = np.array(line.split()[2:], dtype=np.float64).reshape(-1, 2)
+            rows.append(np.full(len(pairs), n_documents))
+            cols.append(pairs[:, 0].astype(np.int64))
+            values.append(pairs[:, 1])
+            n_documents += 1
+
+    weights = sp.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n_documents, num_topics)
+    ).toarray() if n_documents > 0 else np.zeros((0, num_topics))
+
+    return to_sparse_topic_weights(weights, eps, renorm)
+
+def read_mallet_state(filename, token2id, num_topics, chunksize=1000000):
+    """Reads MALLET's (gzipped) Gibbs sampling state file
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, float)
+        Topic-word counts (num_topics x number of terms), alpha and beta. Tokens not in `token2id` are ignored.
+    """
+    with gzip.open(filename, 'rt') as f:
+        _ = f.readline()
+        alpha = np.array(f.readline().split()[2:], dtype=np.float64)
+        beta = float(f.readline().split()[2])
+
+    assert len(alpha) == num_topics
+
+    vocabulary = pd.Index(sorted(token2id, key=token2id.get))
+    ids = np.array([ token2id[token] for token in vocabulary ], dtype=np.int64)
+    num_terms = 1 + int(ids.max()) if len(ids) > 0 else 0
+
+    counts = np.zeros(num_topics * num_terms, dtype=np.int64)
+
+    reader = pd.read_csv(
+        filename, sep=' ', skiprows=3, usecols=[4, 5], names=[ 'doc', 'source', 'pos', 'typeindex', 'type', 'topic' ],
+        dtype={ 'type': str, 'topic': np.int64 }, compression='gzip', chunksize=chunksize, **READ_OPTS
+    )
+
+    for chunk in reader:
+        positions = vocabulary.get_indexer(chunk['type'].values)
+        is_known = positions >= 0
+        keys = chunk['topic'].values[is_known] * num_terms + ids[positions[is_known]]
+        counts += np.bincount(keys, minlength=len(counts))
+
+    return counts.reshape(num_topics, num_terms).astype(np.float64), alpha, beta
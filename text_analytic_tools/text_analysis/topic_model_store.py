@@ -0,0 +1,200 @@
+import os
+import json
+import importlib
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import gensim
+import joblib
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.text_analysis.topic_model_utility as topic_model_utility
+
+logger = utility.getLogger("text_analytic_tools")
+
+MODEL_DATA_FILENAME = 'model_data.json'
+
+FRAME_NAMES = [ 'dictionary', 'documents', 'topic_token_weights', 'topic_token_overview', 'document_topic_weights' ]
+
+def _class_name(x):
+    return '{}.{}'.format(type(x).__module__, type(x).__name__)
+
+def _import_class(name):
+    module_name, class_name = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+def _json_default(x):
+    # Sets (e.g. extra_stop_words in term extraction options) are stored as sorted lists. Other values that are
+    # not JSON serializable are stored as strings, and are not restored by `load`.
+    return sorted(x) if isinstance(x, (set, frozenset)) else str(x)
+
+def is_model_store(path):
+    return os.path.isfile(os.path.join(path, MODEL_DATA_FILENAME))
+
+def compile_theta(document_topic_weights, documents, n_topics):
+    """Returns dense document-topic matrix with rows ordered as `documents` (weights below threshold are zero)"""
+    theta = np.zeros((len(documents), n_topics), dtype=np.float32)
+    rows = documents.index.get_indexer(document_topic_weights.index)
+    theta[rows, document_topic_weights.topic_id.values] = document_topic_weights.weight.values
+    return theta
+
+def store(data, folder):
+    """Stores topic model data in `folder` as separately loadable components
+
+        model_data.json                 scores, options, year period, relevant topics and component types
+        model/                          engine model saved in its native format (gensim save or joblib)
+        phi.npy                         topic-term matrix
+        theta.npy                       document-topic matrix (rows ordered as documents.parquet)
+        corpus.npz                      BoW corpus as sparse document-term matrix
+        dictionary.parquet              token_id, token, dfs
+        documents.parquet, topic_token_weights.parquet, topic_token_overview.parquet, document_topic_weights.parquet
+    """
+    os.makedirs(os.path.join(folder, 'model'), exist_ok=True)
+
+    model = data.topic_model
+    processed = data.processed
+
+    if isinstance(model, gensim.utils.SaveLoad):
+        model.save(os.path.join(folder, 'model', 'model.gensim'))
+    else:
+        joblib.dump(model, os.path.join(folder, 'model', 'model.joblib'))
+
+    phi = np.asarray(topic_model_utility.get_topic_term_matrix(model))
+    np.save(os.path.join(folder, 'phi.npy'), phi)
+
+    theta = compile_theta(processed.document_topic_weights, processed.documents, phi.shape[0])
+    np.save(os.path.join(folder, 'theta.npy'), theta)
+
+    if getattr(data, 'doc_term_matrix', None) is not None:
+        sp.save_npz(os.path.join(folder, 'corpus.npz'), sp.csr_matrix(data.doc_term_matrix))
+    elif data.bow_corpus is not None:
+        matrix = gensim.matutils.corpus2csc(data.bow_corpus, num_terms=len(processed.dictionary)).T.tocsr()
+        sp.save_npz(os.path.join(folder, 'corpus.npz'), matrix)
+
+    for name in FRAME_NAMES:
+        getattr(processed, name).to_parquet(os.path.join(folder, '{}.parquet'.format(name)))
+
+    metadata = dict(
+        model_class=_class_name(model),
+        id2term_type='gensim' if isinstance(data.id2term, gensim.corpora.Dictionary) else 'dict',
+        n_topics=phi.shape[0],
+        perplexity_score=data.perplexity_score,
+        coherence_score=getattr(data, 'coherence_score', None),
+        options=getattr(data, 'options', None),
+        year_period=[ x.item() if hasattr(x, 'item') else x for x in processed.year_period ],
+        relevant_topic_ids=[ int(x) for x in processed.relevant_topic_ids ]
+    )
+
+    with open(os.path.join(folder, MODEL_DATA_FILENAME), 'w') as f:
+        json.dump(metadata, f, default=_json_default)
+
+    coherence_scores = getattr(data, 'coherence_scores', None)
+    if coherence_scores is not None:
+        joblib.dump(coherence_scores, os.path.join(folder, 'coherence_scores.joblib'))
+
+    logger.info('Stored topic model in %s', folder)
+
+def load(folder):
+    return StoredModelData(folder)
+
+class _LazyData():
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._cache = {}
+
+    def _path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def _cached(self, key, loader):
+        if key not in self._cache:
+            logger.info('Loading %s from %s', key, self.folder)
+            self._cache[key] = loader()
+        return self._cache[key]
+
+    def _frame(self, name):
+        return self._cached(name, lambda: pd.read_parquet(self._path('{}.parquet'.format(name))))
+
+class StoredProcessedData(_LazyData):
+    """Processed topic model data (same attributes as returned by `topic_model_utility.compile_metadata`), frames are read on first access"""
+
+    def __init__(self, folder, metadata):
+        super().__init__(folder)
+        self.year_period = tuple(metadata['year_period'])
+        self.relevant_topic_ids = metadata['relevant_topic_ids']
+
+    dictionary = property(lambda self: self._frame('dictionary'))
+    documents = property(lambda self: self._frame('documents'))
+    topic_token_weights = property(lambda self: self._frame('topic_token_weights'))
+    topic_token_overview = property(lambda self: self._frame('topic_token_overview'))
+    document_topic_weights = property(lambda self: self._frame('document_topic_weights'))
+
+class StoredModelData(_LazyData):
+    """Topic model data read from a model store (see `store`)
+
+    Has the same attributes as the data returned by `topic_model.compute`. Only the small json metadata is read when
+    opened, all other components are loaded on first access, theta and phi as memory mapped arrays.
+    """
+    def __init__(self, folder):
+
+        super().__init__(folder)
+
+        with open(self._path(MODEL_DATA_FILENAME), 'r') as f:
+            self.metadata = json.load(f)
+
+        self.perplexity_score = self.metadata['perplexity_score']
+        self.coherence_score = self.metadata['coherence_score']
+        self.options = self.metadata['options']
+        self.doc_term_matrix = None
+        self.processed = StoredProcessedData(folder, self.metadata)
+
+    @property
+    def num_topics(self):
+        return self.metadata['n_topics']
+
+    @property
+    def topic_model(self):
+        return self._cached('topic_model', self._load_topic_model)
+
+    def _load_topic_model(self):
+        filename = self._path(os.path.join('model', 'model.gensim'))
+        if os.path.isfile(filename):
+            return _import_class(self.metadata['model_class']).load(filename, mmap='r')
+        return joblib.load(self._path(os.path.join('model', 'model.joblib')))
+
+    @property
+    def phi(self):
+        return self._cached('phi', lambda: np.load(self._path('phi.npy'), mmap_mode='r'))
+
+    @property
+    def theta(self):
+        return self._cached('theta', lambda: np.load(self._path('theta.npy'), mmap_mode='r'))
+
+    @property
+    def id2term(self):
+        return self._cached('id2term', self._load_id2term)
+
+    def _load_id2term(self):
+        dictionary = self.processed.dictionary
+        token_ids, tokens = dictionary.index.tolist(), dictionary.token.tolist()
+        if self.metadata['id2term_type'] == 'dict':
+            return dict(zip(token_ids, tokens))
+        id2word = gensim.corpora.Dictionary()
+        id2word.token2id = dict(zip(tokens, token_ids))
+        id2word.dfs = dict(zip(token_ids, dictionary.dfs.tolist()))
+        return id2word
+
+    @property
+    def bow_corpus(self):
+        return self._cached('bow_corpus', self._load_bow_corpus)
+
+    def _load_bow_corpus(self):
+        if not os.path.isfile(self._path('corpus.npz')):
+            return None
+        return gensim.matutils.Sparse2Corpus(sp.load_npz(self._path('corpus.npz')), documents_columns=False)
+
+    @property
+    def coherence_scores(self):
+        filename = self._path('coherence_scores.joblib')
+        return self._cached('coherence_scores', lambda: joblib.load(filename) if os.path.isfile(filename) else None)
@@ -0,0 +1,138 @@
+import os
+import types
+import multiprocessing
+import concurrent.futures
+
+import pandas as pd
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.text_analysis.topic_model as topic_model
+import text_analytic_tools.text_analysis.topic_model_corpus as topic_model_corpus
+import text_analytic_tools.text_analysis.coherence as coherence
+
+logger = utility.getLogger("text_analytic_tools")
+
+# Read-only data shared by all models in a sweep. Set in each worker process by the pool initializer.
+_shared = None
+
+# Methods that run worker processes or threads of their own, and hence are not run in a process pool
+MULTIPROCESS_METHODS = [ 'gensim_lda-multicore', 'gensim_gibbs-lda', 'gensim_dtm-hot', 'sklearn_lda' ]
+
+def _init_worker(terms, documents, train_corpus, coherence_service, vectorizer_cache=None):
+    global _shared
+    _shared = types.SimpleNamespace(terms=terms, documents=documents, train_corpus=train_corpus, coherence_service=coherence_service)
+    # Fitted vectorizers of the parent process, so that workers reuse the fit
+    topic_model_corpus._vectorizer_cache.update(vectorizer_cache or {})
+
+def _compute_model(n_topics, method, vec_args, tm_args, keep_model, args):
+
+    tm_args = utility.extend({}, tm_args or {}, n_topics=n_topics)
+
+    if method.startswith('gensim_') and 'prefix' not in tm_args:
+        # External engines (MALLET, STTM) write to files, give each model its own folder
+        tm_args['prefix'] = os.path.join(topic_model.TEMP_PATH, 'n_topics_{}'.format(n_topics), '')
+
+    data = topic_model.compute(
+        terms=_shared.terms,
+        documents=_shared.documents,
+        method=method,
+        vec_args=vec_args,
+        tm_args=tm_args,
+        train_corpus=_shared.train_corpus,
+        coherence_service=_shared.coherence_service,
+        **args
+    )
+
+    if not keep_model:
+        data = types.SimpleNamespace(perplexity_score=data.perplexity_score, coherence_score=data.coherence_score)
+
+    return n_topics, data
+
+def n_topics_window(n_topics, n_topic_window):
+    '''Returns topic counts within `n_topic_window` of `n_topics` (at least 2), always including `n_topics`'''
+    return sorted(set(range(max(n_topics - n_topic_window, 2), n_topics + n_topic_window + 1)) | { n_topics })
+
+def sweep(terms, documents, method, n_topics_range, vec_args=None, tm_args=None, n_workers=None, keep_models=None, **args):
+    """Computes a model for each number of topics in `n_topics_range` in a process pool
+
+    The gensim dictionary and BoW corpus (a `TrainCorpus`) and the coherence statistics (or the sklearn vectorizer
+    fit) are computed once and shared (read-only) with the worker processes. Workers are spawned, not forked.
+    Results are yielded as models finish, not in `n_topics_range` order. Models for methods that are
+    parallel by themselves (MULTIPROCESS_METHODS) are computed one at a time in the current process.
+
+    Parameters
+    ----------
+    keep_models : list of int, optional
+        Number of topics for which the full model data is returned, only scores are returned for other models
+    n_workers : int, optional
+        Number of processes, default number of models (max CPU count)
+    args :
+        Passed on to `topic_model.compute` (e.g. tfidf_weiging)
+
+    Yields
+    ------
+    (int, SimpleNamespace)
+        Number of topics and model data (or perplexity_score and coherence_score only)
+    """
+    n_topics_range = list(n_topics_range)
+    keep_models = set(keep_models or [])
+
+    assert keep_models <= set(n_topics_range), 'kept models {} not in n_topics range'.format(sorted(keep_models - set(n_topics_range)))
+
+    train_corpus = None
+    if method.startswith('gensim_'):
+        train_corpus = topic_model_corpus.load_or_build(
+            terms,
+            cache_folder=args.get('cache_folder', None),
+            filter_extremes=args.get('filter_extremes', None),
+            tfidf_weiging=args.get('tfidf_weiging', False)
+        )
+
+    if method.startswith('sklearn'):
+        # Fit once, workers find the fitted vectorizer in the vectorizer cache (handed over by the initializer)
+        vec_args = utility.extend({}, topic_model.DEFAULT_VECTORIZE_PARAMS, vec_args or {})
+        topic_model_corpus.vectorize(terms, vec_args, cache_folder=args.get('cache_folder', None))
+
+    coherence_service = None
+    if train_corpus is not None:
+        coherence_service = coherence.CoherenceService(train_corpus).prepare(args.get('coherence', 'c_v'))
+
+    if method in MULTIPROCESS_METHODS:
+        _init_worker(terms, documents, train_corpus, coherence_service)
+        for n_topics in n_topics_range:
+            yield _compute_model(n_topics, method, vec_args, tm_args, n_topics in keep_models, args)
+        return
+
+    n_workers = n_workers or min(len(n_topics_range), os.cpu_count() or 1)
+
+    # Spawned (not forked) workers, forking is not safe after numba's parallel threads have been started
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker,
+        initargs=(terms, documents, train_corpus, coherence_service, dict(topic_model_corpus._vectorizer_cache) if method.startswith('sklearn') else None)
+    ) as executor:
+
+        futures = [
+            executor.submit(_compute_model, n_topics, method, vec_args, tm_args, n_topics in keep_models, args)
+                for n_topics in n_topics_range
+        ]
+
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+def sweep_scores(results, tick=utility.noop):
+    """Consumes `sweep` results, returns kept model data and a score frame indexed by n_topics"""
+
+    models, scores = {}, []
+
+    for n_topics, data in results:
+
+        logger.info('#topics: {}, coherence_score {} perplexity {}'.format(n_topics, data.coherence_score, data.perplexity_score))
+
+        if hasattr(data, 'topic_model'):
+            models[n_topics] = data
+
+        scores.append({'n_topics': n_topics, 'perplexity_score': data.perplexity_score, 'coherence_score': data.coherence_score})
+
+        tick()
+
+    return models, pd.DataFrame(scores).set_index('n_topics').sort_index()
@@ -0,0 +1,151 @@
+import types
+
+import numpy as np
+import pandas as pd
+import gensim
+
+import text_analytic_tools.utility as utility
+import text_analytic_tools.text_analysis.topic_model_utility as topic_model_utility
+import text_analytic_tools.text_analysis.topic_model_store as topic_model_store
+import text_analytic_tools.text_analysis.gibbs_topic_model as gibbs_topic_model
+
+logger = utility.getLogger("text_analytic_tools")
+
+def extend_dictionary(id2word, terms):
+    '''Adds new terms of documents `terms` to gensim dictionary `id2word` and returns the documents as BoW
+
+    New terms get ids after the existing ids, so BoW of earlier documents are still valid.
+    '''
+    return [ id2word.doc2bow(list(tokens), allow_update=True) for tokens in terms ]
+
+def extend_lda_vocabulary(model, num_terms):
+    '''Resizes the variational state of gensim LDA `model` to `num_terms` terms
+
+    Sufficient statistics of new terms are zero, i.e. their topic-term weights are given by the prior (eta) until
+    they are seen in an update. An asymmetric eta is extended with its mean. The state arrays are copied, since
+    they are read-only when the model is loaded memory-mapped from a model store.
+    '''
+    n_new = num_terms - model.num_terms
+    assert n_new >= 0, 'vocabulary cannot shrink'
+
+    eta = np.array(model.eta, dtype=model.dtype)
+    if n_new > 0 and eta.ndim == 1 and len(eta) == model.num_terms:
+        eta = np.concatenate([ eta, np.full(n_new, eta.mean(), dtype=model.dtype) ])
+    elif n_new > 0 and eta.ndim == 2:
+        eta = np.hstack([ eta, np.tile(eta.mean(axis=1)[:, None], (1, n_new)) ])
+
+    sstats = np.array(model.state.sstats)
+    sstats = np.hstack([ sstats, np.zeros((model.num_topics, n_new), dtype=sstats.dtype) ])
+
+    model.eta = eta
+    model.alpha = np.array(model.alpha)
+    model.num_terms = num_terms
+    model.state.eta = eta
+    model.state.sstats = sstats
+    model.expElogbeta = np.exp(model.state.get_Elogbeta())
+    model.sync_state()
+
+def update_gensim_lda(model, bow_corpus, passes=1, chunksize=2000, iterations=None):
+    '''Updates gensim LDA (or LDA multicore) `model` with new documents only (online variational Bayes)'''
+    extend_lda_vocabulary(model, len(model.id2word))
+    options = dict(passes=passes, chunksize=chunksize)
+    if iterations is not None:
+        options['iterations'] = iterations
+    model.update(bow_corpus, **options)
+
+def update_model(model_data, terms, documents, passes=1, chunksize=2000, iterations=None, year_column='year'):
+    '''Adds new documents to a trained topic model without retraining on the full corpus
+
+    The model's dictionary is extended with new terms, and the model is updated with the new documents only:
+    gensim LDA models by an online update (`LdaModel.update`), native Gibbs models by sampling the new documents
+    against the trained counts (`GibbsTopicModel.update`). Topic weights are computed for the new documents only
+    and appended to the existing document topic weights, while topic-token weights and overview (which all change
+    by an update) are recompiled from the updated topic-term matrix.
+
+    Note! The model is updated in place. Store the returned data to a new folder, the existing folder's files may be
+    memory-mapped by the loaded data.
+
+    Parameters
+    ----------
+    model_data : model store folder, or model data (see `topic_model.compute` and `topic_model.load_model`)
+    terms : iterable of list of str
+        Terms of the new documents (extracted with the model's extract options)
+    documents : pandas.DataFrame
+        Document index of the new documents, is re-indexed after the existing documents
+
+    Returns
+    -------
+    types.SimpleNamespace
+        Updated model data (same format as `topic_model.compute`)
+    '''
+    if isinstance(model_data, str):
+        model_data = topic_model_store.load(model_data)
+
+    model = model_data.topic_model
+    processed = model_data.processed
+
+    if not isinstance(model, (gensim.models.LdaModel, gibbs_topic_model.GibbsTopicModel)):
+        raise topic_model_utility.TopicModelException('incremental update not supported for {}'.format(type(model).__name__))
+
+    id2word = model.id2word
+    n_terms = len(id2word)
+    bow_corpus = extend_dictionary(id2word, terms)
+    assert len(bow_corpus) == len(documents), 'number of documents and terms differ'
+
+    logger.info('Updating model with %s documents (%s new terms)', len(bow_corpus), len(id2word) - n_terms)
+
+    if isinstance(model, gensim.models.LdaModel):
+        update_gensim_lda(model, bow_corpus, passes=passes, chunksize=chunksize, iterations=iterations)
+        perplexity_score = model.log_perplexity(bow_corpus, len(bow_corpus))
+    else:
+        model.update(bow_corpus, id2word=id2word, iterations=iterations)
+        perplexity_score = None
+
+    start_id = int(processed.documents.index.max()) + 1 if len(processed.documents) > 0 else 0
+    documents = documents.copy()
+    documents.index = pd.RangeIndex(start_id, start_id + len(documents))
+    if 'document_id' in documents.columns:
+        documents['document_id'] = documents.index
+
+    theta = topic_model_utility.get_document_topic_matrix(model, bow_corpus)
+    if theta.shape[0] > len(bow_corpus):
+        # Gibbs models return weights of all documents trained on
+        theta = theta[-len(bow_corpus):]
+
+    document_ids, topic_ids, weights = topic_model_utility.document_topic_weights(theta, minimum_probability=0.001)
+    df_doc_topics = pd.DataFrame({ 'document_id': documents.index[document_ids], 'topic_id': topic_ids, 'weight': weights }).set_index('document_id')
+    document_topic_weights = pd.merge(documents, df_doc_topics, how='inner', left_index=True, right_index=True)
+
+    dictionary = topic_model_utility.compile_dictionary(model)
+    topic_token_weights = topic_model_utility.compile_topic_token_weights(model, dictionary, n_tokens=200)
+    topic_token_overview = topic_model_utility.compile_topic_token_overview(topic_token_weights, model.alpha)
+
+    all_documents = pd.concat([ processed.documents, documents ])
+    years_series = all_documents[year_column]
+
+    updated_processed = types.SimpleNamespace(
+        dictionary=dictionary,
+        documents=all_documents,
+        topic_token_weights=topic_token_weights,
+        topic_token_overview=topic_token_overview,
+        document_topic_weights=pd.concat([ processed.document_topic_weights, document_topic_weights ]),
+        year_period=(years_series[years_series > 0].min(), years_series.max()),
+        relevant_topic_ids=sorted(set(processed.relevant_topic_ids) | set(document_topic_weights.topic_id.unique()))
+    )
+
+    old_bow_corpus = model_data.bow_corpus if model_data.bow_corpus is not None else []
+
+    options = dict(model_data.options or {})
+    options['updates'] = list(options.get('updates', [])) + [ dict(n_documents=len(bow_corpus), n_terms=len(id2word)) ]
+
+    return types.SimpleNamespace(
+        topic_model=model,
+        id2term=id2word,
+        bow_corpus=list(old_bow_corpus) + bow_corpus,
+        doc_term_matrix=None,
+        processed=updated_processed,
+        perplexity_score=perplexity_score,
+        coherence_score=None,
+        options=options,
+        coherence_scores=None
+    )
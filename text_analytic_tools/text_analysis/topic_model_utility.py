@@ -1,6 +1,9 @@
 import types
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import text_analytic_tools.utility as utility
+import text_analytic_tools.text_analysis.topic_model_aggregate as topic_model_aggregate
 import gensim
 
 logger = utility.getLogger('corpus_text_analysis')
@@ -15,6 +18,7 @@ class TopicModelContainer():
 
     def __init__(self):
         self._data = None
+        self._aggregator = None
 
     @staticmethod
     def singleton():
@@ -30,6 +34,7 @@ class TopicModelContainer():
     @data.setter
     def data(self, value):
         self._data = value
+        self._aggregator = None
 
     @property
     def topic_model(self):
@@ -59,6 +64,15 @@ class TopicModelContainer():
     def relevant_topics(self):
         return self.processed.relevant_topic_ids
 
+    @property
+    def aggregator(self):
+        """Topic aggregation (grouped weights, shares and trends) over current model's document topic weights"""
+        if self._aggregator is None:
+            self._aggregator = topic_model_aggregate.TopicAggregator.create(
+                self.processed.document_topic_weights, self.processed.documents, self.num_topics or None
+            )
+        return self._aggregator
+
 
 # NOT USED
 # def get_doc_topic_weights_DEPRECATED(doc_topic_matrix, threshold=0.05):
@@ -75,7 +89,7 @@ class TopicModelContainer():
 #     df = pd.DataFrame(list(it), columns=['document_id', 'topic_id', 'weight']).set_index('document_id')
 #     return df
 
-def compile_dictionary(model, vectorizer=None):
+def compile_dictionary(model, vectorizer=None, doc_term_matrix=None):
     logger.info('Compiling dictionary...')
     if hasattr(model, 'id2word'):
         # Gensim LDA model
@@ -86,6 +100,10 @@ def compile_dictionary(model, vectorizer=None):
         assert vectorizer is not None, 'vectorizer is empty'
         id2word = vectorizer.id_to_term
         dfs = 0
+        if doc_term_matrix is not None:
+            # Document frequencies of ids in id2word order (CSR column indices are unique per row)
+            counts = np.bincount(sp.csr_matrix(doc_term_matrix).indices, minlength=doc_term_matrix.shape[1])
+            dfs = counts[list(id2word.keys())]
     token_ids, tokens = list(zip(*id2word.items()))
     dictionary = pd.DataFrame({
         'token_id': token_ids,
@@ -94,88 +112,157 @@ def compile_dictionary(model, vectorizer=None):
     }).set_index('token_id')[['token', 'dfs']]
     return dictionary
 
+def get_topic_term_matrix(model):
+    """Returns topic-term weight matrix (phi), shape n_topics x n_terms, for gensim (LDA, LSI, HDP), MALLET, STTM and scikit-learn models"""
+
+    if hasattr(model, 'get_topics'):
+        # Gensim LDA, LSI, HDP, MALLET and STTM models (normalized weights, same as show_topics)
+        return model.get_topics()
+
+    if hasattr(model, 'model') and hasattr(model.model, 'components_'):
+        # Textacy/scikit-learn model (raw weights, same as top_topic_terms)
+        return model.model.components_
+
+    raise TopicModelException('topic-term matrix not available for {}'.format(type(model).__name__))
+
+def get_document_topic_matrix(model, corpus, doc_topic_matrix=None, chunksize=2000):
+    """Returns document-topic weight matrix (theta), shape n_documents x n_topics, dense or scipy sparse
+
+    Gensim LDA documents are inferred in chunks (one batch E-step per chunk instead of one call per document),
+    MALLET/STTM weights are read from the engine's output, and scikit-learn's weights must be supplied in `doc_topic_matrix`.
+    """
+    if doc_topic_matrix is not None:
+        # scikit-learn
+        return doc_topic_matrix
+
+    if isinstance(model, gensim.models.LdaModel):
+        theta = np.zeros((len(corpus), model.num_topics), dtype=model.dtype)
+        i = 0
+        for chunk in gensim.utils.grouper(corpus, chunksize):
+            gamma, _ = model.inference(chunk)
+            theta[i:i + len(gamma)] = gamma / gamma.sum(axis=1)[:, None]
+            i += len(gamma)
+        return theta
+
+    if hasattr(model, 'get_document_topic_matrix'):
+        # Gibbs LDA, and bulk loaded MALLET and STTM output
+        return model.get_document_topic_matrix()
+
+    n_topics = model.m_T if hasattr(model, 'm_T') else model.num_topics
+
+    if hasattr(model, 'load_document_topics'):
+        # Gensim MALLET wrapper and STTM
+        data_iter = model.load_document_topics()
+    elif isinstance(model, gensim.models.LsiModel):
+        data_iter = model[corpus]
+    else:
+        data_iter = ( model[document] for document in corpus )
+
+    return gensim.matutils.corpus2csc(data_iter, num_terms=n_topics).T.tocsr()
+
+def top_k_indices(matrix, k, by_magnitude=False):
+    """Returns column indices of the `k` largest values in each row of dense `matrix`, ordered by value descending"""
+
+    keys = -np.abs(matrix) if by_magnitude else -matrix
+
+    if k < matrix.shape[1]:
+        indices = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.tile(np.arange(0, matrix.shape[1]), (matrix.shape[0], 1))
+
+    order = np.argsort(np.take_along_axis(keys, indices, axis=1), axis=1, kind='stable')
+
+    return np.take_along_axis(indices, order, axis=1)
+
 def compile_topic_token_weights(model, dictionary, n_tokens=200):
 
     logger.info('Compiling topic-tokens weights...')
 
-    id2term = dictionary.token.to_dict()
-    term2id = { v: k for k,v in id2term.items() }
+    phi = np.asarray(get_topic_term_matrix(model))
 
-    if hasattr(model, 'show_topics'):
-        # Gensim LDA model
-        #topic_data = model.show_topics(model.num_topics, num_words=n_tokens, formatted=False)
-        topic_data = model.show_topics(num_topics=-1, num_words=n_tokens, formatted=False)
-    else:
-        # Textacy/scikit-learn model
-        topic_data = model.top_topic_terms(id2term, topics=-1, top_n=n_tokens, weights=True)
+    # LSI weights are signed, topic terms are ranked by magnitude (as in LsiModel.show_topic)
+    token_ids = top_k_indices(phi, n_tokens, by_magnitude=isinstance(model, gensim.models.LsiModel))
+    topic_ids = np.repeat(np.arange(0, phi.shape[0]), token_ids.shape[1])
+    token_ids = token_ids.ravel()
+    weights = phi[topic_ids, token_ids]
 
-    df_topic_weights = pd.DataFrame(
-        [ (topic_id, token, weight)
-            for topic_id, tokens in topic_data
-                for token, weight in tokens if weight > 0.0 ],
-        columns=['topic_id', 'token', 'weight']
-    )
+    is_positive = weights > 0.0
+    topic_ids, token_ids, weights = topic_ids[is_positive], token_ids[is_positive], weights[is_positive]
 
-    term2id = { v: k for k,v in id2term.items() }
-    df_topic_weights['token_id'] = df_topic_weights.token.apply(lambda x: term2id[x])
+    df_topic_weights = pd.DataFrame({
+        'topic_id': topic_ids,
+        'token_id': token_ids,
+        'token': dictionary.token.reindex(token_ids).values,
+        'weight': weights
+    })
 
     return df_topic_weights[['topic_id', 'token_id', 'token', 'weight']]
 
 def compile_topic_token_overview(topic_token_weights, alpha=None, n_tokens=200):
     """
     Group by topic_id and concatenate n_tokens words within group sorted by weight descending.
-    There must be a better way of doing this...
     """
     logger.info('Compiling topic-tokens overview...')
 
-    df = topic_token_weights.groupby('topic_id')\
-        .apply(lambda x: sorted(list(zip(x["token"], x["weight"])), key=lambda z: z[1], reverse=True))\
-        .apply(lambda x: ' '.join([z[0] for z in x][:n_tokens])).reset_index()
+    df = topic_token_weights\
+        .sort_values(['topic_id', 'weight'], ascending=[True, False], kind='mergesort')\
+        .groupby('topic_id')\
+        .head(n_tokens)\
+        .groupby('topic_id')\
+        .token.agg(' '.join)\
+        .reset_index()
     df.columns = ['topic_id', 'tokens']
-    df['alpha'] = df.topic_id.apply(lambda topic_id: alpha[topic_id]) if alpha is not None else 0.0
+    df['alpha'] = np.asarray(alpha)[df.topic_id.values] if alpha is not None else 0.0
 
     return df.set_index('topic_id')
 
-def compile_document_topics(model, corpus, documents, doc_topic_matrix=None, minimum_probability=0.001):
+def document_topic_weights(doc_topic_matrix, minimum_probability=0.0):
+    """Returns (document_id, topic_id, weight) arrays of weights >= minimum_probability, ordered by document and topic"""
 
-    try:
-        def document_topics_iter(model, corpus, minimum_probability=0.0):
-
-            if isinstance(model, gensim.models.LsiModel):
-                # Gensim LSI Model
-                #logger.warning('FIXME!!! Gensim LSI Model is to big!!! ')
-                data_iter = enumerate(model[corpus])
-            elif hasattr(model, 'get_document_topics'):
-                # Gensim LDA Model
-                data_iter = enumerate(model.get_document_topics(corpus, minimum_probability=minimum_probability))
-            elif hasattr(model, 'load_document_topics'):
-                # Gensim MALLET wrapper
-                data_iter = enumerate(model.load_document_topics())
-            elif hasattr(model, 'top_doc_topics'):
-                # scikit-learn
-                assert doc_topic_matrix is not None, "doc_topic_matrix not supplied"
-                data_iter = model.top_doc_topics(doc_topic_matrix, docs=-1, top_n=1000, weights=True)
-            else:
-                data_iter = ( (document_id, model[corpus[document_id]]) for document_id in range(0, len(corpus)) )
+    if sp.issparse(doc_topic_matrix):
+        coo = doc_topic_matrix.tocoo()
+        is_kept = coo.data >= minimum_probability
+        document_ids, topic_ids, weights = coo.row[is_kept], coo.col[is_kept], coo.data[is_kept]
+        order = np.lexsort((topic_ids, document_ids))
+        return document_ids[order], topic_ids[order], weights[order]
+
+    doc_topic_matrix = np.asarray(doc_topic_matrix)
+    document_ids, topic_ids = np.nonzero(doc_topic_matrix >= minimum_probability)
+
+    return document_ids, topic_ids, doc_topic_matrix[document_ids, topic_ids]
 
-                # assert False, 'compile_document_topics: Unknown topic model'
+# Max number of documents held out for perplexity evaluation
+MAX_HOLDOUT_DOCUMENTS = 10000
 
-            for document_id, topic_weights in data_iter:
-                for (topic_id, weight) in ((topic_id, weight) for (topic_id, weight) in topic_weights if weight >= minimum_probability):
-                    yield (document_id, topic_id, weight)
+def split_holdout(bow_corpus, holdout, random_state=None):
+    '''Returns (train, held-out) split of BoW corpus, where a `holdout` fraction (max 10000) of the documents are held out'''
 
-        '''
-        Get document topic weights for all documents in corpus
-        Note!  minimum_probability=None filters less probable topics, set to 0 to retrieve all topcs
+    n_holdout = min(int(len(bow_corpus) * (holdout or 0.0)), MAX_HOLDOUT_DOCUMENTS)
 
-        If gensim model then use 'get_document_topics', else 'load_document_topics' for mallet model
-        '''
+    if n_holdout == 0:
+        return bow_corpus, []
+
+    is_holdout = np.zeros(len(bow_corpus), dtype=bool)
+    is_holdout[np.random.RandomState(random_state).choice(len(bow_corpus), n_holdout, replace=False)] = True
+
+    train_corpus = [ d for d, x in zip(bow_corpus, is_holdout) if not x ]
+    holdout_corpus = [ d for d, x in zip(bow_corpus, is_holdout) if x ]
+
+    return train_corpus, holdout_corpus
+
+def compile_document_topics(model, corpus, documents, doc_topic_matrix=None, minimum_probability=0.001):
+    '''
+    Get document topic weights for all documents in corpus
+    Note!  minimum_probability=None filters less probable topics, set to 0 to retrieve all topcs
+    '''
+    try:
         logger.info('Compiling document topics...')
-        logger.info('  Creating data iterator...')
-        data = document_topics_iter(model, corpus, minimum_probability)
+        logger.info('  Creating document-topic matrix...')
+        theta = get_document_topic_matrix(model, corpus, doc_topic_matrix=doc_topic_matrix)
 
-        logger.info('  Creating frame from iterator...')
-        df_doc_topics = pd.DataFrame(data, columns=[ 'document_id', 'topic_id', 'weight' ]).set_index('document_id')
+        logger.info('  Creating frame from matrix...')
+        document_ids, topic_ids, weights = document_topic_weights(theta, minimum_probability or 0.0)
+        df_doc_topics = pd.DataFrame({ 'document_id': document_ids, 'topic_id': topic_ids, 'weight': weights }).set_index('document_id')
 
         logger.info('  Merging data...')
         df = pd.merge(documents, df_doc_topics, how='inner', left_index=True, right_index=True)
@@ -186,11 +273,13 @@ def compile_document_topics(model, corpus, documents, doc_topic_matrix=None, min
         return None
 
 # FIXME VARYING ASPECTS: year_column='signed_year' for tCoIR
-def compile_metadata(model, corpus, id2term, documents, vectorizer=None, doc_topic_matrix=None, n_tokens=200, year_column='year'):
+def compile_metadata(model, corpus, id2term, documents, vectorizer=None, doc_topic_matrix=None, n_tokens=200, year_column='year', doc_term_matrix=None):
     '''
     Compile metadata associated to given model and corpus
+
+    For scikit-learn models `doc_topic_matrix` and `doc_term_matrix` are used directly (`corpus` is not iterated).
     '''
-    dictionary = compile_dictionary(model, vectorizer)
+    dictionary = compile_dictionary(model, vectorizer, doc_term_matrix=doc_term_matrix)
     topic_token_weights = compile_topic_token_weights(model, dictionary, n_tokens=n_tokens)
     alpha = model.alpha if 'alpha' in model.__dict__ else None
     topic_token_overview = compile_topic_token_overview(topic_token_weights, alpha)